@@ -0,0 +1,282 @@
+# agenda.py
+# Índice em memória das atividades por médico e por paciente: o /comando aponta conflitos de horário
+# e sugere os horários livres mais próximos antes do insert na API .NET.
+#
+# Carregado de um snapshot local e mantido por um log de deltas em JSONL (ver log_deltas.py):
+#   snapshot: {"atividades": [{"id", "inicio", "fim", "medicoIds": [...], "pacienteId"}]}
+#   deltas:   {"op": "upsert"|"remover", "id", ...campos da atividade} por linha
+# Horários em ISO como os do interpretador ("aaaa-mm-ddThh:mm"); segundos e fuso são aceitos (com
+# fuso, convertidos para o horário local). Sem "fim", a atividade dura DURACAO_PADRAO.
+#
+# Cada médico e cada paciente tem uma linha do tempo com as atividades ordenadas pelo início e a
+# maior duração entre elas: uma atividade só sobrepõe [a, b) se começar em [a - maior, b), então a
+# consulta é uma busca binária mais as atividades dessa faixa, O(log n + k). Bloqueios longos (mais
+# de LONGA, como férias) ficam numa lista à parte para não alargar a faixa de todas as consultas.
+import bisect
+import json
+import os
+import threading
+from datetime import date, datetime
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from log_deltas import LogDeltas, invalido
+
+DURACAO_PADRAO = 30 * 60  # segundos
+LONGA = 24 * 3600
+SUGESTOES = 3
+# horário em que as sugestões podem cair, "hh:mm-hh:mm" (AGENDA_EXPEDIENTE)
+EXPEDIENTE = os.environ.get("AGENDA_EXPEDIENTE", "07:00-19:00")
+# limite de saltos na procura por um horário livre (cada salto pula um bloco de atividades)
+PASSOS_MAX = 500
+
+_inicio = itemgetter(0)
+
+
+def segundos(iso: str) -> int:
+    # "aaaa-mm-ddThh:mm[:ss][fuso]" -> segundos desde 0001-01-01, no horário local
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt.toordinal() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def iso(segundos_: int) -> str:
+    dia, resto = divmod(segundos_, 86400)
+    texto = f"{date.fromordinal(dia).isoformat()}T{resto // 3600:02d}:{resto % 3600 // 60:02d}"
+    return texto + (f":{resto % 60:02d}" if resto % 60 else "")
+
+
+def _expediente(texto: str) -> Tuple[int, int]:
+    abertura, fechamento = texto.split("-")
+    return tuple(int(h) * 3600 + int(m) * 60 for h, m in (abertura.split(":"), fechamento.split(":")))
+
+
+class _Linha:
+    """Atividades de um médico ou paciente: (inicio, fim, id) ordenadas pelo início."""
+
+    __slots__ = ("itens", "maior", "longas")
+
+    def __init__(self):
+        self.itens: List[Tuple[int, int, Any]] = []
+        self.maior = 0
+        self.longas: List[Tuple[int, int, Any]] = []
+
+    def __len__(self):
+        return len(self.itens) + len(self.longas)
+
+    def inserir(self, item: Tuple[int, int, Any]):
+        if item[1] - item[0] > LONGA:
+            self.longas.append(item)
+            return
+        bisect.insort(self.itens, item, key=_inicio)
+        # não diminui na remoção: a faixa só fica um pouco mais larga que o necessário
+        self.maior = max(self.maior, item[1] - item[0])
+
+    def remover(self, item: Tuple[int, int, Any]):
+        if item in self.longas:
+            self.longas.remove(item)
+            return
+        i = bisect.bisect_left(self.itens, item[0], key=_inicio)
+        while i < len(self.itens) and self.itens[i][0] == item[0]:
+            if self.itens[i] == item:
+                del self.itens[i]
+                return
+            i += 1
+
+    def sobrepostas(self, a: int, b: int) -> List[Tuple[int, int, Any]]:
+        # atividades que se sobrepõem a [a, b): começam antes de b e terminam depois de a
+        i = bisect.bisect_left(self.itens, a - self.maior, key=_inicio)
+        j = bisect.bisect_left(self.itens, b, lo=i, key=_inicio)
+        return [t for t in self.itens[i:j] if t[1] > a] + [t for t in self.longas if t[0] < b and t[1] > a]
+
+
+class IndiceAgenda:
+    """Linhas do tempo de médicos e pacientes alimentadas por snapshot + log de deltas."""
+
+    TIPOS = ("medico", "paciente")
+
+    def __init__(self, caminho_deltas: Optional[str] = None, expediente: str = EXPEDIENTE):
+        self._linhas: Dict[str, Dict[Any, _Linha]] = {tipo: {} for tipo in self.TIPOS}
+        # id da atividade -> (item, [(tipo, dono)])
+        self._atividades: Dict[Any, Tuple[Tuple[int, int, Any], List[Tuple[str, Any]]]] = {}
+        self.expediente = expediente
+        self.abertura, self.fechamento = _expediente(expediente)
+        self.log = LogDeltas(caminho_deltas) if caminho_deltas else None
+        self._lock = threading.Lock()
+        self.deltas_aplicados = 0
+
+    @classmethod
+    def de_arquivos(cls, snapshot: Optional[str], deltas: Optional[str] = None) -> "IndiceAgenda":
+        agenda = cls(deltas)
+        if snapshot:
+            agenda.carregar_snapshot(snapshot)
+        agenda.atualizar()
+        return agenda
+
+    # --- Carga e deltas ---
+    def carregar_snapshot(self, caminho: str):
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        with self._lock:
+            for atividade in dados.get("atividades", []):
+                self._adicionar(atividade)
+
+    def aplicar(self, deltas: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for delta in deltas:
+                self._aplicar(delta)
+
+    def _aplicar(self, delta: Dict[str, Any]):
+        if delta.get("op", "upsert") == "remover":
+            self._remover(delta["id"])
+        else:
+            self._adicionar(delta)
+        self.deltas_aplicados += 1
+
+    def atualizar(self) -> int:
+        """Aplica os deltas novos do log; devolve quantos foram lidos."""
+        if self.log is None:
+            return 0
+        with self._lock:
+            deltas = self.log.novos()
+            for delta in deltas:
+                try:
+                    self._aplicar(delta)
+                except (ValueError, KeyError, TypeError) as e:
+                    invalido(self.log.caminho, delta, e)
+            return len(deltas)
+
+    def registrar(self, deltas: List[Dict[str, Any]]) -> int:
+        """Grava os deltas no log (para os outros workers) e aplica; sem log, só aplica em memória."""
+        for delta in deltas:
+            if delta.get("op", "upsert") != "remover":
+                self._item(delta)  # valida os horários antes de gravar
+        if self.log is None:
+            self.aplicar(deltas)
+            return len(deltas)
+        with self._lock:
+            self.log.gravar(deltas)
+        return self.atualizar()
+
+    @staticmethod
+    def _item(atividade: Dict[str, Any]) -> Tuple[int, int, Any]:
+        inicio = segundos(atividade["inicio"])
+        fim = segundos(atividade["fim"]) if atividade.get("fim") else inicio + DURACAO_PADRAO
+        if fim <= inicio:
+            raise ValueError(f"atividade {atividade['id']!r} termina antes de começar")
+        return inicio, fim, atividade["id"]
+
+    @staticmethod
+    def _donos(atividade: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        medicos = atividade.get("medicoIds") or ([atividade["medicoId"]] if atividade.get("medicoId") is not None else [])
+        donos = [("medico", m) for m in medicos]
+        if atividade.get("pacienteId") is not None:
+            donos.append(("paciente", atividade["pacienteId"]))
+        return donos
+
+    def _adicionar(self, atividade: Dict[str, Any]):
+        item, donos = self._item(atividade), self._donos(atividade)
+        self._remover(item[2])
+        for tipo, dono in donos:
+            linha = self._linhas[tipo].get(dono)
+            if linha is None:
+                linha = self._linhas[tipo][dono] = _Linha()
+            linha.inserir(item)
+        self._atividades[item[2]] = (item, donos)
+
+    def _remover(self, id_atividade):
+        registro = self._atividades.pop(id_atividade, None)
+        if registro is None:
+            return
+        item, donos = registro
+        for tipo, dono in donos:
+            linha = self._linhas[tipo][dono]
+            linha.remover(item)
+            if not len(linha):
+                del self._linhas[tipo][dono]
+
+    # --- Consultas ---
+    def _sobrepostas(self, linhas: List[_Linha], a: int, b: int, ignorar) -> List[Tuple[int, int, Any]]:
+        return [t for linha in linhas for t in linha.sobrepostas(a, b) if t[2] != ignorar]
+
+    def _livre_a_partir(self, linhas, t: int, duracao: int, ignorar, frente: bool) -> Optional[int]:
+        # primeiro início livre a partir de t (para frente) ou até t (para trás), dentro do expediente
+        janela = self.fechamento - self.abertura
+        for _ in range(PASSOS_MAX):
+            if duracao <= janela:
+                dia, hora = divmod(t, 86400)
+                if frente and hora < self.abertura:
+                    t = dia * 86400 + self.abertura
+                elif frente and hora + duracao > self.fechamento:
+                    t = (dia + 1) * 86400 + self.abertura
+                elif not frente and hora + duracao > self.fechamento:
+                    t = dia * 86400 + self.fechamento - duracao
+                elif not frente and hora < self.abertura:
+                    t = (dia - 1) * 86400 + self.fechamento - duracao
+            ocupadas = self._sobrepostas(linhas, t, t + duracao, ignorar)
+            if not ocupadas:
+                return t
+            t = max(fim for _, fim, _ in ocupadas) if frente else min(ini for ini, _, _ in ocupadas) - duracao
+        return None
+
+    def verificar(self, medicos: List[Any], pacientes: List[Any], inicio: str, fim: Optional[str] = None,
+                  ignorar=None, sugestoes: int = SUGESTOES, agora: Optional[datetime] = None) -> Dict[str, Any]:
+        """Conflitos de [inicio, fim) com as agendas dos médicos e pacientes e, havendo conflito, os
+        `sugestoes` horários livres (para todos eles) de mesma duração mais próximos do pedido.
+
+        `ignorar` é o id de uma atividade que está sendo remarcada (não conflita consigo mesma);
+        sugestões antes de `agora` não são feitas.
+        """
+        a, b, _ = self._item({"id": ignorar, "inicio": inicio, "fim": fim})
+        limite_passado = segundos((agora or datetime.now()).isoformat(timespec="seconds"))
+        with self._lock:
+            conflitos = {}
+            linhas = []
+            for tipo, donos in (("medico", medicos), ("paciente", pacientes)):
+                conflitos[tipo] = {}
+                for dono in donos:
+                    linha = self._linhas[tipo].get(dono)
+                    if linha is None:
+                        continue
+                    linhas.append(linha)
+                    sobrepostas = self._sobrepostas([linha], a, b, ignorar)
+                    if sobrepostas:
+                        conflitos[tipo][dono] = [{"id": i, "inicio": iso(ini), "fim": iso(f)}
+                                                 for ini, f, i in sorted(sobrepostas, key=_inicio)]
+            livre = not any(conflitos.values())
+            encontrados: List[int] = []
+            if not livre and sugestoes > 0:
+                encontrados = self._sugerir(linhas, a, b - a, ignorar, sugestoes, limite_passado)
+        return {
+            "livre": livre,
+            "conflitos": {tipo: [{"dono": dono, "atividades": lista} for dono, lista in por_dono.items()]
+                          for tipo, por_dono in conflitos.items()},
+            "sugestoes": [{"inicio": iso(t), "fim": iso(t + b - a)} for t in encontrados],
+        }
+
+    def _sugerir(self, linhas, a: int, duracao: int, ignorar, quantidade: int, limite_passado: int) -> List[int]:
+        # até `quantidade` horários para frente e para trás (sem sobreposição entre eles); ficam os
+        # mais próximos do pedido. Para frente a busca começa em max(pedido, agora), arredondado para
+        # o minuto seguinte; _livre_a_partir a traz para dentro do expediente
+        candidatos = []
+        for frente in (True, False):
+            t = max(a, -(-limite_passado // 60) * 60) if frente else a
+            for _ in range(quantidade):
+                t = self._livre_a_partir(linhas, t, duracao, ignorar, frente)
+                if t is None or (not frente and t < limite_passado):
+                    break
+                candidatos.append(t)
+                t = t + duracao if frente else t - duracao
+        return sorted(sorted(set(candidatos), key=lambda t: (abs(t - a), t))[:quantidade])
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "atividades": len(self._atividades),
+                "medicos": len(self._linhas["medico"]),
+                "pacientes": len(self._linhas["paciente"]),
+                "expediente": self.expediente,
+                "deltas_aplicados": self.deltas_aplicados,
+                "log_deltas": self.log.caminho if self.log else None,
+            }
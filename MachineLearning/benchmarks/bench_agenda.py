@@ -0,0 +1,78 @@
+# benchmarks/bench_agenda.py
+# Latência p50/p95/p99 da verificação de conflitos (com sugestões de horário quando há conflito) e do
+# upsert de uma atividade no índice da agenda (agenda.py) com centenas de milhares de atividades.
+# Agenda sintética: um ano de atividades de 30 ou 60 minutos em horário comercial, divididas entre
+# médicos e pacientes, com alguns bloqueios longos (férias) que ficam na lista à parte.
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_agenda [--atividades 300000]
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from agenda import IndiceAgenda, iso, segundos
+from benchmarks.comum import cronometrar, resumo
+
+INICIO = datetime(2030, 1, 7)
+DIAS = 365
+
+
+def atividades(n, medicos, pacientes, rng):
+    base = segundos(INICIO.isoformat())
+    for i in range(n):
+        inicio = base + rng.randrange(DIAS) * 86400 + rng.randrange(7 * 2, 18 * 2) * 1800
+        yield {"id": i, "inicio": iso(inicio), "fim": iso(inicio + rng.choice((1800, 3600))),
+               "medicoIds": [rng.randrange(medicos)], "pacienteId": rng.randrange(pacientes)}
+    for medico in range(0, medicos, 10):
+        inicio = base + rng.randrange(DIAS) * 86400
+        yield {"id": f"ferias-{medico}", "inicio": iso(inicio), "fim": iso(inicio + 15 * 86400),
+               "medicoIds": [medico]}
+
+
+def consulta(rng, medicos, pacientes):
+    inicio = INICIO + timedelta(days=rng.randrange(DIAS), minutes=rng.randrange(7 * 60, 18 * 60, 15))
+    return [rng.randrange(medicos)], [rng.randrange(pacientes)], inicio.isoformat(timespec="minutes")
+
+
+def suite(registros=300_000, consultas=1000, semente=0):
+    rng = random.Random(semente)
+    medicos, pacientes = max(1, registros // 300), max(1, registros // 3)
+    agenda = IndiceAgenda()
+    inicio = time.perf_counter()
+    agenda.aplicar(atividades(registros, medicos, pacientes, rng))
+    carga = time.perf_counter() - inicio
+
+    agora = INICIO
+    pedidos = iter([consulta(rng, medicos, pacientes) for _ in range(consultas + 1)])
+    conflitos = []
+
+    def verificar():
+        r = agenda.verificar(*next(pedidos), agora=agora)
+        conflitos.append(not r["livre"])
+
+    resultados = {"verificar": {**resumo(cronometrar(verificar, repeticoes=consultas)),
+                                "com_conflito": round(sum(conflitos) / len(conflitos), 3)}}
+    novos = iter(range(registros, registros + consultas + 1))
+
+    def upsert():
+        m, p, inicio_ = next(pedidos_upsert)
+        agenda.aplicar([{"id": next(novos), "inicio": inicio_, "medicoIds": m, "pacienteId": p[0]}])
+
+    pedidos_upsert = iter([consulta(rng, medicos, pacientes) for _ in range(consultas + 1)])
+    resultados["upsert"] = resumo(cronometrar(upsert, repeticoes=consultas))
+    for r in resultados.values():
+        r.update(atividades=registros, medicos=medicos, pacientes=pacientes, carga_s=round(carga, 2))
+    return resultados
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--atividades", type=int, default=300_000)
+    ap.add_argument("--consultas", type=int, default=1000)
+    args = ap.parse_args()
+    for caso, r in suite(args.atividades, args.consultas).items():
+        print(f"{caso:>10}: atividades={r['atividades']} carga={r['carga_s']}s p50={r['p50_ms']:.3f}ms "
+              f"p95={r['p95_ms']:.3f}ms p99={r['p99_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_distribuido.py
+# Eficiência de escala do treino distribuído (train.py com torchrun, backend gloo) de 1 a N
+# processos na mesma máquina, com o lote global fixo (cada processo treina lote_global / N por
+# passo): mesmos passos e mesmo LR, então a acurácia final deve ser a do treino num processo.
+#   eficiência(N) = vazão(N) / (N * vazão(1)), em exemplos/s somados entre os processos
+# A acurácia de validação de cada N é comparada com a de 1 processo; sai com código 1 se alguma
+# diferir mais que --tolerancia. Os pesos e checkpoints vão para uma pasta temporária.
+# Uso (a partir de MachineLearning/):
+#   python -m benchmarks.bench_distribuido [--processos 1 2 4] [--epochs 20] [--lote-global 8]
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from dataset_tokenizado import escrever_json
+
+PROCESSOS = (1, 2, 4)
+TOLERANCIA = 0.02
+
+
+def treinar(processos, lote_global, epochs, pasta, extra=()):
+    # (exemplos/s por época, token_accuracy final) de um treino com `processos` processos
+    comando = [sys.executable, "-m", "torch.distributed.run", "--standalone", f"--nproc-per-node={processos}",
+               "train.py", f"--epochs={epochs}", f"--batch-size={lote_global // processos}", "--val-frac=0.1",
+               f"--pasta-checkpoints={os.path.join(pasta, f'ckpt{processos}')}",
+               f"--saida={os.path.join(pasta, f'mini_llm_{processos}.pth')}", *extra]
+    saida = subprocess.run(comando, capture_output=True, text=True, check=True).stdout
+    vazoes = [float(v) for v in re.findall(r"exemplos/s: ([\d.]+)", saida)]
+    acuracia = float(re.search(r"^token_accuracy: ([\d.]+)", saida, re.M).group(1))
+    return vazoes, acuracia
+
+
+def relatorio(processos=PROCESSOS, lote_global=8, epochs=20, tolerancia=TOLERANCIA, extra=()):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in processos:
+            vazoes, acuracia = treinar(n, lote_global, epochs, pasta, extra)
+            # a primeira época paga o aquecimento (caches, alocações) e fica fora da vazão
+            resultados[n] = {"exemplos_por_s": statistics.median(vazoes[1:] or vazoes), "token_accuracy": acuracia}
+    base = resultados[processos[0]]
+    for n, r in resultados.items():
+        r["speedup"] = r["exemplos_por_s"] / base["exemplos_por_s"]
+        r["eficiencia"] = r["speedup"] * processos[0] / n
+        r["delta_acuracia"] = r["token_accuracy"] - base["token_accuracy"]
+        r["dentro_da_tolerancia"] = abs(r["delta_acuracia"]) <= tolerancia
+    return {"lote_global": lote_global, "epochs": epochs, "tolerancia": tolerancia, "cpus": os.cpu_count(),
+            "processos": {str(n): r for n, r in resultados.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processos", type=int, nargs="+", default=list(PROCESSOS))
+    parser.add_argument("--lote-global", type=int, default=8, help="divisível por cada número de processos")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="diferença absoluta de token_accuracy aceita em relação a 1 processo")
+    parser.add_argument("--saida", default=None, help="grava o relatório em JSON")
+    args, extra = parser.parse_known_args()  # o resto vai para o train.py (--agendamento cosseno, ...)
+    if any(args.lote_global % n for n in args.processos):
+        parser.error("--lote-global precisa ser divisível por cada número de processos")
+
+    r = relatorio(args.processos, args.lote_global, args.epochs, args.tolerancia, extra)
+    print(f"lote global {r['lote_global']}, {r['epochs']} épocas, {r['cpus']} CPU(s)")
+    for n, p in r["processos"].items():
+        print(f"  {n:>2} processo(s): {p['exemplos_por_s']:8.1f} exemplos/s  speedup {p['speedup']:.2f}x  "
+              f"eficiência {p['eficiencia']:6.1%}  token_accuracy {p['token_accuracy']:.4f} "
+              f"(Δ{p['delta_acuracia']:+.4f}{'' if p['dentro_da_tolerancia'] else ', FORA DA TOLERÂNCIA'})")
+    if args.saida:
+        escrever_json(args.saida, r)
+    return 0 if all(p["dentro_da_tolerancia"] for p in r["processos"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# benchmarks/bench_http.py
+# Latência p50/p95/p99 e vazão do POST /comando sob carga concorrente, com a aplicação inteira
+# (middlewares, cache, interpretador e fallback do MiniLLM) num cliente ASGI no mesmo processo:
+# sem rede nem uvicorn, só o custo do serviço.
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_http [--concorrencia 1 8 32]
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.bench_interpretador import comandos_gerados
+from benchmarks.comum import comandos_reais, resumo
+
+CONCORRENCIAS = (1, 8, 32)
+
+
+def corpus():
+    # reais + gerados (inclui comandos sem data, que caem no fallback do modelo)
+    return comandos_reais() + comandos_gerados(500)
+
+
+async def medir(cliente, textos, concorrencia, total):
+    # `concorrencia` clientes, cada um enviando a próxima requisição assim que a anterior volta
+    latencias = []
+    status = Counter()
+    proximo = iter(range(total))
+
+    async def usuario():
+        for i in proximo:
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/comando", json={"mensagem": textos[i % len(textos)]})
+            latencias.append(time.perf_counter() - inicio)
+            status[resposta.status_code] += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(usuario() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    return {**resumo(latencias), "req_por_s": total / duracao, "status": dict(status)}
+
+
+async def _suite(requisicoes, concorrencias):
+    # logs por requisição iriam para o stdout no meio das medições
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+    from main import agendador_modelo, aquecer_modelo, app, cache_comandos
+
+    # o ASGITransport não roda o lifespan: carrega o modelo aqui, fora das medições
+    if agendador_modelo is not None:
+        aquecer_modelo()
+    textos = corpus()
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await medir(cliente, textos, 1, 20)  # aquecimento
+        for concorrencia in concorrencias:
+            # cache vazio em cada nível: o corpus é maior que as requisições, então cada nível
+            # mede a mesma mistura de acertos e falhas
+            cache_comandos.limpar()
+            resultados[f"comando_c{concorrencia}"] = await medir(cliente, textos, concorrencia, requisicoes)
+    return resultados
+
+
+def suite(requisicoes=400, concorrencias=CONCORRENCIAS):
+    return asyncio.run(_suite(requisicoes, concorrencias))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=400)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=list(CONCORRENCIAS))
+    args = parser.parse_args()
+    for nome, r in suite(args.requisicoes, args.concorrencia).items():
+        print(f"{nome:>12}: {r['req_por_s']:8.1f} req/s p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms "
+              f"p99={r['p99_ms']:.2f}ms status={r['status']}")
+
+
+if __name__ == "__main__":
+    main()
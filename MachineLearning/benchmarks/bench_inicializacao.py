@@ -0,0 +1,112 @@
+# benchmarks/bench_inicializacao.py
+# Partida a frio e memória por worker com 1, 4 e 8 workers, em dois modos:
+#   uvicorn   `uvicorn main:app --workers N`: cada worker (spawn) importa o torch e carrega o modelo
+#   precarga  `python servidor.py --workers N`: o pai carrega uma vez e os workers nascem de fork
+# Partida = tempo até todos os N workers responderem 200 no /pronto (cada resposta traz o pid).
+# RSS conta as páginas compartilhadas inteiras em cada processo; PSS divide cada página entre os
+# processos que a usam, então a soma do PSS (workers + pai) é a memória de fato ocupada.
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_inicializacao [--workers 1 4 8]
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from dataset_tokenizado import escrever_json
+
+PASTA_RESULTADOS = "benchmarks/resultados"
+WORKERS = (1, 4, 8)
+MODOS = ("uvicorn", "precarga")
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def comando(modo: str, workers: int, porta: int):
+    if modo == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(porta),
+                "--log-level", "warning"]
+    return [sys.executable, "servidor.py", "--workers", str(workers), "--porta", str(porta)]
+
+
+def memoria(pid: int):
+    # (rss, pss) em bytes, de /proc/<pid>/smaps_rollup
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linha in f:
+            partes = linha.split()
+            if partes[0] in ("Rss:", "Pss:"):
+                valores[partes[0][:-1]] = int(partes[1]) * 1024
+    return valores["Rss"], valores["Pss"]
+
+
+def medir(modo: str, workers: int, tempo_limite: float):
+    porta = porta_livre()
+    env = {**os.environ, "LOG_NIVEL": "WARNING", "METRICAS_DIR": tempfile.mkdtemp(prefix="metricas-")}
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando(modo, workers, porta), env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+    prontos, primeiro = set(), None
+    try:
+        while len(prontos) < workers and time.perf_counter() - inicio < tempo_limite:
+            try:
+                # conexão nova a cada consulta, para o accept cair em workers diferentes
+                r = httpx.get(f"http://127.0.0.1:{porta}/pronto", timeout=5)
+            except httpx.HTTPError:
+                time.sleep(0.05)
+                continue
+            if r.status_code == 200:
+                prontos.add(r.json()["pid"])
+                primeiro = primeiro or time.perf_counter() - inicio
+            else:
+                time.sleep(0.05)
+        partida = time.perf_counter() - inicio
+        rss_pss = [memoria(pid) for pid in prontos]
+        pai = memoria(processo.pid)
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        processo.wait(timeout=60)
+    return {
+        "workers": workers,
+        "workers_prontos": len(prontos),
+        "primeiro_pronto_s": round(primeiro, 2) if primeiro else None,
+        "todos_prontos_s": round(partida, 2) if len(prontos) == workers else None,
+        "rss_mb_por_worker": round(sum(r for r, _ in rss_pss) / len(rss_pss) / 2**20, 1) if rss_pss else None,
+        "pss_mb_por_worker": round(sum(p for _, p in rss_pss) / len(rss_pss) / 2**20, 1) if rss_pss else None,
+        "pss_mb_total": round((sum(p for _, p in rss_pss) + pai[1]) / 2**20, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=list(WORKERS))
+    ap.add_argument("--modos", nargs="+", default=list(MODOS), choices=MODOS)
+    ap.add_argument("--tempo-limite", type=float, default=300.0)
+    ap.add_argument("--saida", default=None, help=f"padrão: {PASTA_RESULTADOS}/inicializacao-<data>.json")
+    args = ap.parse_args()
+
+    resultados = {}
+    for modo in args.modos:
+        for n in args.workers:
+            r = medir(modo, n, args.tempo_limite)
+            resultados[f"{modo}_w{n}"] = r
+            print(f"{modo:>8} w={n}: prontos={r['workers_prontos']}/{n} primeiro={r['primeiro_pronto_s']}s "
+                  f"todos={r['todos_prontos_s']}s rss/worker={r['rss_mb_por_worker']}MB "
+                  f"pss/worker={r['pss_mb_por_worker']}MB pss_total={r['pss_mb_total']}MB")
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, datetime.now().strftime("inicializacao-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    escrever_json(saida, {"cpus": os.cpu_count(), "resultados": resultados})
+    print(f"resultados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# benchmarks/bench_interpretador.py
+# Latência p50/p95/p99 do InterpretadorComandos em comandos reais (dataset), gerados e patológicos,
+# e de datas.normalizar_lote num lote de datas e horas em texto livre (caminho de importação).
+# "patologicos_servidor" mede o caminho do /comando: chamadas numa thread que não é a principal
+# (como no threadpool do uvicorn, sem SIGALRM) ao InterpretadorIsolado, que roda a cascata num
+# processo filho; o tempo limite precisa valer ali também.
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_interpretador
+import argparse
+import random
+import threading
+import time
+
+import datas
+from benchmarks.comum import comandos_reais, cronometrar, resumo
+from interpretador import InterpretadorComandos, ComandoMuitoLongo, TempoLimiteExcedido, TEMPO_LIMITE
+from interpretador_isolado import InterpretadorIsolado
+
+PACIENTES = ["João Silva", "Maria Santos", "Pedro Alves", "Ana Paula", "Lucas Oliveira", "Beatriz Costa",
+             "Rafael Mendes", "Juliana Pereira", "Bruno Martins", "Carla Souza", "José Antônio", "Luísa Gonçalves"]
+MEDICOS = ["Dr. Carlos Lima", "Dra. Ana Costa", "Dr. Roberto Souza", "Dra. Fernanda Lima", "Dr. Marcelo Dias",
+           "Dra. Camila Rodrigues", "Dr. Eduardo Pereira", "Dra. Renata Alves"]
+TIPOS = ["consulta", "cirurgia", "retorno", "exame", "teleconsulta"]
+MESES = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro",
+         "outubro", "novembro", "dezembro"]
+MODELOS = [
+    "marque uma {tipo} com o paciente {paciente} e o médico {medico} no dia {data} das {inicio} às {fim}",
+    "agende {tipo} para {paciente} com {medico} em {data} das {inicio} às {fim}",
+    "marcar {tipo} para {paciente} com {medico} no dia {data} às {inicio}",
+    "{tipo} paciente {paciente} com {medico} dia {data} {inicio} até {fim}",
+    "{tipo} para paciente {paciente} com médico {medico} em {data} das {inicio} às {fim}",
+    # sem horário: nenhum padrão casa (no /comando vai para o fallback do modelo)
+    "preciso de uma {tipo} para {paciente} com {medico} amanhã cedo",
+]
+
+
+def comandos_normais():
+    return comandos_reais()
+
+
+def comandos_gerados(n=2000, semente=0):
+    # comandos sintéticos nos formatos do dataset, sempre os mesmos para a mesma semente
+    rng = random.Random(semente)
+    comandos = []
+    for _ in range(n):
+        dia, mes, hora = rng.randint(1, 28), rng.randint(1, 12), rng.randint(7, 18)
+        minuto = rng.choice(["00", "15", "30", "45"])
+        data = rng.choice([f"{dia:02d}/{mes:02d}/2025", f"{dia}/{mes}", f"{dia} de {MESES[mes - 1]} de 2025"])
+        comandos.append(rng.choice(MODELOS).format(
+            tipo=rng.choice(TIPOS), paciente=rng.choice(PACIENTES), medico=rng.choice(MEDICOS), data=data,
+            inicio=f"{hora:02d}:{minuto}", fim=f"{hora + 1:02d}:{minuto}"))
+    return comandos
+
+
+def datas_texto(n=5000, semente=0):
+    # datas e horas como chegam numa importação: numéricas, por extenso, ISO e relativas
+    rng = random.Random(semente)
+    textos = []
+    for _ in range(n):
+        dia, mes, hora = rng.randint(1, 31), rng.randint(1, 12), rng.randint(0, 23)
+        textos.append(rng.choice([
+            f"{dia:02d}/{mes:02d}/2025 {hora:02d}:30", f"{dia} de {MESES[mes - 1]} às {hora}h",
+            f"2025-{mes:02d}-{dia:02d} {hora:02d}:00", f"amanhã às {hora}", f"próxima sexta {hora}h15",
+        ]))
+    return textos
+
+
+def comandos_patologicos():
+    # entradas que fazem os grupos lazy `.*?` / `[...\s]+?` retrocederem muito
+    return [
+        "consulta paciente " + "joao e o " * 20 + " dia 1",
+        "consulta paciente " + "joao e o " * 40 + " dia 1",
+        "consulta para Kevin  Oliveira  com  Dra.  Larissa  Silva  em  20/02/2026  das  15:00  de  as  15:50",
+        "exame " + "a com b " * 40 + "1/1 10:00",
+        "marcar " + "com a " * 60,
+        "consulta paciente x e o y dia " + "1 " * 150,
+        "consulta paciente " + "a " * 240,
+        "x" * 2000,
+        # passam pelo pré-filtro e ainda exigem backtracking no pattern3
+        "consulta paciente " + "joao e o " * 30 + "dia 1/1 10:00 a 1x",
+        "exame de " + "ana e " * 40 + ":00 1/1 a 10:00",
+    ]
+
+
+def comandos_patologicos_servidor():
+    # os patológicos e um que, fora da thread principal, prendia a thread por ~30s
+    return comandos_patologicos() + ["exame de " + "ana e " * 75 + ":00 1/1 a 10:00"]
+
+
+def medir(interpretador, comandos, repeticoes):
+    latencias = []
+    estados = {"ok": 0, "sem_match": 0, "tempo_limite": 0, "muito_longo": 0}
+    for _ in range(repeticoes):
+        for texto in comandos:
+            inicio = time.perf_counter()
+            try:
+                estados["ok" if interpretador.interpretar(texto) else "sem_match"] += 1
+            except TempoLimiteExcedido:
+                estados["tempo_limite"] += 1
+            except ComandoMuitoLongo:
+                estados["muito_longo"] += 1
+            latencias.append(time.perf_counter() - inicio)
+    return {**resumo(latencias), **estados}
+
+
+def medir_servidor(comandos, repeticoes, tempo_limite=TEMPO_LIMITE):
+    # como o /comando: InterpretadorIsolado chamado de uma thread que não é a principal
+    interpretador = InterpretadorIsolado(tempo_limite=tempo_limite)
+    interpretador.iniciar()
+    resultado = {}
+    try:
+        thread = threading.Thread(target=lambda: resultado.update(medir(interpretador, comandos, repeticoes)))
+        thread.start()
+        thread.join()
+    finally:
+        interpretador.encerrar()
+    return resultado
+
+
+def suite(repeticoes=5):
+    # casos do runner (benchmarks/rodar.py); um interpretador novo por caso, sem ordem adaptativa
+    return {
+        "reais": medir(InterpretadorComandos(), comandos_normais(), repeticoes),
+        "gerados": medir(InterpretadorComandos(), comandos_gerados(), repeticoes),
+        "patologicos": medir(InterpretadorComandos(), comandos_patologicos(), max(1, repeticoes // 2)),
+        "patologicos_servidor": medir_servidor(comandos_patologicos_servidor(), max(1, repeticoes // 2)),
+        "datas_lote": medir_datas(datas_texto(), repeticoes),
+    }
+
+
+def medir_datas(textos, repeticoes):
+    # uma chamada de normalizar_lote por repetição; latência de cada chamada (o lote inteiro)
+    return {**resumo(cronometrar(lambda: datas.normalizar_lote(textos), repeticoes=repeticoes)),
+            "lote": len(textos)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeticoes", type=int, default=20)
+    ap.add_argument("--tempo-limite", type=float, default=TEMPO_LIMITE)
+    ap.add_argument("--ordem-adaptativa", action="store_true")
+    args = ap.parse_args()
+
+    interpretador = InterpretadorComandos(tempo_limite=args.tempo_limite, ordem_adaptativa=args.ordem_adaptativa)
+    resultados = {
+        "normal": medir(interpretador, comandos_normais(), args.repeticoes),
+        "gerado": medir(interpretador, comandos_gerados(), max(1, args.repeticoes // 10)),
+        "patologico": medir(interpretador, comandos_patologicos(), max(1, args.repeticoes // 10)),
+        "servidor": medir_servidor(comandos_patologicos_servidor(), max(1, args.repeticoes // 10), args.tempo_limite),
+    }
+    lote = medir_datas(datas_texto(), args.repeticoes)
+    for nome, r in resultados.items():
+        print(f"{nome:>10}: n={r['n']} p50={r['p50_ms']:.3f}ms p95={r['p95_ms']:.3f}ms p99={r['p99_ms']:.3f}ms max={r['max_ms']:.3f}ms "
+              f"ok={r['ok']} sem_match={r['sem_match']} tempo_limite={r['tempo_limite']} muito_longo={r['muito_longo']}")
+    print(f"datas_lote: lote={lote['lote']} p50={lote['p50_ms']:.3f}ms p95={lote['p95_ms']:.3f}ms "
+          f"({lote['p50_ms'] * 1000 / lote['lote']:.2f}us por texto)")
+    for nome, c in interpretador.estatisticas()["padroes"].items():
+        print(f"{nome:>18}: tentativas={c['tentativas']} acertos={c['acertos']} descartes={c['descartes']}")
+    return {**resultados, "datas_lote": lote}
+
+
+if __name__ == "__main__":
+    main()
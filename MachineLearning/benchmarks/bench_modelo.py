@@ -0,0 +1,89 @@
+# benchmarks/bench_modelo.py
+# Vazão (req/s) e latência p50/p99 do fallback MiniLLM por nível de concorrência:
+# micro-lotes dinâmicos contra um forward por requisição (tamanho_max=1).
+# suite(): latência do forward do MiniLLM (caminho da inferência) e da decodificação restrita ao
+# esquema do JSON (decodificacao.py) por tamanho de lote, para o runner.
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_modelo
+import argparse
+import asyncio
+import time
+
+import torch
+
+from benchmarks.comum import comandos_reais, cronometrar, percentil, resumo
+from decodificacao import DecodificadorJSON
+from infer import carregar, gerar_json_lote
+from microlote import AgendadorMicroLote, ESPERA_MAX, TAMANHO_MAX
+
+LOTES = (1, 4, 16, 64)
+
+
+def comandos():
+    return comandos_reais()
+
+
+def suite(repeticoes=30, lotes=LOTES):
+    # forward de comandos reais já tokenizados e aparados, como em gerar_json_lote
+    textos = comandos()
+    model, tokenizer = carregar().model, carregar().tokenizer
+    decodificador = DecodificadorJSON(tokenizer)
+    resultados = {}
+    with torch.inference_mode():
+        for B in lotes:
+            lote = [textos[i % len(textos)] for i in range(B)]
+            entradas = tokenizer.encode_batch(lote)
+            # lotes pequenos são rápidos e oscilam mais: mais amostras para o p95/p99
+            n = max(repeticoes, repeticoes * 16 // B)
+            r = resumo(cronometrar(lambda: model(entradas), n, aquecimento=3))
+            resultados[f"forward_b{B}"] = {**r, "exemplos_por_s": B / (r["p50_ms"] / 1000)}
+            # custo que a decodificação restrita soma ao argmax, sobre logits das 128 posições
+            logits = model(tokenizer.encode_batch(lote, 128))
+            r = resumo(cronometrar(lambda: decodificador(logits), n, aquecimento=3))
+            resultados[f"gramatica_b{B}"] = {**r, "exemplos_por_s": B / (r["p50_ms"] / 1000)}
+    return resultados
+
+
+async def medir(agendador, textos, concorrencia, total):
+    # `concorrencia` clientes, cada um enviando a próxima requisição assim que a anterior volta
+    latencias = []
+    proximo = iter(range(total))
+
+    async def cliente():
+        for i in proximo:
+            inicio = time.perf_counter()
+            await agendador.submeter(textos[i % len(textos)])
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    agendador.encerrar()
+    return total / duracao, latencias
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=512)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--tamanho-max", type=int, default=TAMANHO_MAX)
+    parser.add_argument("--espera-max-ms", type=float, default=ESPERA_MAX * 1000)
+    args = parser.parse_args()
+
+    textos = comandos()
+    gerar_json_lote(textos[:4])  # aquecimento
+    modos = [
+        ("por_requisicao", 1, 0.0),
+        ("microlote", args.tamanho_max, args.espera_max_ms / 1000),
+    ]
+    for concorrencia in args.concorrencia:
+        for nome, tamanho_max, espera_max in modos:
+            agendador = AgendadorMicroLote(gerar_json_lote, tamanho_max=tamanho_max, espera_max=espera_max)
+            vazao, latencias = await medir(agendador, textos, concorrencia, args.requisicoes)
+            est = agendador.estatisticas()
+            print(f"c={concorrencia:>3} {nome:>14}: {vazao:8.1f} req/s "
+                  f"p50={percentil(latencias, 50) * 1000:.2f}ms p99={percentil(latencias, 99) * 1000:.2f}ms "
+                  f"lote_medio={est['tamanho_medio']:.1f} maior_lote={est['maior_lote']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+# benchmarks/bench_nomes.py
+# Latência p50/p95/p99 da busca no índice de nomes (indice_nomes.py) com centenas de milhares de registros.
+# Dois catálogos: nomes do gerador sintético (poucos nomes e sobrenomes, o pior caso para os trigramas)
+# e nomes aleatórios (vocabulário grande, mais perto de um cadastro real com sobrenomes variados).
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_nomes [--registros 300000]
+import argparse
+import random
+import string
+import time
+
+from benchmarks.comum import cronometrar, resumo
+from gerador_comandos import _nome
+from indice_nomes import IndiceNomes
+
+
+def nomes_gerados(n, rng):
+    return [_nome(rng, rng.random() < 0.5) for _ in range(n)]
+
+
+def nomes_aleatorios(n, rng):
+    return [" ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))).title()
+                     for _ in range(rng.choice((2, 3, 3, 4)))) for _ in range(n)]
+
+
+def com_erros(nome, rng):
+    # consulta como chega do /comando: sem acento, minúsculas e às vezes uma letra trocada
+    consulta = nome.lower().translate(str.maketrans("áâãàéêíóôõúüç", "aaaaeeiooouuc"))
+    if rng.random() < 0.5:
+        i = rng.randrange(len(consulta))
+        consulta = consulta[:i] + rng.choice(string.ascii_lowercase) + consulta[i + 1:]
+    return consulta
+
+
+def montar(nomes):
+    indice = IndiceNomes()
+    inicio = time.perf_counter()
+    indice.carregar(enumerate(nomes))
+    return indice, time.perf_counter() - inicio
+
+
+def suite(registros=300_000, consultas=1000, semente=0):
+    rng = random.Random(semente)
+    resultados = {}
+    for caso, gerar in (("gerados", nomes_gerados), ("aleatorios", nomes_aleatorios)):
+        nomes = gerar(registros, rng)
+        indice, segundos = montar(nomes)
+        amostra = [com_erros(nome, rng) for nome in rng.sample(nomes, consultas + 1)]
+        proxima = iter(amostra)
+        r = resumo(cronometrar(lambda: indice.buscar(next(proxima)), repeticoes=consultas))
+        resultados[caso] = {**r, "registros": registros, "carga_s": round(segundos, 2)}
+    return resultados
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--registros", type=int, default=300_000)
+    ap.add_argument("--consultas", type=int, default=1000)
+    args = ap.parse_args()
+    for caso, r in suite(args.registros, args.consultas).items():
+        print(f"{caso:>10}: registros={r['registros']} carga={r['carga_s']}s p50={r['p50_ms']:.3f}ms "
+              f"p95={r['p95_ms']:.3f}ms p99={r['p99_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_tokenizer.py
+# Vazão (caracteres/s) do CharTokenizer com tabela por code point contra a implementação
+# anterior (dicionário + list comprehension por caractere), em encode/decode e nas versões
+# em lote que vão direto para tensores [B, seq_len]. suite(): latência de cada operação sobre o
+# corpus inteiro, para o runner (benchmarks/rodar.py).
+# Uso (a partir de MachineLearning/): python -m benchmarks.bench_tokenizer
+import argparse
+import json
+import time
+
+import torch
+
+from benchmarks.comum import cronometrar, resumo
+from model.tokenizer import CharTokenizer, VOCABULARIOS
+
+
+class TokenizerDicionario:
+    # implementação anterior, mantida aqui só como referência de desempenho
+    def __init__(self, chars):
+        self.vocab = {c: i for i, c in enumerate(chars)}
+        self.inv_vocab = {i: c for c, i in self.vocab.items()}
+
+    def encode(self, text, seq_len=None):
+        tokens = [self.vocab[c] for c in text if c in self.vocab]
+        if seq_len:
+            tokens = tokens + [0] * (seq_len - len(tokens)) if len(tokens) < seq_len else tokens[:seq_len]
+        return tokens
+
+    def decode(self, tokens):
+        return "".join([self.inv_vocab[t] for t in tokens if t in self.inv_vocab])
+
+
+def textos_dataset():
+    with open("dataset/comandos.json", encoding="utf-8") as f:
+        dados = json.load(f)
+    return [d["comando"] for d in dados] + [json.dumps(d["json"], ensure_ascii=False) for d in dados]
+
+
+def medir(funcao, repeticoes):
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def suite(repeticoes=10, seq_len=128, copias=20):
+    # o dataset é pequeno: `copias` vezes o corpus, para cada chamada durar alguns ms
+    textos = textos_dataset() * copias
+    caracteres = sum(len(t) for t in textos)
+    tokenizer = CharTokenizer()
+    ids = tokenizer.encode_batch(textos, seq_len=seq_len)
+    listas = ids.tolist()
+    casos = {
+        "encode": (caracteres, lambda: [tokenizer.encode(t, seq_len) for t in textos]),
+        "encode_batch": (caracteres, lambda: tokenizer.encode_batch(textos, seq_len=seq_len)),
+        "decode": (ids.numel(), lambda: [tokenizer.decode(t) for t in listas]),
+        "decode_batch": (ids.numel(), lambda: tokenizer.decode_batch(ids)),
+    }
+    resultados = {}
+    for nome, (volume, funcao) in casos.items():
+        r = resumo(cronometrar(funcao, repeticoes))
+        resultados[nome] = {**r, "mcaracteres_por_s": volume / (r["p50_ms"] / 1000) / 1e6}
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--seq-len", type=int, default=128)
+    args = parser.parse_args()
+
+    textos = textos_dataset()
+    caracteres = sum(len(t) for t in textos)
+    antigo = TokenizerDicionario(VOCABULARIOS[2])
+    novo = CharTokenizer(2)
+    L = args.seq_len
+
+    ids = novo.encode_batch(textos, seq_len=L)
+    listas = ids.tolist()
+    assert [antigo.encode(t, L) for t in textos] == listas
+    assert [antigo.decode(t) for t in listas] == novo.decode_batch(ids)
+
+    casos = [
+        ("encode", "dicionário", lambda: torch.tensor([antigo.encode(t, L) for t in textos])),
+        ("encode", "tabela", lambda: torch.tensor([novo.encode(t, L) for t in textos])),
+        ("encode", "encode_batch", lambda: novo.encode_batch(textos, seq_len=L)),
+        ("decode", "dicionário", lambda: [antigo.decode(t) for t in ids.tolist()]),
+        ("decode", "tabela", lambda: [novo.decode(t) for t in ids.tolist()]),
+        ("decode", "decode_batch", lambda: novo.decode_batch(ids)),
+    ]
+    print(f"{len(textos)} textos, {caracteres} caracteres, saída [B, {L}]")
+    # encode lê os caracteres dos textos; decode escreve B * L caracteres
+    volume = {"encode": caracteres, "decode": ids.numel()}
+    base = {}
+    for operacao, nome, funcao in casos:
+        segundos = medir(funcao, args.repeticoes)
+        base.setdefault(operacao, segundos)
+        print(f"{operacao:>6} {nome:>13}: {volume[operacao] / segundos / 1e6:7.2f} M caracteres/s "
+              f"({segundos * 1000:.3f} ms, {base[operacao] / segundos:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# benchmarks/comum.py
+# Percentis e medição repetida usados pelos benchmarks e pelo runner (benchmarks/rodar.py).
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+PERCENTIS = (50, 95, 99)
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    k = min(len(valores) - 1, max(0, round(p / 100 * (len(valores) - 1))))
+    return valores[k]
+
+
+def resumo(latencias: List[float]) -> Dict[str, float]:
+    # latências em segundos -> n, p50/p95/p99, média e máximo em ms
+    return {
+        "n": len(latencias),
+        **{f"p{p}_ms": percentil(latencias, p) * 1000 for p in PERCENTIS},
+        "media_ms": statistics.fmean(latencias) * 1000,
+        "max_ms": max(latencias) * 1000,
+    }
+
+
+def cronometrar(funcao: Callable[[], object], repeticoes: int, aquecimento: int = 1) -> List[float]:
+    # duração (s) de cada chamada, depois de `aquecimento` chamadas descartadas
+    for _ in range(aquecimento):
+        funcao()
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def comandos_reais(caminho: str = "dataset/comandos.json") -> List[str]:
+    with open(caminho, encoding="utf-8") as f:
+        return [d["comando"] for d in json.load(f)]
@@ -0,0 +1,165 @@
+# benchmarks/rodar.py
+# Runner da suíte de benchmarks: interpretador, tokenizer, forward do MiniLLM, índice de nomes, agenda
+# e POST /comando.
+# Grava os resultados em JSON (p50/p95/p99 por caso, mais o ambiente da medição) e compara com a
+# base gravada; sai com código 1 se algum caso regrediu além da tolerância, para barrar o deploy.
+# Uso (a partir de MachineLearning/):
+#   python -m benchmarks.rodar                         # todas as suítes, contra benchmarks/base.json
+#   python -m benchmarks.rodar --suites tokenizer modelo --rapido
+#   python -m benchmarks.rodar --gravar-base           # aceita os resultados como nova base
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import torch
+
+from dataset_tokenizado import escrever_json
+
+BASE = "benchmarks/base.json"
+PASTA_RESULTADOS = "benchmarks/resultados"
+# métricas comparadas com a base; p99 é mostrado, mas com poucas amostras oscila demais para barrar
+METRICAS_REGRESSAO = ("p50_ms", "p95_ms")
+TOLERANCIA = 0.25
+# aumento absoluto mínimo para contar como regressão (casos de microssegundos oscilam muito)
+MINIMO_MS = 0.05
+
+
+def _interpretador(rapido):
+    from benchmarks import bench_interpretador
+    return bench_interpretador.suite(repeticoes=1 if rapido else 5)
+
+
+def _tokenizer(rapido):
+    from benchmarks import bench_tokenizer
+    return bench_tokenizer.suite(repeticoes=5 if rapido else 20)
+
+
+def _modelo(rapido):
+    from benchmarks import bench_modelo
+    return bench_modelo.suite(repeticoes=10 if rapido else 30)
+
+
+def _nomes(rapido):
+    from benchmarks import bench_nomes
+    return bench_nomes.suite(registros=50_000 if rapido else 300_000, consultas=200 if rapido else 1000)
+
+
+def _agenda(rapido):
+    from benchmarks import bench_agenda
+    return bench_agenda.suite(registros=50_000 if rapido else 300_000, consultas=200 if rapido else 1000)
+
+
+def _http(rapido):
+    from benchmarks import bench_http
+    return bench_http.suite(requisicoes=100 if rapido else 400)
+
+
+# importadas sob demanda: modelo e http carregam os pesos do MiniLLM
+SUITES = {
+    "interpretador": _interpretador,
+    "tokenizer": _tokenizer,
+    "modelo": _modelo,
+    "nomes": _nomes,
+    "agenda": _agenda,
+    "http": _http,
+}
+
+
+def ambiente():
+    # o que precisa ser igual para a comparação com a base fazer sentido
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "plataforma": platform.platform(),
+        "processador": platform.machine(),
+        "cpus": os.cpu_count(),
+        "threads_torch": torch.get_num_threads(),
+        "commit": commit,
+    }
+
+
+def comparar(atual, base, tolerancia, minimo_ms=MINIMO_MS):
+    # [(suite, caso, {métrica: delta relativo}, regrediu)] para os casos presentes nos dois
+    linhas = []
+    for suite, casos in atual["suites"].items():
+        for caso, r in casos.items():
+            anterior = base["suites"].get(suite, {}).get(caso)
+            if anterior is None:
+                continue
+            deltas = {m: r[m] / anterior[m] - 1 for m in ("p50_ms", "p95_ms", "p99_ms") if anterior.get(m)}
+            regrediu = any(deltas.get(m, 0) > tolerancia and r[m] - anterior[m] > minimo_ms
+                           for m in METRICAS_REGRESSAO)
+            linhas.append((suite, caso, deltas, regrediu))
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=list(SUITES))
+    parser.add_argument("--rapido", action="store_true", help="menos repetições (checagem local)")
+    parser.add_argument("--base", default=BASE)
+    parser.add_argument("--saida", default=None, help=f"padrão: {PASTA_RESULTADOS}/<data>.json")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="aumento relativo de p50/p95 aceito em relação à base")
+    parser.add_argument("--minimo-ms", type=float, default=MINIMO_MS,
+                        help="aumento absoluto abaixo do qual não há regressão")
+    parser.add_argument("--gravar-base", action="store_true")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rapido": args.rapido,
+        "ambiente": ambiente(),
+        "suites": {},
+    }
+    for nome in args.suites:
+        inicio = time.perf_counter()
+        resultado["suites"][nome] = SUITES[nome](args.rapido)
+        print(f"[{nome}] {time.perf_counter() - inicio:.1f}s")
+        for caso, r in resultado["suites"][nome].items():
+            print(f"  {caso:>16}: p50={r['p50_ms']:9.3f}ms p95={r['p95_ms']:9.3f}ms p99={r['p99_ms']:9.3f}ms")
+
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    escrever_json(saida, resultado)
+    print(f"resultados em {saida}")
+
+    if args.gravar_base:
+        escrever_json(args.base, resultado)
+        print(f"base gravada em {args.base}")
+        return 0
+    if not os.path.exists(args.base):
+        print(f"sem base em {args.base} (use --gravar-base)")
+        return 0
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    diferentes = [k for k in ("torch", "processador", "cpus", "threads_torch")
+                  if base["ambiente"].get(k) != resultado["ambiente"][k]]
+    if diferentes:
+        print(f"aviso: ambiente diferente da base em {', '.join(diferentes)}; compare com cautela")
+    if base.get("rapido") != args.rapido:
+        print("aviso: base e resultados com números de repetições diferentes (--rapido)")
+
+    linhas = comparar(resultado, base, args.tolerancia, args.minimo_ms)
+    print(f"comparação com {args.base} (commit {base['ambiente'].get('commit')}, tolerância {args.tolerancia:.0%}):")
+    for suite, caso, deltas, regrediu in linhas:
+        texto = " ".join(f"Δ{m[:-3]}={d:+7.1%}" for m, d in deltas.items())
+        print(f"  {suite + '/' + caso:>30}: {texto}{'  REGRESSÃO' if regrediu else ''}")
+    regressoes = sum(1 for *_, regrediu in linhas if regrediu)
+    print(f"{regressoes} regressão(ões) em {len(linhas)} caso(s)")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# cache_comandos.py
+# Cache LRU com TTL dos resultados do interpretador, chaveado pelo texto normalizado.
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import datas
+
+CAPACIDADE = 4096
+TTL = 3600.0  # segundos
+
+
+def normalizar(texto: str) -> str:
+    # colapsa espaços (mesma definição de espaço do \s do re) e ignora maiúsculas
+    return " ".join(texto.split()).lower()
+
+
+class CacheComandos:
+    """Cache LRU/TTL na frente do InterpretadorComandos.
+
+    Num miss o interpretador recebe o próprio texto normalizado e o dia de referência, então o
+    valor guardado é função só da chave. Comandos sem ano e com datas relativas ("amanhã")
+    dependem do dia, por isso ele faz parte da chave: na virada do dia as entradas antigas
+    deixam de ser encontradas e saem pelo LRU.
+    Resultados None (comando não entendido) também são guardados; exceções não. Os valores
+    são devolvidos sem cópia e devem ser tratados como imutáveis.
+    """
+
+    def __init__(self, capacidade: int = CAPACIDADE, ttl: Optional[float] = TTL):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self.expirados = 0
+
+    def interpretar(self, texto: str, interpretar: Callable[[str, date], Any],
+                    hoje: Optional[date] = None) -> Tuple[Any, bool]:
+        # devolve (valor, veio_do_cache); `hoje` padrão: o dia atual
+        texto_norm = normalizar(texto)
+        hoje = hoje or datas.hoje()
+        chave = (hoje, texto_norm)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                expira_em, resultado = item
+                if expira_em is None or agora < expira_em:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return resultado, True
+                del self._itens[chave]
+                self.expirados += 1
+            self.falhas += 1
+
+        resultado = interpretar(texto_norm, hoje)
+
+        with self._lock:
+            expira_em = agora + self.ttl if self.ttl is not None else None
+            self._itens[chave] = (expira_em, resultado)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+                self.despejos += 1
+        return resultado, False
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "tamanho": len(self._itens),
+                "capacidade": self.capacidade,
+                "ttl": self.ttl,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "expirados": self.expirados,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            }
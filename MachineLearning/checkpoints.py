@@ -0,0 +1,105 @@
+# checkpoints.py
+# Checkpoints de treino: gravação atômica, retomada e os k melhores pela métrica de validação.
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+
+# métricas do evaluate_model em que menor é melhor; nas demais, maior é melhor
+MENOR_MELHOR = {"avg_loss_per_token", "perplexity"}
+
+
+def salvar_atomico(estado: Dict[str, Any], caminho: str):
+    # grava num temporário da mesma pasta e troca com os.replace: quem lê (ou uma queda no
+    # meio da gravação) nunca vê um arquivo pela metade
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, "wb") as f:
+        torch.save(estado, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+def estado_rng() -> Dict[str, Any]:
+    estado = {
+        "torch": torch.get_rng_state(),
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+    }
+    if torch.cuda.is_available():
+        estado["cuda"] = torch.cuda.get_rng_state_all()
+    return estado
+
+
+def restaurar_rng(estado: Dict[str, Any]):
+    torch.set_rng_state(estado["torch"])
+    random.setstate(estado["python"])
+    np.random.set_state(estado["numpy"])
+    if "cuda" in estado and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(estado["cuda"])
+
+
+class GerenciadorCheckpoints:
+    """Mantém `ultimo.pt` (para retomar) e os `manter` melhores checkpoints pela métrica.
+
+    Os melhores ficam como `melhor_epoca{N}.pt`; ao entrar um novo, o pior além de `manter`
+    é apagado. A lista dos melhores e a contagem de épocas sem melhora vão dentro de cada
+    checkpoint, então a retomada continua o early stopping de onde parou.
+    """
+
+    def __init__(self, pasta: str, metrica: str = "token_accuracy", manter: int = 3):
+        self.pasta = pasta
+        self.metrica = metrica
+        self.manter = manter
+        self.menor_melhor = metrica in MENOR_MELHOR
+        # [(valor, epoca, caminho)], do melhor para o pior
+        self.melhores: List[list] = []
+        self.sem_melhora = 0
+
+    @property
+    def caminho_ultimo(self) -> str:
+        return os.path.join(self.pasta, "ultimo.pt")
+
+    def _melhor_que(self, a: float, b: float) -> bool:
+        return a < b if self.menor_melhor else a > b
+
+    def registrar(self, epoca: int, metricas: Dict[str, float], estado: Dict[str, Any]) -> bool:
+        # devolve True se a época entrou como nova melhor
+        valor = metricas[self.metrica]
+        melhorou = not self.melhores or self._melhor_que(valor, self.melhores[0][0])
+        self.sem_melhora = 0 if melhorou else self.sem_melhora + 1
+        if self.manter > 0 and (len(self.melhores) < self.manter or self._melhor_que(valor, self.melhores[-1][0])):
+            caminho = os.path.join(self.pasta, f"melhor_epoca{epoca:04d}.pt")
+            self.melhores.append([valor, epoca, caminho])
+            self.melhores.sort(key=lambda m: m[0], reverse=not self.menor_melhor)
+            for _, _, removido in self.melhores[self.manter:]:
+                if os.path.exists(removido):
+                    os.remove(removido)
+            self.melhores = self.melhores[:self.manter]
+            salvar_atomico({**estado, "gerenciador": self.estado()}, caminho)
+        return melhorou
+
+    def salvar_ultimo(self, estado: Dict[str, Any]):
+        salvar_atomico({**estado, "gerenciador": self.estado()}, self.caminho_ultimo)
+
+    def estado(self) -> Dict[str, Any]:
+        return {"melhores": self.melhores, "sem_melhora": self.sem_melhora, "metrica": self.metrica}
+
+    def restaurar(self, estado: Dict[str, Any]):
+        # só os melhores que ainda existem nesta pasta: retomar com outra pasta_checkpoints
+        # não apaga arquivos da pasta original
+        if estado.get("metrica") == self.metrica:
+            self.melhores = [m for m in estado["melhores"]
+                             if os.path.dirname(m[2]) == self.pasta and os.path.exists(m[2])]
+            self.sem_melhora = estado["sem_melhora"]
+
+    def melhor(self) -> Optional[str]:
+        return self.melhores[0][2] if self.melhores else None
+
+
+def carregar(caminho: str) -> Dict[str, Any]:
+    # checkpoints têm estado do otimizador e do RNG, não só tensores
+    return torch.load(caminho, map_location="cpu", weights_only=False)
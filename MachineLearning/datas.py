@@ -0,0 +1,200 @@
+# datas.py
+# Normalização de datas e horas dos comandos para o formato ISO ("aaaa-mm-dd", "hh:mm").
+# As tabelas são montadas uma vez no import: meses por extenso, abreviados (com ou sem ponto), com e
+# sem acento e em número; dias da semana; todas as grafias de hora aceitas (9, 09, 9h, 9:30, 09h30).
+# As expressões são compiladas uma vez. Usado pelo InterpretadorComandos e, em lote, na importação.
+#
+# Datas relativas ("hoje", "amanhã", "depois de amanhã", "próxima segunda", "na sexta-feira",
+# "sábado que vem") e datas sem ano dependem de `hoje`, fixado por quem chama: uma requisição ou um
+# lote inteiro usa o mesmo dia, mesmo que passe da meia-noite no meio. Um dia da semana é sempre o
+# próximo depois de hoje (numa segunda, "segunda" é a da semana seguinte).
+# Datas e horas impossíveis (31/02, 29/02 fora de ano bissexto, mês 13, 25:00) viram None.
+import re
+import time
+import unicodedata
+from datetime import date, timedelta
+from typing import Iterable, List, Optional
+
+MESES_EXTENSO = ("janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro",
+                 "outubro", "novembro", "dezembro")
+DIAS_SEMANA = ("segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo")
+
+
+def sem_acento(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+# --- Tabelas ---
+def _tabela_meses():
+    # grafia -> número do mês
+    tabela = {}
+    for numero, nome in enumerate(MESES_EXTENSO, 1):
+        for forma in (nome, sem_acento(nome)):
+            tabela[forma] = tabela[forma[:3]] = tabela[forma[:3] + "."] = numero
+        tabela[str(numero)] = tabela[f"{numero:02d}"] = numero
+    return tabela
+
+
+def _tabela_semana():
+    # grafia -> dia da semana (0 = segunda, como date.weekday())
+    tabela = {}
+    for numero, nome in enumerate(DIAS_SEMANA):
+        for forma in (nome, sem_acento(nome)):
+            tabela[forma] = numero
+            if numero < 5:
+                tabela[forma + "-feira"] = tabela[forma + " feira"] = numero
+    return tabela
+
+
+def _tabela_horas():
+    # grafia -> "hh:mm"
+    tabela = {}
+    for h in range(24):
+        for forma in {str(h), f"{h:02d}"}:
+            tabela[forma] = tabela[forma + "h"] = f"{h:02d}:00"
+            for m in range(60):
+                tabela[f"{forma}:{m:02d}"] = tabela[f"{forma}h{m:02d}"] = f"{h:02d}:{m:02d}"
+    return tabela
+
+
+def _tabela_mes_dia():
+    # (mês, dia) -> "-mm-dd" para todo dia que existe em algum ano (29/02 é conferido à parte)
+    return {(m, d): f"-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 32)
+            if d <= (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)[m - 1]}
+
+
+MESES = _tabela_meses()
+SEMANA = _tabela_semana()
+HORAS = _tabela_horas()
+_MES_DIA = _tabela_mes_dia()
+# deslocamento em dias das expressões relativas que não são dia da semana
+_DESLOCAMENTOS = {"hoje": 0, "amanhã": 1, "amanha": 1, "depois de amanhã": 2, "depois de amanha": 2}
+
+# --- Expressões ---
+_SEMANA_ALTERNATIVAS = "|".join(re.escape(f) for f in sorted(SEMANA, key=len, reverse=True))
+# fragmento (sem grupos de captura) para compor outros padrões, como os do interpretador
+PADRAO_RELATIVA = (
+    r"depois\s+de\s+amanh[ãa]|amanh[ãa]|hoje|"
+    rf"(?:(?:n[oa]|nest[ea]|est[ea])\s+)?(?:pr[óo]xim[oa]\s+)?(?:{_SEMANA_ALTERNATIVAS})(?:\s+que\s+vem)?"
+)
+_RE_RELATIVA = re.compile(rf"(?<!\w)(?:{PADRAO_RELATIVA})(?!\w)")
+_RE_DIA_SEMANA = re.compile(rf"(?<!\w)(?:{_SEMANA_ALTERNATIVAS})(?!\w)")
+_RE_ESPACOS = re.compile(r"\s+")
+
+_MESES_ALTERNATIVAS = "|".join(re.escape(f) for f in sorted((f for f in MESES if not f[0].isdigit()),
+                                                            key=len, reverse=True))
+# data em texto livre: ISO, numérica (dd/mm[/aa[aa]], com / ou -) ou com o mês por extenso
+_RE_DATA = re.compile(
+    r"(?<!\d)(\d{4})-(\d{2})-(\d{2})(?!\d)"
+    r"|(?<!\d)(\d{1,2})[/-](\d{1,2})(?:[/-](\d{4}|\d{2}))?(?![\d/])"
+    rf"|(?<!\d)(\d{{1,2}})\s*(?:de\s+)?({_MESES_ALTERNATIVAS})(?!\w)(?:\s*(?:de\s+)?(\d{{4}}|\d{{2}})(?![\d:h]))?"
+)
+# hora em texto livre: com ":" ou "h", ou um número sozinho logo depois de "às", "as" ou "das"
+_RE_HORA = re.compile(r"(?<![\d/:])(\d{1,2}[:h]\d{2}|\d{1,2}h|(?:(?<=às )|(?<=as )|(?<=das ))\d{1,2})(?![\d/:])")
+# data e hora já normalizadas ("aaaa-mm-ddThh:mm"), como sai do interpretador
+_RE_ISO = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}:\d{2})")
+
+_hoje: Optional[date] = None
+_fim_do_dia = 0.0
+
+
+def hoje() -> date:
+    # date.today() só é recalculado depois da meia-noite local
+    global _hoje, _fim_do_dia
+    agora = time.time()
+    if agora >= _fim_do_dia:
+        _hoje = date.today()
+        _fim_do_dia = time.mktime((_hoje + timedelta(days=1)).timetuple())
+    return _hoje
+
+
+# --- Normalização ---
+def data(dia_s: str, mes_s: str, ano_s: Optional[str], hoje_: Optional[date] = None) -> Optional[str]:
+    """Dia, mês (número ou nome) e ano (2 ou 4 dígitos; sem ano = ano de hoje) -> "aaaa-mm-dd"."""
+    mes_s = mes_s.lower()
+    mes = MESES.get(mes_s)
+    if mes is None and mes_s.rstrip(".").isalpha():
+        # outras grafias que começam pela abreviação ("setembr", "dezembr.")
+        mes = MESES.get(mes_s[:3])
+    if mes is None or not dia_s.isdigit():
+        return None
+    dia = int(dia_s)
+    sufixo = _MES_DIA.get((mes, dia))
+    if sufixo is None:
+        return None
+    if ano_s:
+        if not ano_s.isdigit():
+            return None
+        ano = int(ano_s)
+        if ano < 100:  # 2 dígitos -> 2000+
+            ano += 2000
+    else:
+        ano = (hoje_ or hoje()).year
+    if mes == 2 and dia == 29 and not (ano % 4 == 0 and (ano % 100 != 0 or ano % 400 == 0)):
+        return None
+    return f"{ano:04d}{sufixo}"
+
+
+def hora(texto: Optional[str]) -> Optional[str]:
+    """9, 09, 9h, 9:30, 09h30 -> "hh:mm"; None se não for uma hora válida."""
+    if not texto:
+        return None
+    return HORAS.get(texto.strip().lower())
+
+
+def relativa(expressao: str, hoje_: Optional[date] = None) -> Optional[str]:
+    """"amanhã", "depois de amanhã", "próxima segunda" etc. -> "aaaa-mm-dd"."""
+    hoje_ = hoje_ or hoje()
+    expressao = _RE_ESPACOS.sub(" ", expressao.strip().lower())
+    deslocamento = _DESLOCAMENTOS.get(expressao)
+    if deslocamento is None:
+        m = _RE_DIA_SEMANA.search(expressao)
+        if m is None:
+            return None
+        deslocamento = (SEMANA[m.group(0)] - hoje_.weekday() - 1) % 7 + 1
+    return (hoje_ + timedelta(days=deslocamento)).isoformat()
+
+
+def normalizar(texto: str, hoje_: Optional[date] = None) -> Optional[str]:
+    """Data e hora em texto livre -> "aaaa-mm-ddThh:mm" (ou só "aaaa-mm-dd" sem hora).
+
+    Aceita "10/11/2025 14:30", "12 de novembro às 9h", "2025-11-12 09:00", "amanhã às 10" etc.
+    A hora é procurada depois da data. None se não houver data ou ela for impossível.
+    """
+    texto = texto.lower()
+    m = _RE_DATA.search(texto)
+    if m is not None:
+        g = m.groups()
+        if g[0]:
+            dia_iso = data(g[2], g[1], g[0], hoje_)
+        elif g[3]:
+            dia_iso = data(g[3], g[4], g[5], hoje_)
+        else:
+            dia_iso = data(g[6], g[7], g[8], hoje_)
+    else:
+        m = _RE_RELATIVA.search(texto)
+        if m is None:
+            return None
+        dia_iso = relativa(m.group(0), hoje_)
+    if dia_iso is None:
+        return None
+    h = _RE_HORA.search(texto, m.end())
+    if h is None:
+        return dia_iso
+    hora_iso = hora(h.group(1))
+    return f"{dia_iso}T{hora_iso}" if hora_iso else None
+
+
+def iso_valido(texto) -> bool:
+    """True se `texto` for exatamente "aaaa-mm-ddThh:mm" com data e hora possíveis (valida saídas do MiniLLM)."""
+    m = _RE_ISO.fullmatch(texto) if isinstance(texto, str) else None
+    if m is None:
+        return False
+    ano, mes, dia, hora_s = m.groups()
+    return data(dia, mes, ano) == f"{ano}-{mes}-{dia}" and hora(hora_s) == hora_s
+
+
+def normalizar_lote(textos: Iterable[str], hoje_: Optional[date] = None) -> List[Optional[str]]:
+    """normalizar() de cada texto com o mesmo `hoje` para o lote inteiro."""
+    hoje_ = hoje_ or hoje()
+    return [normalizar(t, hoje_) for t in textos]
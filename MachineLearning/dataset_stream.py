@@ -0,0 +1,127 @@
+# dataset_stream.py
+# IterableDataset sobre os shards JSONL do gerador_comandos.py, lidos linha a linha: nada é
+# carregado inteiro, então o tamanho do corpus não é limitado pela memória.
+#
+# Cada worker do DataLoader lê uma parte disjunta dos dados (shards inteiros quando há pelo menos
+# um por worker, senão linhas intercaladas dos mesmos shards) e embaralha com um buffer de
+# `buffer` exemplos. A ordem dos shards e o buffer são semeados com (semente, época, worker):
+# a mesma época gera os mesmos lotes para o mesmo número de workers.
+# No treino distribuído (`replicas` processos) a partição é entre todos os workers de todos os
+# processos: o worker w do processo r é o leitor r * workers + w de replicas * workers.
+import json
+import math
+import os
+import random
+from typing import Iterator, List, Tuple
+
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+from model.tokenizer import CharTokenizer
+
+BUFFER = 10_000
+
+
+def embaralhar(itens, buffer: int, rng: random.Random):
+    # embaralhamento aproximado em memória constante: cada item entra num buffer de `buffer`
+    # posições e sai um escolhido ao acaso; buffer <= 1 mantém a ordem
+    if buffer <= 1:
+        yield from itens
+        return
+    reservado = []
+    for item in itens:
+        if len(reservado) < buffer:
+            reservado.append(item)
+            continue
+        i = rng.randrange(buffer)
+        yield reservado[i]
+        reservado[i] = item
+    rng.shuffle(reservado)
+    yield from reservado
+
+
+class ComandosStream(IterableDataset):
+    """Exemplos (x, y) uint8 [seq_len] dos shards de uma pasta do gerador_comandos.
+
+    Mesmo formato do ComandoDataset, para o collate aparar_lote. set_epoca(e) muda a ordem
+    da época; com workers persistentes a mudança não chega aos workers, então o DataLoader
+    deve recriá-los a cada época (persistent_workers=False).
+    """
+
+    def __init__(self, pasta: str, tokenizer: CharTokenizer, seq_len: int = 128, buffer: int = BUFFER,
+                 semente: int = 0, embaralhar_shards: bool = True, rank: int = 0, replicas: int = 1):
+        self.rank = rank
+        self.replicas = replicas
+        self.tokenizer = tokenizer
+        self.seq_len = seq_len
+        self.buffer = buffer
+        self.semente = semente
+        self.embaralhar_shards = embaralhar_shards
+        self.epoca = 0
+        with open(os.path.join(pasta, "manifesto.json"), encoding="utf-8") as f:
+            manifesto = json.load(f)
+        # (caminho, linhas) de cada shard, na ordem do manifesto
+        self.shards = [(os.path.join(pasta, s["arquivo"]), s["linhas"]) for s in manifesto["shards"]]
+        self.total = manifesto["total"]
+
+    def set_epoca(self, epoca: int):
+        self.epoca = epoca
+
+    def __len__(self):
+        return self.total
+
+    def _ordem(self) -> List[Tuple[str, int]]:
+        # mesma ordem em todos os workers (semente sem o worker), para a partição ser disjunta
+        ordem = list(self.shards)
+        if self.embaralhar_shards:
+            random.Random(f"{self.semente}/{self.epoca}").shuffle(ordem)
+        return ordem
+
+    def exemplos_por_worker(self, workers: int) -> List[int]:
+        # exemplos de cada leitor global (workers por processo x réplicas)
+        workers = max(1, workers) * self.replicas
+        ordem = self._ordem()
+        if len(ordem) >= workers:
+            return [sum(linhas for _, linhas in ordem[w::workers]) for w in range(workers)]
+        return [len(range(w, self.total, workers)) for w in range(workers)]
+
+    def lotes(self, batch_size: int, workers: int = 0, rank: int = None) -> int:
+        # lotes da época no DataLoader do processo `rank` (padrão: o deste dataset): cada worker
+        # monta os próprios lotes, então o último lote de cada um pode vir incompleto
+        rank = self.rank if rank is None else rank
+        por_processo = max(1, workers)
+        leitores = self.exemplos_por_worker(workers)[rank * por_processo:(rank + 1) * por_processo]
+        return sum(math.ceil(n / batch_size) for n in leitores)
+
+    def _linhas(self, worker: int, workers: int) -> Iterator[str]:
+        ordem = self._ordem()
+        if len(ordem) >= workers:
+            for caminho, _ in ordem[worker::workers]:
+                with open(caminho, encoding="utf-8") as f:
+                    yield from f
+            return
+        # menos shards que workers: todos leem todos os shards e ficam com linhas intercaladas
+        n = 0
+        for caminho, _ in ordem:
+            with open(caminho, encoding="utf-8") as f:
+                for linha in f:
+                    if n % workers == worker:
+                        yield linha
+                    n += 1
+
+    def _exemplo(self, linha: str) -> Tuple[torch.Tensor, torch.Tensor]:
+        d = json.loads(linha)
+        # como no cache do ComandoDataset: com vocabulário acentuado o JSON mantém "João"
+        resposta = json.dumps(d["json"], ensure_ascii=not self.tokenizer.acentos)
+        x = torch.tensor(self.tokenizer.encode(d["comando"], self.seq_len), dtype=torch.uint8)
+        y = torch.tensor(self.tokenizer.encode(resposta, self.seq_len), dtype=torch.uint8)
+        return x, y
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        worker, workers = self.rank * workers + worker, self.replicas * workers
+        rng = random.Random(f"{self.semente}/{self.epoca}/{worker}")
+        # embaralha as linhas (strings), não os tensores: o buffer ocupa menos memória
+        for linha in embaralhar(self._linhas(worker, workers), self.buffer, rng):
+            yield self._exemplo(linha)
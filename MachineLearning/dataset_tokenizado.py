@@ -0,0 +1,182 @@
+# dataset_tokenizado.py
+# Cache pré-tokenizado do dataset: entradas e alvos já codificados em shards .npy contíguos
+# (uint8, [n, seq_len]) com um índice JSON, lidos depois por memory map.
+#
+# O cache fica em dataset/cache/<nome da fonte>/ e é refeito sozinho quando muda o conteúdo
+# do JSON de origem, o vocabulário do tokenizer, o seq_len ou o formato do cache. A reconstrução
+# roda com um flock em dataset/cache/<nome>.lock: processos que chegam juntos (ranks do treino
+# distribuído, workers) esperam o primeiro terminar e reaproveitam o cache que ele gravou.
+# Pré-processamento manual (opcional; o ComandoDataset faz isso sob demanda):
+#   python dataset_tokenizado.py [dataset/comandos.json]
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import List, Tuple
+
+import numpy as np
+import torch
+
+from model.tokenizer import VOCABULARIOS, CharTokenizer
+
+PASTA_CACHE = "dataset/cache"
+FORMATO = 1
+LINHAS_POR_SHARD = 65536
+
+
+def _sha256(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _assinatura(tokenizer: CharTokenizer, seq_len: int) -> dict:
+    # tudo, além do conteúdo da fonte, que muda os bytes dos shards
+    vocab = hashlib.sha256(VOCABULARIOS[tokenizer.versao].encode("utf-8")).hexdigest()
+    return {"formato": FORMATO, "vocab_versao": tokenizer.versao, "vocab_sha256": vocab, "seq_len": seq_len}
+
+
+def _pasta(fonte: str) -> str:
+    return os.path.join(PASTA_CACHE, os.path.splitext(os.path.basename(fonte))[0])
+
+
+def _indice_valido(fonte: str, pasta: str, assinatura: dict):
+    # devolve o índice se o cache corresponde à fonte e ao tokenizer; tamanho+mtime iguais
+    # dispensam reler a fonte, senão o sha256 decide (arquivo tocado sem mudar o conteúdo)
+    try:
+        with open(os.path.join(pasta, "indice.json"), encoding="utf-8") as f:
+            indice = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if indice.get("assinatura") != assinatura:
+        return None
+    st = os.stat(fonte)
+    if indice["fonte"]["tamanho"] == st.st_size and indice["fonte"]["mtime_ns"] == st.st_mtime_ns:
+        return indice
+    if indice["fonte"]["sha256"] != _sha256(fonte):
+        return None
+    indice["fonte"]["mtime_ns"] = st.st_mtime_ns
+    escrever_json(os.path.join(pasta, "indice.json"), indice)
+    return indice
+
+
+def escrever_json(caminho: str, conteudo):
+    # gravação atômica (temporário + os.replace)
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(conteudo, f, indent=2)
+    os.replace(temporario, caminho)
+
+
+def preparar(fonte: str, tokenizer: CharTokenizer, seq_len: int = 128) -> Tuple[str, dict]:
+    """Garante o cache atualizado da fonte e devolve (pasta, índice)."""
+    pasta = _pasta(fonte)
+    assinatura = _assinatura(tokenizer, seq_len)
+    indice = _indice_valido(fonte, pasta, assinatura)
+    if indice is not None:
+        return pasta, indice
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    with open(f"{pasta}.lock", "a") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            # outro processo pode ter refeito o cache enquanto este esperava
+            indice = _indice_valido(fonte, pasta, assinatura)
+            if indice is None:
+                indice = _construir(fonte, pasta, tokenizer, seq_len, assinatura)
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+    return pasta, indice
+
+
+def _construir(fonte: str, pasta: str, tokenizer: CharTokenizer, seq_len: int, assinatura: dict) -> dict:
+    # chamado com a trava de preparar(): um só processo troca a pasta por vez
+    st = os.stat(fonte)
+    sha = _sha256(fonte)
+    with open(fonte, encoding="utf-8") as f:
+        dados = json.load(f)
+    comandos = [d["comando"] for d in dados]
+    # com vocabulário acentuado o JSON mantém "João"; no antigo (v1) os acentos viravam \uXXXX
+    respostas = [json.dumps(d["json"], ensure_ascii=not tokenizer.acentos) for d in dados]
+    del dados
+
+    # escreve numa pasta temporária e troca no fim: quem já tem os shards antigos mapeados
+    # continua lendo os arquivos antigos até fechá-los
+    temporaria = f"{pasta}.tmp-{os.getpid()}"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    os.makedirs(temporaria)
+    shards = []
+    for inicio in range(0, len(comandos), LINHAS_POR_SHARD):
+        fim = min(inicio + LINHAS_POR_SHARD, len(comandos))
+        x = tokenizer.encode_batch(comandos[inicio:fim], seq_len=seq_len).numpy().astype(np.uint8)
+        y = tokenizer.encode_batch(respostas[inicio:fim], seq_len=seq_len).numpy().astype(np.uint8)
+        comprimentos = np.array([min(len(tokenizer.encode(c)), seq_len) for c in comandos[inicio:fim]], dtype=np.int16)
+        nome = f"{len(shards):05d}"
+        np.save(os.path.join(temporaria, f"x_{nome}.npy"), x)
+        np.save(os.path.join(temporaria, f"y_{nome}.npy"), y)
+        np.save(os.path.join(temporaria, f"comprimentos_{nome}.npy"), comprimentos)
+        shards.append({"nome": nome, "inicio": inicio, "linhas": fim - inicio})
+    escrever_json(os.path.join(temporaria, "indice.json"), {
+        "assinatura": assinatura,
+        "fonte": {"caminho": fonte, "tamanho": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha},
+        "total": len(comandos),
+        "shards": shards,
+    })
+
+    antiga = f"{pasta}.antiga-{os.getpid()}"
+    if os.path.exists(pasta):
+        os.replace(pasta, antiga)
+    os.replace(temporaria, pasta)
+    shutil.rmtree(antiga, ignore_errors=True)
+    with open(os.path.join(pasta, "indice.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ShardsTokenizados:
+    """Leitura por memory map dos shards de um cache (ver preparar).
+
+    item(i) devolve views (x, y) de uma linha, sem cópia: tensores uint8 de seq_len posições
+    sobre o arquivo mapeado. O mapeamento é copy-on-write, então nada volta ao disco.
+    """
+
+    def __init__(self, pasta: str, indice: dict):
+        self._pasta = pasta
+        self._indice = indice
+        self.total = indice["total"]
+        # caminho, tamanho, mtime e sha256 do JSON de origem
+        self.fonte = indice["fonte"]
+        self._inicios = [s["inicio"] for s in indice["shards"]]
+        self._x = [np.load(os.path.join(pasta, f"x_{s['nome']}.npy"), mmap_mode="c") for s in indice["shards"]]
+        self._y = [np.load(os.path.join(pasta, f"y_{s['nome']}.npy"), mmap_mode="c") for s in indice["shards"]]
+        self.comprimentos: List[int] = []
+        for s in indice["shards"]:
+            self.comprimentos += np.load(os.path.join(pasta, f"comprimentos_{s['nome']}.npy")).tolist()
+
+    def __getstate__(self):
+        # workers do DataLoader iniciados com spawn reabrem os mapas em vez de copiar os dados
+        return {"pasta": self._pasta, "indice": self._indice}
+
+    def __setstate__(self, estado):
+        self.__init__(estado["pasta"], estado["indice"])
+
+    def __len__(self):
+        return self.total
+
+    def item(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        if idx < 0:
+            idx += self.total
+        if not 0 <= idx < self.total:
+            raise IndexError(idx)
+        s = bisect.bisect_right(self._inicios, idx) - 1
+        i = idx - self._inicios[s]
+        return torch.from_numpy(self._x[s][i]), torch.from_numpy(self._y[s][i])
+
+
+if __name__ == "__main__":
+    fonte = sys.argv[1] if len(sys.argv) > 1 else "dataset/comandos.json"
+    pasta, indice = preparar(fonte, CharTokenizer())
+    print(f"{indice['total']} exemplos em {len(indice['shards'])} shard(s): {pasta}")
@@ -0,0 +1,263 @@
+# decodificacao.py
+# Decodificação da saída do MiniLLM restrita ao formato do JSON de agendamento.
+#
+# O MiniLLM prevê os caracteres da resposta todos de uma vez (um por posição) e o argmax de cada
+# posição é independente: um caractere errado já quebra o json.loads. Aqui a resposta é a
+# sequência de maior logit total entre as que seguem o esquema
+#   {"tipoAtividade": "<texto>", "pacienteNome": "<texto>", "medicoNome": "<texto>",
+#    "inicio": "aaaa-mm-ddThh:mm", "fim": "aaaa-mm-ddThh:mm" | null}<padding>
+# (a serialização do json.dumps dos alvos do treino). Somar logits ou log-probabilidades dá o
+# mesmo caminho: toda sequência usa cada posição exatamente uma vez.
+#
+# O esquema é uma sequência de segmentos: trechos fixos (literais e datas, um conjunto de
+# caracteres por posição), textos de tamanho livre, a escolha do "fim" e o padding final. Em vez
+# de um passo por posição, a busca (Viterbi) dá um passo por segmento, para o lote inteiro: a
+# soma de um trecho fixo em cada início possível é um gather, e o melhor início de um texto que
+# termina em cada posição sai de somas acumuladas e de um máximo acumulado.
+#
+# Os alvos do dataset têm 134 a 161 caracteres e o modelo só produz 128, então a sequência pode
+# terminar no meio do esquema: o texto é completado com o mínimo que fecha o JSON. Um nome
+# cortado fica como está; uma data incompleta é descartada ("inicio" vazio, que
+# lote.dados_do_modelo rejeita, ou "fim": null).
+from typing import List, Tuple
+
+import numpy as np
+import torch
+
+from model.tokenizer import PAD, CharTokenizer
+
+# literais entre os valores, na ordem do esquema
+LITERAIS = ['{"tipoAtividade": "', '", "pacienteNome": "', '", "medicoNome": "', '", "inicio": "', '", "fim": ']
+DIGITOS = "0123456789"
+# caracteres permitidos em cada posição de "aaaa-mm-ddThh:mm"
+DATA_HORA = [DIGITOS] * 4 + ["-", "01", DIGITOS, "-", "0123", DIGITOS, "T", "012", DIGITOS, ":", "012345", DIGITOS]
+
+
+class _Esquema:
+    # estados do esquema (um por posição de cada trecho fixo, um por texto, um para o padding),
+    # com os caracteres permitidos e como completar o JSON se a sequência terminar neles
+    # ((caracteres finais a descartar, sufixo)), agrupados nos segmentos:
+    #   ("fixo", [estados]), ("texto", estado), ("ou", [[estados], [estados]]), ("padding", estado)
+    def __init__(self, tokenizer: CharTokenizer):
+        self.tokenizer = tokenizer
+        self.permitidos: List[frozenset] = []
+        self.completar: List[Tuple[int, str]] = []
+        self.segmentos = []
+
+    def novo(self, chars, descartar=0, sufixo=""):
+        self.permitidos.append(frozenset(self.tokenizer.vocab[c] for c in chars if c in self.tokenizer.vocab))
+        self.completar.append((descartar, sufixo))
+        return len(self.permitidos) - 1
+
+    def construir(self):
+        vocab = self.tokenizer.vocab
+        # valores de texto: qualquer caractere sem escape no JSON (nem aspas, nem controle)
+        texto = [c for c in vocab if c >= " " and c not in '"\\']
+        for i, literal in enumerate(LITERAIS):
+            # o que fecha o JSON depois do literal i com os valores seguintes vazios
+            resto = "".join(LITERAIS[i + 1:]) + "null}"
+            self.segmentos.append(("fixo", [self.novo(c, 0, literal[j + 1:] + resto) for j, c in enumerate(literal)]))
+            if i < 3:
+                self.segmentos.append(("texto", self.novo(texto, 0, resto)))
+            elif i == 3:
+                self.segmentos.append(("fixo", [self.novo(chars, j + 1, resto) for j, chars in enumerate(DATA_HORA)]))
+
+        # "fim": uma data entre aspas ou null
+        data = ([self.novo('"', 1, "null}")] + [self.novo(chars, j + 2, "null}") for j, chars in enumerate(DATA_HORA)]
+                + [self.novo('"', 0, "}")])
+        nulo = [self.novo(c, 0, "null"[j + 1:] + "}") for j, c in enumerate("null")]
+        self.segmentos.append(("ou", [data, nulo]))
+        self.segmentos.append(("fixo", [self.novo("}")]))
+        self.segmentos.append(("padding", self.novo(self.tokenizer.inv_vocab[PAD])))
+        return self
+
+
+def _plano_trecho(T, m):
+    # índices de um trecho fixo de m posições numa saída de T posições: [inícios, offsets] dos
+    # trechos completos e, para os que terminam na posição T-1 no offset j (começando em
+    # T-1-j), [j, offsets] das posições e de quais offsets contam
+    offsets = np.arange(m)
+    completos = np.arange(max(0, T - m + 1))[:, None] + offsets
+    j = np.arange(min(m, T))
+    posicoes = np.minimum((T - 1 - j)[:, None] + offsets, T - 1)
+    return completos, posicoes, offsets <= j[:, None], T - 1 - j
+
+
+class DecodificadorJSON:
+    """Tokens [B, T] das sequências de maior logit que seguem o esquema do JSON.
+
+    decodificador(logits) devolve (tokens, estado final); textos(tokens, estados) decodifica e
+    completa as sequências cortadas antes do fim do esquema. Sempre dá um JSON válido quando
+    T comporta o primeiro literal; o conteúdo continua sendo o que o modelo previu.
+    """
+
+    def __init__(self, tokenizer: CharTokenizer):
+        self.tokenizer = tokenizer
+        esquema = _Esquema(tokenizer).construir()
+        self.completar = esquema.completar
+        V = tokenizer.vocab_size
+        # conjuntos de mais de um caractere viram colunas extras (máximo dos logits do conjunto)
+        classes = sorted({p for p in esquema.permitidos if len(p) > 1}, key=sorted)
+        # ids consecutivos (os dígitos) viram uma fatia dos logits; os demais, um viés 0/-inf
+        self._classes = []
+        for p in classes:
+            if max(p) - min(p) + 1 == len(p):
+                self._classes.append(slice(min(p), max(p) + 1))
+            else:
+                vies = torch.full((V,), float("-inf"))
+                vies[sorted(p)] = 0
+                self._classes.append(vies)
+        coluna = np.array([next(iter(p)) if len(p) == 1 else V + classes.index(p) for p in esquema.permitidos])
+        self._coluna = torch.from_numpy(coluna)
+        # segmentos como (tipo, estados, trechos): texto e padding com o estado e sem trechos; fixo
+        # e "ou" com os trechos (um ou dois) e uma tabela [trechos, maior tamanho] dos estados (o
+        # último repetido no trecho menor), usada na volta
+        self._segmentos = []
+        for tipo, estados in esquema.segmentos:
+            if tipo == "ou":
+                m = max(len(t) for t in estados)
+                tabela = np.array([t + [t[-1]] * (m - len(t)) for t in estados])
+                self._segmentos.append((tipo, tabela, [np.array(t) for t in estados]))
+            elif tipo == "fixo":
+                self._segmentos.append((tipo, np.array([estados]), [np.array(estados)]))
+            else:
+                self._segmentos.append((tipo, estados, None))
+        self._colunas = [coluna[estados] if trechos is None else [coluna[t] for t in trechos]
+                         for _, estados, trechos in self._segmentos]
+        self._planos = {}
+
+    def _para(self, device):
+        if self._coluna.device != device:
+            self._classes = [c if isinstance(c, slice) else c.to(device) for c in self._classes]
+            self._coluna = self._coluna.to(device)
+
+    def __call__(self, logits: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        # logits [B, T, V] -> (tokens [B, T], estado final [B])
+        self._para(logits.device)
+        logits = logits.float()
+        V = logits.shape[-1]
+        maximos, argmaximos = [], []
+        for classe in self._classes:
+            if isinstance(classe, slice):
+                m, a = logits[..., classe].max(-1)
+                a = a + classe.start
+            else:
+                m, a = (logits + classe).max(-1)
+            maximos.append(m)
+            argmaximos.append(a)
+        # pontuação de cada coluna (caractere ou classe) em cada posição, [B, T, V + classes]
+        emissoes = torch.cat([logits, torch.stack(maximos, -1)], -1)
+        estados, final = self._viterbi(emissoes.cpu().numpy())
+        colunas = self._coluna[torch.from_numpy(estados).to(logits.device)]
+        tokens = torch.where(colunas < V, colunas,
+                             torch.stack(argmaximos, -1).gather(2, (colunas - V).clamp(min=0).unsqueeze(-1)).squeeze(-1))
+        return tokens, torch.from_numpy(final)
+
+    def _plano(self, T):
+        # o que só depende de T: índices dos trechos fixos e, para cada caminho que termina na
+        # posição T-1, o estado final, o início do último segmento (-1: calculado na volta), o
+        # segmento e a alternativa do "ou"
+        if T in self._planos:
+            return self._planos[T]
+        trechos, caminhos = [], []
+        for k, (tipo, estados, opcoes) in enumerate(self._segmentos):
+            if tipo == "texto":
+                caminhos.append(([estados], [-1], [k], [0]))
+            elif tipo == "padding":
+                caminhos.append(([estados] * T, range(T), [k] * T, [0] * T))
+            else:
+                planos = [_plano_trecho(T, len(t)) for t in opcoes]
+                trechos.append(planos)
+                for a, (t, plano) in enumerate(zip(opcoes, planos)):
+                    n = len(plano[3])
+                    caminhos.append((t[:n], plano[3], [k] * n, [a] * n))
+        plano = (trechos, *(np.concatenate([np.asarray(x, dtype=np.int64) for x in coluna])
+                            for coluna in zip(*caminhos)))
+        self._planos[T] = plano
+        return plano
+
+    def _viterbi(self, E):
+        # E [B, T, colunas] -> (estado de cada posição [B, T], estado final [B])
+        B, T, _ = E.shape
+        trechos, finais, inicios, segmentos, alternativas = self._plano(T)
+        trechos = iter(trechos)
+        # A[:, p]: melhor prefixo do esquema que termina antes da posição p
+        A = np.full((B, T + 1), -np.inf, dtype=E.dtype)
+        A[:, 0] = 0
+        # pontos dos caminhos que terminam na posição T-1, na ordem do plano
+        pontos = []
+        # o que a volta precisa de cada segmento: A - somas do texto, ou a escolha do "ou"
+        guardados = []
+        for (tipo, estados, opcoes), colunas in zip(self._segmentos, self._colunas):
+            if opcoes is None:
+                soma = np.zeros_like(A)
+                np.cumsum(E[:, :, colunas], 1, out=soma[:, 1:])
+                H = A - soma
+                guardados.append(H)
+                if tipo == "padding":
+                    # padding de p até o fim (p = T: termina no "}", já contado no trecho dele)
+                    pontos.append(A[:, :T] + soma[:, T:] - soma[:, :T])
+                    continue
+                # texto de p até q-1, p < q: soma[q] + max_{p<q}(A[p] - soma[p])
+                novo = np.full_like(A, -np.inf)
+                novo[:, 1:] = soma[:, 1:] + np.maximum.accumulate(H, 1)[:, :-1]
+                pontos.append(novo[:, T:])
+            else:
+                novos = []
+                for cols, (completos, posicoes, contam, comecos) in zip(colunas, next(trechos)):
+                    m = len(cols)
+                    novo = np.full_like(A, -np.inf)
+                    if len(completos):
+                        novo[:, m:] = A[:, :T - m + 1] + E[:, completos, cols].sum(-1)
+                    novos.append(novo)
+                    pontos.append(A[:, comecos] + np.where(contam, E[:, posicoes, cols], 0).sum(-1))
+                if len(novos) > 1:
+                    guardados.append(novos[1] > novos[0])
+                    novo = np.maximum(novos[0], novos[1])
+                else:
+                    guardados.append(None)
+            A = novo
+
+        melhor = np.concatenate(pontos, 1).argmax(1)
+        final, inicio_final = finais[melhor], inicios[melhor]
+        segmento_final, alternativa_final = segmentos[melhor], alternativas[melhor]
+
+        # volta: início de cada segmento, do último ao primeiro
+        linhas, posicoes = np.arange(B), np.arange(T + 1)
+        estado = np.empty((B, T), dtype=np.int64)
+        fim = np.full(B, T)
+        for k in range(len(self._segmentos) - 1, -1, -1):
+            tipo, estados, opcoes = self._segmentos[k]
+            ativo, ultimo = segmento_final >= k, segmento_final == k
+            if tipo == "texto":
+                inicio = np.where(posicoes < fim[:, None], guardados[k], -np.inf).argmax(1)
+            elif tipo == "padding":
+                inicio = inicio_final
+            else:
+                alternativa = 0
+                if tipo == "ou":
+                    alternativa = np.where(ultimo, alternativa_final, guardados[k][linhas, fim])
+                tamanho = np.array([len(t) for t in opcoes])[alternativa]
+                inicio = np.where(ultimo, inicio_final, fim - tamanho)
+            inicio = np.where(ativo, inicio, T)
+
+            dentro = (posicoes[:T] >= inicio[:, None]) & (posicoes[:T] < fim[:, None])
+            if opcoes is None:
+                valor = estados
+            else:
+                # estado do trecho escolhido em cada linha, pelo offset da posição no trecho
+                offset = np.clip(posicoes[:T] - inicio[:, None], 0, estados.shape[1] - 1)
+                valor = estados[np.reshape(alternativa, (-1, 1)), offset]
+            estado = np.where(dentro, valor, estado)
+            fim = np.where(ativo, inicio, fim)
+        return estado, final
+
+    def textos(self, tokens: torch.Tensor, estados: torch.Tensor) -> List[str]:
+        resultado = []
+        for texto, estado in zip(self.tokenizer.decode_batch(tokens), estados.tolist()):
+            descartar, sufixo = self.completar[estado]
+            resultado.append((texto[:len(texto) - descartar] + sufixo) if descartar or sufixo else texto)
+        return resultado
+
+    def decodificar(self, logits: torch.Tensor) -> List[str]:
+        return self.textos(*self(logits))
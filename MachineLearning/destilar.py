@@ -0,0 +1,373 @@
+# destilar.py
+# Destilação do interpretador de regex (professor: InterpretadorComandos, o mesmo de
+# interpretar_comando no main.py) em MiniLLMs menores (alunos), para o modelo poder substituir a
+# cascata de padrões no caminho quente.
+#
+# 1. Rótulos: comandos sem rótulo vindos de logs (--logs: texto puro, uma linha por comando, ou
+#    JSONL com "comando", "mensagem" ou "texto") e/ou gerados pelo gerador_comandos (--gerados N,
+#    cujo JSON é descartado) são rotulados pelo professor num pool de processos. Ficam de fora os
+#    que ele não entende e os de data relativa ("amanhã"): a resposta depende do dia, que o modelo
+#    não vê. Uma fração dos textos (por hash, sem repetir entre os conjuntos) fica para avaliação.
+#    Os logs da API só têm o texto com LOG_REDIGIR_NOMES=0; os redigidos são ignorados.
+#    Saída em <pasta>/rotulos: shards no formato do gerador_comandos (train.py --sinteticos lê) e
+#    avaliacao.jsonl; o manifesto traz quantos rótulos há de cada comprimento em tokens.
+# 2. Alunos (--alunos emb_size:n_heads:n_layers ...): treinados com train_model nos rótulos, cada
+#    um em <pasta>/<aluno>/mini_llm.pth (com a arquitetura ao lado, pronto para MODELO_PESOS).
+#    O seq_len padrão é o do maior rótulo; um --seq-len menor truncaria os alvos do treino e é
+#    recusado (com quantos rótulos seriam truncados).
+#    Com --podar-cabecas K, as K cabeças de atenção menos importantes (as que menos mudam o
+#    acerto por token quando zeradas) têm a saída zerada e o aluno podado é salvo à parte; no
+#    nn.MultiheadAttention a conta continua do mesmo tamanho, então a poda mede só quanto do
+#    modelo é dispensável, não ganha latência.
+# 3. Relatório: concordância com o professor no conjunto de avaliação (JSON inteiro e por campo,
+#    com a decodificação da inferência) e latência p50/p99 de uma requisição, do professor e de
+#    cada aluno, em relatorio.json e relatorio.txt.
+# Uso: python destilar.py --logs comandos.log --gerados 200000 --alunos 32:2:1 64:2:1 --epochs 3
+#      [--podar-cabecas 1] [--threads 1] [--hoje 2026-01-05]
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import shutil
+import time
+import zlib
+from datetime import date
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+
+import datas
+from dataset_tokenizado import escrever_json
+from gerador_comandos import LINHAS_POR_SHARD, gerar_exemplo
+from interpretador import ComandoMuitoLongo, InterpretadorComandos, TempoLimiteExcedido
+from model.carregar import caminho_arquitetura
+from model.tokenizer import CharTokenizer
+
+CAMPOS = ("tipoAtividade", "pacienteNome", "medicoNome", "inicio", "fim")
+CHAVES_TEXTO = ("comando", "mensagem", "texto")
+# padrões do professor cuja resposta depende do dia de hoje
+PADROES_RELATIVOS = {"pattern_relativa"}
+TAMANHO_PEDACO = 1000
+AVALIACAO_PCT = 5
+
+# --- Rótulos do professor ---
+def ler_comandos(caminhos: Iterable[str]) -> Iterator[str]:
+    for caminho in caminhos:
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                if linha.startswith("{"):
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        registro = None
+                    if isinstance(registro, dict):
+                        texto = next((registro[c] for c in CHAVES_TEXTO if isinstance(registro.get(c), str)), None)
+                        # "<42 caracteres>": texto redigido pelo registro.py
+                        if texto and not (texto.startswith("<") and texto.endswith(" caracteres>")):
+                            yield texto
+                        continue
+                yield linha
+
+
+def gerados(total: int, ano: int, semente: int = 0) -> Iterator[str]:
+    # só o texto: o JSON do gerador é descartado e o professor rotula
+    rng = random.Random(f"destilar/{semente}")
+    for _ in range(total):
+        yield gerar_exemplo(rng, ano)["comando"]
+
+
+_professor: Optional[InterpretadorComandos] = None
+
+
+def _rotular_pedaco(textos: List[str], hoje: date) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    # (texto, JSON no formato do dataset ou None, padrão que casou)
+    global _professor
+    if _professor is None:
+        _professor = InterpretadorComandos()
+    rotulos = []
+    for texto in textos:
+        try:
+            resultado, padrao = _professor.interpretar_detalhado(texto, hoje)
+        except (ComandoMuitoLongo, TempoLimiteExcedido):
+            resultado, padrao = None, None
+        if resultado is not None:
+            resultado = {c: resultado.get(c) for c in CAMPOS}
+        rotulos.append((texto, resultado, padrao))
+    return rotulos
+
+
+def _rotular_star(args):
+    return _rotular_pedaco(*args)
+
+
+def _pedacos(textos: Iterable[str]) -> Iterator[List[str]]:
+    pedaco = []
+    for texto in textos:
+        pedaco.append(texto)
+        if len(pedaco) == TAMANHO_PEDACO:
+            yield pedaco
+            pedaco = []
+    if pedaco:
+        yield pedaco
+
+
+def para_avaliacao(texto: str, pct: int) -> bool:
+    # por hash do texto normalizado: repetições do mesmo comando caem sempre no mesmo conjunto
+    return zlib.crc32(" ".join(texto.split()).lower().encode("utf-8")) % 100 < pct
+
+
+def preparar_rotulos(pasta: str, textos: Iterable[str], hoje: date, processos: int = 1,
+                     avaliacao_pct: int = AVALIACAO_PCT) -> dict:
+    """Rotula `textos` com o professor e grava shards de treino e avaliacao.jsonl em `pasta`."""
+    os.makedirs(pasta, exist_ok=True)
+    contagem = {"lidos": 0, "nao_entendidos": 0, "relativos": 0, "avaliacao": 0}
+    # rótulos por comprimento em tokens, codificados como o ComandosStream codifica os alvos
+    tokenizer = CharTokenizer()
+    comprimentos: Dict[int, int] = {}
+    shards = []
+    arquivo = None
+    avaliacao = open(os.path.join(pasta, "avaliacao.jsonl"), "w", encoding="utf-8")
+    pool = Pool(processos) if processos > 1 else None
+    try:
+        pedacos = ((p, hoje) for p in _pedacos(textos))
+        resultados = pool.imap(_rotular_star, pedacos) if pool else map(_rotular_star, pedacos)
+        for rotulos in resultados:
+            for texto, resultado, padrao in rotulos:
+                contagem["lidos"] += 1
+                if resultado is None:
+                    contagem["nao_entendidos"] += 1
+                    continue
+                if padrao in PADROES_RELATIVOS:
+                    contagem["relativos"] += 1
+                    continue
+                linha = json.dumps({"comando": texto, "json": resultado}, ensure_ascii=False) + "\n"
+                tamanho = len(tokenizer.encode(json.dumps(resultado, ensure_ascii=not tokenizer.acentos)))
+                comprimentos[tamanho] = comprimentos.get(tamanho, 0) + 1
+                if para_avaliacao(texto, avaliacao_pct):
+                    contagem["avaliacao"] += 1
+                    avaliacao.write(linha)
+                    continue
+                if arquivo is None or shards[-1]["linhas"] == LINHAS_POR_SHARD:
+                    if arquivo is not None:
+                        arquivo.close()
+                    shards.append({"arquivo": f"comandos-{len(shards):05d}.jsonl", "linhas": 0})
+                    arquivo = open(os.path.join(pasta, shards[-1]["arquivo"]), "w", encoding="utf-8")
+                arquivo.write(linha)
+                shards[-1]["linhas"] += 1
+    finally:
+        if pool is not None:
+            pool.close()
+        if arquivo is not None:
+            arquivo.close()
+        avaliacao.close()
+    # mesmo manifesto do gerador_comandos, para o ComandosStream
+    manifesto = {"professor": "InterpretadorComandos", "hoje": hoje.isoformat(), "ano_atual": hoje.year,
+                 "total": sum(s["linhas"] for s in shards), "shards": shards, **contagem,
+                 "maior_rotulo": max(comprimentos, default=0),
+                 "comprimentos_rotulos": {str(k): v for k, v in sorted(comprimentos.items())}}
+    escrever_json(os.path.join(pasta, "manifesto.json"), manifesto)
+    return manifesto
+
+
+def truncados(manifesto: dict, seq_len: int) -> int:
+    # rótulos (treino e avaliação) mais longos que seq_len
+    return sum(n for tamanho, n in manifesto["comprimentos_rotulos"].items() if int(tamanho) > seq_len)
+
+
+def ler_avaliacao(pasta: str) -> List[dict]:
+    with open(os.path.join(pasta, "avaliacao.jsonl"), encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f]
+
+
+# --- Alunos ---
+def arquitetura_do_aluno(nome: str) -> Dict[str, int]:
+    emb_size, n_heads, n_layers = (int(v) for v in nome.split(":"))
+    if emb_size % n_heads:
+        raise ValueError(f"aluno {nome}: emb_size precisa ser divisível por n_heads")
+    return {"emb_size": emb_size, "n_heads": n_heads, "n_layers": n_layers}
+
+
+def zerar_cabeca(model, camada: int, cabeca: int):
+    # zera as colunas do out_proj que recebem a cabeça: a saída dela some da atenção
+    attn = model.transformer.layers[camada].self_attn
+    dim = attn.embed_dim // attn.num_heads
+    with torch.no_grad():
+        attn.out_proj.weight[:, cabeca * dim:(cabeca + 1) * dim] = 0
+
+
+def _acerto_por_token(model, x, y) -> float:
+    from eval_metrics import prever_logits
+    from model.model import PAD
+    with torch.no_grad():
+        preds = prever_logits(model, x).argmax(-1)
+    mascara = y != PAD
+    return float(((preds == y) & mascara).sum() / mascara.sum().clamp(min=1))
+
+
+def podar_cabecas(model, exemplos: List[dict], tokenizer, quantas: int) -> Tuple[object, List[Dict]]:
+    """Cópia de `model` com as `quantas` cabeças menos importantes zeradas e a importância de cada uma.
+
+    Importância: queda do acerto por token sobre `exemplos` com só aquela cabeça zerada.
+    """
+    from train import aparar_lote
+    model.eval()
+    pares = [(torch.tensor(tokenizer.encode(e["comando"], model.seq_len), dtype=torch.uint8),
+              torch.tensor(tokenizer.encode(json.dumps(e["json"], ensure_ascii=not tokenizer.acentos),
+                                            model.seq_len), dtype=torch.uint8)) for e in exemplos]
+    x, y = aparar_lote(pares)
+    base = _acerto_por_token(model, x, y)
+    importancia = []
+    for camada, layer in enumerate(model.transformer.layers):
+        for cabeca in range(layer.self_attn.num_heads):
+            teste = copy.deepcopy(model)
+            zerar_cabeca(teste, camada, cabeca)
+            importancia.append({"camada": camada, "cabeca": cabeca,
+                                "queda": round(base - _acerto_por_token(teste, x, y), 5)})
+    importancia.sort(key=lambda c: c["queda"])
+    podado = copy.deepcopy(model)
+    for c in importancia[:quantas]:
+        zerar_cabeca(podado, c["camada"], c["cabeca"])
+    return podado, importancia
+
+
+# --- Comparação com o professor ---
+def concordancia(pesos: str, exemplos: List[dict], lote: int = 64) -> Dict[str, float]:
+    # saída do aluno (como na inferência: gerar_json_lote) contra o JSON do professor
+    import infer
+    m = infer.carregar_de(pesos)
+    iguais = {c: 0 for c in CAMPOS}
+    exatos = 0
+    for i in range(0, len(exemplos), lote):
+        pedaco = exemplos[i:i + lote]
+        saidas = infer.gerar_json_lote([e["comando"] for e in pedaco], modelo=m)
+        for e, saida in zip(pedaco, saidas):
+            campos_iguais = [saida.get(c) == e["json"].get(c) for c in CAMPOS]
+            exatos += all(campos_iguais)
+            for c, igual in zip(CAMPOS, campos_iguais):
+                iguais[c] += igual
+    n = max(1, len(exemplos))
+    return {"concordancia": exatos / n, **{f"concordancia_{c}": v / n for c, v in iguais.items()}}
+
+
+def latencia_professor(textos: List[str], hoje: date, repeticoes: int) -> Dict[str, float]:
+    from benchmarks.comum import cronometrar, resumo
+    professor = InterpretadorComandos()
+    proximo = itertools.count()
+
+    def um():
+        professor.interpretar(textos[next(proximo) % len(textos)], hoje)
+
+    r = resumo(cronometrar(um, repeticoes, aquecimento=10))
+    return {"latencia_p50_ms": r["p50_ms"], "latencia_p99_ms": r["p99_ms"]}
+
+
+def tabela(linhas: List[Dict]) -> str:
+    colunas = ["aluno", "parametros", "concordancia", *(f"concordancia_{c}" for c in CAMPOS),
+               "latencia_p50_ms", "latencia_p99_ms"]
+    celulas = [["campo" if c == "aluno" else c.replace("concordancia_", "") for c in colunas]]
+    for r in linhas:
+        celulas.append(["" if r.get(c) is None else f"{r[c]:.4f}" if isinstance(r[c], float) else str(r[c])
+                        for c in colunas])
+    larguras = [max(len(linha[i]) for linha in celulas) for i in range(len(colunas))]
+    return "\n".join("  ".join(v.rjust(w) for v, w in zip(linha, larguras)) for linha in celulas)
+
+
+def destilar(pasta: str, textos: Iterable[str], alunos: List[str], hoje: date, epochs: int = 3,
+             batch_size: int = 32, lr: float = 1e-3, seq_len: Optional[int] = None, podar: int = 0,
+             threads: int = 1, processos: int = 1, repeticoes: int = 300, avaliacao_max: int = 2000) -> Dict:
+    import train
+    from varredura import latencias
+
+    torch.set_num_threads(threads)
+    pasta_rotulos = os.path.join(pasta, "rotulos")
+    inicio = time.perf_counter()
+    manifesto = preparar_rotulos(pasta_rotulos, textos, hoje, processos)
+    print(f"rótulos: {manifesto['total']} de treino, {manifesto['avaliacao']} de avaliação, "
+          f"{manifesto['nao_entendidos']} não entendidos e {manifesto['relativos']} relativos "
+          f"de {manifesto['lidos']} ({time.perf_counter() - inicio:.1f}s)")
+    if not manifesto["total"]:
+        raise ValueError("nenhum comando rotulado pelo professor para treinar")
+    # alvos mais longos que o seq_len do aluno seriam cortados no treino e nunca gerados inteiros
+    seq_len = seq_len or manifesto["maior_rotulo"]
+    cortados = truncados(manifesto, seq_len)
+    if cortados:
+        raise ValueError(f"seq_len {seq_len} truncaria {cortados} de {manifesto['total'] + manifesto['avaliacao']} "
+                         f"rótulos (o maior tem {manifesto['maior_rotulo']} tokens)")
+    print(f"seq_len dos alunos: {seq_len} (maior rótulo: {manifesto['maior_rotulo']} tokens, 0 truncados)")
+    avaliacao = ler_avaliacao(pasta_rotulos)[:avaliacao_max]
+    if not avaliacao:
+        raise ValueError("nenhum comando no conjunto de avaliação")
+
+    linhas = [{"aluno": "professor (regex)", **latencia_professor([e["comando"] for e in avaliacao], hoje, repeticoes)}]
+    for nome in alunos:
+        arquitetura = arquitetura_do_aluno(nome)
+        pasta_aluno = os.path.join(pasta, "aluno_" + nome.replace(":", "x"))
+        config = train.ConfigTreino(epochs=epochs, batch_size=batch_size, lr=lr, seq_len=seq_len, threads=threads,
+                                    sinteticos=pasta_rotulos, semente=0, pasta_checkpoints=os.path.join(pasta_aluno, "checkpoints"),
+                                    saida=os.path.join(pasta_aluno, "mini_llm.pth"), **arquitetura)
+        os.makedirs(pasta_aluno, exist_ok=True)
+        model, _ = train.train_model(config=config)
+        parametros = sum(p.numel() for p in model.parameters())
+        candidatos = [(nome, config.saida)]
+        importancia = None
+        if podar:
+            podado, importancia = podar_cabecas(model, avaliacao[:256], train.tokenizer, podar)
+            caminho = os.path.join(pasta_aluno, "mini_llm_podado.pth")
+            torch.save(podado.state_dict(), caminho)
+            shutil.copyfile(caminho_arquitetura(config.saida), caminho_arquitetura(caminho))
+            candidatos.append((f"{nome} -{podar} cabeça(s)", caminho))
+        for rotulo, pesos in candidatos:
+            r = {"aluno": rotulo, "pesos": pesos, **arquitetura, "seq_len": seq_len, "parametros": parametros,
+                 **concordancia(pesos, avaliacao), **latencias(pesos, 16, repeticoes)}
+            if importancia is not None and rotulo != nome:
+                r["importancia_cabecas"] = importancia
+            linhas.append(r)
+            print(f"{rotulo}: concordância {r['concordancia']:.4f}, p50 {r['latencia_p50_ms']:.2f}ms, "
+                  f"p99 {r['latencia_p99_ms']:.2f}ms")
+
+    texto = tabela(linhas)
+    relatorio = {"hoje": hoje.isoformat(), "threads": threads, "rotulos": manifesto, "avaliados": len(avaliacao),
+                 "seq_len": seq_len, "rotulos_truncados": cortados, "resultados": linhas}
+    escrever_json(os.path.join(pasta, "relatorio.json"), relatorio)
+    with open(os.path.join(pasta, "relatorio.txt"), "w", encoding="utf-8") as f:
+        f.write(texto + "\n")
+    print(texto)
+    return relatorio
+
+
+# --- Main ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", nargs="*", default=[], help="arquivos de comandos (texto ou JSONL)")
+    parser.add_argument("--gerados", type=int, default=0, help="comandos do gerador_comandos para rotular")
+    parser.add_argument("--alunos", nargs="+", default=["32:2:1", "48:2:1", "64:2:1"],
+                        help="arquiteturas emb_size:n_heads:n_layers")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--seq-len", type=int, default=None, help="padrão: o comprimento do maior rótulo")
+    parser.add_argument("--podar-cabecas", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=1, help="threads do torch (treino e latência)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="processos da rotulagem")
+    parser.add_argument("--repeticoes", type=int, default=300, help="medições por latência")
+    parser.add_argument("--hoje", type=date.fromisoformat, default=None,
+                        help="dia de referência do professor (padrão: hoje)")
+    parser.add_argument("--pasta", default=os.path.join("destilacao", time.strftime("%Y%m%d-%H%M%S")))
+    args = parser.parse_args()
+    if not args.logs and not args.gerados:
+        parser.error("informe --logs e/ou --gerados")
+
+    hoje = args.hoje or datas.hoje()
+
+    def textos():
+        yield from ler_comandos(args.logs)
+        yield from gerados(args.gerados, hoje.year)
+
+    destilar(args.pasta, textos(), args.alunos, hoje, args.epochs, args.batch_size, args.lr,
+             args.seq_len, args.podar_cabecas, args.threads, args.processos, args.repeticoes)
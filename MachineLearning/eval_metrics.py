@@ -1,94 +1,254 @@
+# eval_metrics.py
+# Avaliação do MiniLLM, compartilhada pelo train.py (validação por época e evaluate_model), pelo
+# exportar.py e pela linha de comando. Importar o módulo não lê o dataset nem carrega pesos.
+#
+# - split de validação determinístico, gravado em dataset/splits/ e relido enquanto o JSON de
+#   origem não mudar: todas as execuções e ferramentas avaliam os mesmos exemplos
+# - métricas incrementais: por lote só se acumulam somas, então o conjunto avaliado pode ser
+#   maior que a memória
+# - acerto por token e exact match comparados em tensores; decode + json.loads das predições
+#   rodam num pool de threads enquanto o forward do lote seguinte é calculado
+# - aceite_rate: saídas que, além de JSON válido, o /comando aceitaria (lote.dados_do_modelo: campos
+#   preenchidos e datas ISO possíveis). É a checagem de aceite de um checkpoint para o fallback:
+#   --gramatica --aceite-minimo 0.9 sai com código 1 abaixo do mínimo
+# Uso: python eval_metrics.py [--pesos model/mini_llm.pth] [--val-frac 0.1] [--semente 0] [--gramatica]
+#      [--aceite-minimo 0.9] [--perfil]  (torch.profiler nos primeiros lotes, ver perfil.py)
+import argparse
 import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
 import torch
-from torch.utils.data import DataLoader, random_split
-from model.model import MiniLLM
+from torch.utils.data import Subset
+
+import perfil
+from dataset_tokenizado import escrever_json
+from decodificacao import DecodificadorJSON
+from lote import dados_do_modelo
+from model.carregar import PESOS, ler_arquitetura
+from model.model import PAD, MiniLLM, MiniLLMLote, mascara_padding
 from model.tokenizer import CharTokenizer
-from train import ComandoDataset, data
-
-# --- Config ---
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-tokenizer = CharTokenizer()
-
-# --- Dataset & split ---
-dataset = ComandoDataset(data, tokenizer)
-val_frac = 0.1
-n = len(dataset)
-n_val = max(1, int(n * val_frac))
-n_train = n - n_val
-_, val_ds = random_split(dataset, [n_train, n_val])
-val_loader = DataLoader(val_ds, batch_size=8, shuffle=False)
-
-# --- Modelo ---
-model = MiniLLM(tokenizer.vocab_size)
-model.load_state_dict(torch.load("model/mini_llm.pth", map_location=device))
-model.to(device)
-model.eval()
-
-# --- Critério ---
-pad_token = 0
-criterion_eval = torch.nn.CrossEntropyLoss(ignore_index=pad_token, reduction="sum")
+
+PASTA_SPLITS = "dataset/splits"
+# lotes com validação de JSON em andamento antes de esperar pelo mais antigo
+PENDENTES_MAX = 4
+
+# --- Split ---
+def _caminho_split(fonte: str, val_frac: float, semente: int) -> str:
+    nome = os.path.splitext(os.path.basename(fonte))[0]
+    return os.path.join(PASTA_SPLITS, f"{nome}-val{val_frac:g}-s{semente}.json")
+
+def indices_validacao(dataset, val_frac: float = 0.1, semente: int = 0) -> List[int]:
+    # índices de validação de um ComandoDataset; sorteados uma vez com `semente` e gravados
+    # junto com o sha256 da fonte (outra fonte ou outro tamanho refazem o sorteio)
+    fonte = dataset.shards.fonte
+    caminho = _caminho_split(fonte["caminho"], val_frac, semente)
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            split = json.load(f)
+        if split["fonte_sha256"] == fonte["sha256"] and split["total"] == len(dataset):
+            return split["validacao"]
+    except (OSError, ValueError, KeyError):
+        pass
+    n = len(dataset)
+    n_val = max(1, int(n * val_frac))
+    ordem = torch.randperm(n, generator=torch.Generator().manual_seed(semente)).tolist()
+    validacao = sorted(ordem[n - n_val:])
+    os.makedirs(PASTA_SPLITS, exist_ok=True)
+    escrever_json(caminho, {
+        "fonte": fonte["caminho"],
+        "fonte_sha256": fonte["sha256"],
+        "total": n,
+        "val_frac": val_frac,
+        "semente": semente,
+        "validacao": validacao,
+    })
+    return validacao
+
+def split_validacao(dataset, val_frac: float = 0.1, semente: int = 0) -> Tuple[Subset, Subset]:
+    # (treino, validação) com o split persistido
+    validacao = indices_validacao(dataset, val_frac, semente)
+    separados = set(validacao)
+    treino = [i for i in range(len(dataset)) if i not in separados]
+    return Subset(dataset, treino), Subset(dataset, validacao)
+
+def carregar_validacao(tokenizer: CharTokenizer, val_frac: float = 0.1, semente: int = 0, batch_size: int = 8,
+                       seq_len: int = 128):
+    # (dataset, loader de validação) da fonte do treino; importado aqui porque o train.py
+    # importa este módulo
+    from train import FONTE, ComandoDataset, carregador_por_comprimento
+    dataset = ComandoDataset(FONTE, tokenizer, seq_len)
+    _, val_ds = split_validacao(dataset, val_frac, semente)
+    return dataset, carregador_por_comprimento(val_ds, batch_size, shuffle=False)
+
+# --- Comparação ---
+def seq_len_do_modelo(model) -> int:
+    # MiniLLM e MiniLLMLote (fp32, int8) guardam o seq_len; os artefatos de exportar.py não, e
+    # vêm dos pesos de model/carregar.py (PESOS), cuja arquitetura está ao lado
+    if isinstance(model, MiniLLMLote):
+        model = model.modelo
+    if isinstance(model, MiniLLM):
+        return model.seq_len
+    return ler_arquitetura(PESOS).get("seq_len", 128)
+
+def prever_logits(model, xb, seq_len: Optional[int] = None):
+    # xb chega aparado pelo loader; a saída é completada até seq_len (None: o do modelo)
+    if isinstance(model, MiniLLM):
+        return model.forward_completo(xb, mascara_padding(xb))
+    # variantes de inferência (model/carregar.py): as posições só de padding são iguais em todos
+    # os exemplos e vêm de uma única entrada de padding
+    logits = model(xb)
+    L = xb.shape[1]
+    seq_len = seq_len or seq_len_do_modelo(model)
+    if L < seq_len:
+        cauda = model(torch.zeros(1, seq_len, dtype=xb.dtype, device=xb.device))[:, L:]
+        logits = torch.cat([logits, cauda.expand(xb.shape[0], -1, -1)], dim=1)
+    return logits
+
+def _sem_espacos(tokens, espacos):
+    # (início, tamanho) por linha do trecho que sobra do texto decodificado após strip()
+    texto = ~torch.isin(tokens, espacos)
+    S = tokens.shape[1]
+    inicio = texto.int().argmax(1)
+    fim = S - texto.flip(1).int().argmax(1)
+    return inicio, torch.where(texto.any(1), fim - inicio, 0)
+
+def exatos(preds, alvos, espacos) -> torch.Tensor:
+    # [B] bool: decode(pred).strip() == decode(alvo).strip(). Cada id decodifica para um
+    # caractere, então basta comparar os ids dos dois trechos alinhados pelo início
+    S = preds.shape[1]
+    ip, np_ = _sem_espacos(preds, espacos)
+    ia, na = _sem_espacos(alvos, espacos)
+    pos = torch.arange(S, device=preds.device)
+    p = preds.gather(1, (pos + ip[:, None]).clamp(max=S - 1))
+    a = alvos.gather(1, (pos + ia[:, None]).clamp(max=S - 1))
+    return (np_ == na) & ((p == a) | (pos >= na[:, None])).all(1)
+
+def _jsons_validos(tokenizer: CharTokenizer, preds, decodificador=None, finais=None) -> Tuple[int, int]:
+    # (JSONs válidos, saídas aceitas pelo /comando)
+    validos = aceitos = 0
+    textos = decodificador.textos(preds, finais) if decodificador is not None else tokenizer.decode_batch(preds)
+    for texto in textos:
+        try:
+            saida = json.loads(texto.strip())
+        except ValueError:
+            continue
+        validos += 1
+        aceitos += dados_do_modelo(saida) is not None
+    return validos, aceitos
 
 # --- Avaliação ---
-def evaluate(model, dataloader, tokenizer):
-    total_loss_sum = 0.0
-    total_nonpad_tokens = 0
-    total_correct_tokens = 0
-    total_examples = 0
-    json_parse_success = 0
-    exact_match = 0
-
-    with torch.no_grad():
-        for xb, yb in dataloader:
-            xb, yb = xb.to(device), yb.to(device)
-            logits = model(xb)  # [B, S, V]
-            B, S, V = logits.shape
-            logits_flat = logits.view(-1, V)
-            targets_flat = yb.view(-1)
-
-            # loss
-            loss_sum = criterion_eval(logits_flat, targets_flat)
-            total_loss_sum += loss_sum.item()
-
-            # token accuracy
-            nonpad_mask = (targets_flat != pad_token)
-            n_nonpad = int(nonpad_mask.sum().item())
-            total_nonpad_tokens += n_nonpad
-
-            preds_flat = logits_flat.argmax(dim=-1)
-            correct = ((preds_flat == targets_flat) & nonpad_mask).sum().item()
-            total_correct_tokens += correct
-
-            # per-example JSON parse & exact match
-            preds = preds_flat.view(B, S).cpu().tolist()
-            targets = yb.cpu().tolist()
-            for p_tokens, t_tokens in zip(preds, targets):
-                pred_text = tokenizer.decode(p_tokens).split('\x00', 1)[0].strip()
-                target_text = tokenizer.decode(t_tokens).split('\x00', 1)[0].strip()
-                try:
-                    json.loads(pred_text)
-                    json_parse_success += 1
-                except:
-                    pass
-                if pred_text == target_text:
-                    exact_match += 1
-                total_examples += 1
-
-    avg_loss_per_token = total_loss_sum / max(1, total_nonpad_tokens)
-    perplexity = float(torch.exp(torch.tensor(avg_loss_per_token)))
-    token_accuracy = total_correct_tokens / max(1, total_nonpad_tokens)
-    json_parse_rate = json_parse_success / max(1, total_examples)
-    exact_match_rate = exact_match / max(1, total_examples)
+def avaliar(model, dataloader, tokenizer: CharTokenizer, device=None, workers_json: int = 1,
+            decodificador: Optional[DecodificadorJSON] = None, perfilar: Optional[bool] = None) -> Dict[str, float]:
+    """Métricas de `model` sobre `dataloader` (lotes (x aparado, y) do carregador_por_comprimento).
+
+    Com workers_json=0 a validação de JSON roda no próprio laço. Com `decodificador`, as
+    predições são as da decodificação restrita ao esquema (como na inferência) em vez do argmax.
+    `perfilar` liga o torch.profiler (None: segue PERFIL), um passo por lote.
+    """
+    device = device or torch.device("cpu")
+    if isinstance(model, MiniLLM):
+        model.eval()
+    espacos = torch.tensor([i for c, i in tokenizer.vocab.items() if c.isspace()], device=device)
+    criterion = torch.nn.CrossEntropyLoss(ignore_index=PAD, reduction="sum")
+    # somas no device, lidas uma vez no fim
+    soma_loss = torch.zeros((), dtype=torch.float64, device=device)
+    corretos = torch.zeros((), dtype=torch.long, device=device)
+    nao_pad = torch.zeros((), dtype=torch.long, device=device)
+    iguais = torch.zeros((), dtype=torch.long, device=device)
+    exemplos = 0
+    json_validos = aceitos = 0
 
+    pool = ThreadPoolExecutor(workers_json) if workers_json > 0 else None
+    pendentes = deque()
+    try:
+        with torch.no_grad(), perfil.perfilar("avaliacao", model, perfilar) as prof:
+            for xb, yb in dataloader:
+                xb, yb = xb.to(device), yb.to(device)
+                with perfil.regiao("forward"):
+                    logits = prever_logits(model, xb).float()
+                finais = None
+                with perfil.regiao("decodificacao"):
+                    if decodificador is not None:
+                        preds, finais = decodificador(logits)
+                    else:
+                        preds = logits.argmax(-1)
+                with perfil.regiao("metricas"):
+                    soma_loss += criterion(logits.flatten(0, 1), yb.flatten())
+                    mascara = yb != PAD
+                    nao_pad += mascara.sum()
+                    corretos += ((preds == yb) & mascara).sum()
+                    iguais += exatos(preds, yb, espacos).sum()
+                exemplos += yb.shape[0]
+
+                preds = preds.cpu()
+                prof.passo()
+                if pool is None:
+                    with perfil.regiao("json"):
+                        validos, aceitos_lote = _jsons_validos(tokenizer, preds, decodificador, finais)
+                    json_validos += validos
+                    aceitos += aceitos_lote
+                    continue
+                pendentes.append(pool.submit(_jsons_validos, tokenizer, preds, decodificador, finais))
+                if len(pendentes) > PENDENTES_MAX:
+                    validos, aceitos_lote = pendentes.popleft().result()
+                    json_validos += validos
+                    aceitos += aceitos_lote
+        for f in pendentes:
+            validos, aceitos_lote = f.result()
+            json_validos += validos
+            aceitos += aceitos_lote
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    total_nonpad_tokens = int(nao_pad)
+    avg_loss_per_token = float(soma_loss) / max(1, total_nonpad_tokens)
     return {
         "avg_loss_per_token": avg_loss_per_token,
-        "perplexity": perplexity,
-        "token_accuracy": token_accuracy,
-        "json_parse_rate": json_parse_rate,
-        "exact_match_rate": exact_match_rate,
-        "total_examples": total_examples,
-        "total_nonpad_tokens": total_nonpad_tokens
+        "perplexity": math.exp(avg_loss_per_token),
+        "token_accuracy": int(corretos) / max(1, total_nonpad_tokens),
+        "json_parse_rate": json_validos / max(1, exemplos),
+        "exact_match_rate": int(iguais) / max(1, exemplos),
+        "aceite_rate": aceitos / max(1, exemplos),
+        "total_examples": exemplos,
+        "total_nonpad_tokens": total_nonpad_tokens,
     }
 
+# nome anterior
+evaluate = avaliar
+
+# --- Main ---
 if __name__ == "__main__":
-    metrics = evaluate(model, val_loader, tokenizer)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pesos", default="model/mini_llm.pth")
+    parser.add_argument("--val-frac", type=float, default=0.1)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers-json", type=int, default=1)
+    parser.add_argument("--gramatica", action="store_true", help="decodificação restrita ao esquema do JSON")
+    parser.add_argument("--aceite-minimo", type=float, default=None,
+                        help="sai com código 1 se aceite_rate ficar abaixo (checagem para MODELO_FALLBACK)")
+    parser.add_argument("--perfil", action="store_true", help="torch.profiler nos primeiros lotes (ver perfil.py)")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # versão do vocabulário de acordo com o checkpoint avaliado
+    tokenizer = CharTokenizer.do_checkpoint(args.pesos)
+    arquitetura = ler_arquitetura(args.pesos)
+    _, val_loader = carregar_validacao(tokenizer, args.val_frac, args.semente, args.batch_size,
+                                       arquitetura.get("seq_len", 128))
+    model = MiniLLM(tokenizer.vocab_size, **arquitetura)
+    model.load_state_dict(torch.load(args.pesos, map_location=device))
+    model.to(device)
+    decodificador = DecodificadorJSON(tokenizer) if args.gramatica else None
+    metrics = avaliar(model, val_loader, tokenizer, device, args.workers_json, decodificador,
+                      perfilar=args.perfil or None)
     print("VAL METRICS:", metrics)
+    if args.aceite_minimo is not None and metrics["aceite_rate"] < args.aceite_minimo:
+        print(f"checkpoint reprovado: aceite_rate {metrics['aceite_rate']:.3f} < {args.aceite_minimo}")
+        sys.exit(1)
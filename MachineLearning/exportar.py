@@ -0,0 +1,126 @@
+# exportar.py
+# Gera artefatos de inferência em CPU a partir de model/mini_llm.pth e compara cada variante
+# com o float32 eager: tamanho, latência do forward e métricas do eval_metrics.py.
+# Uso (a partir de MachineLearning/): python exportar.py [--variantes fp32_script int8_trace ...]
+# Depois: MODELO_VARIANTE=<variante> uvicorn main:app  (ver model/carregar.py)
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+import torch
+
+from model.carregar import (PASTA_ARTEFATOS, PESOS, VARIANTES, caminho_artefato, carregar_modelo,
+                            ler_arquitetura, modelo_float, quantizar_int8)
+from eval_metrics import avaliar, carregar_validacao
+from model.tokenizer import CharTokenizer
+
+tokenizer = CharTokenizer.do_checkpoint(PESOS)
+
+# --- Exportação ---
+def exportar(variante: str):
+    base = modelo_float(tokenizer.vocab_size)
+    # comprimento do exemplo < seq_len: as entradas chegam aparadas (ver infer.py)
+    exemplo = torch.zeros(4, base.modelo.seq_len // 2, dtype=torch.long)
+    caminho = caminho_artefato(variante)
+    os.makedirs(PASTA_ARTEFATOS, exist_ok=True)
+    if variante == "fp32_script":
+        torch.jit.save(torch.jit.freeze(torch.jit.script(base)), caminho)
+    elif variante == "fp32_export":
+        lote = torch.export.Dim("B", min=1, max=4096)
+        comprimento = torch.export.Dim("L", min=1, max=base.modelo.seq_len)
+        dinamicos = {"x": {0: lote, 1: comprimento}}
+        torch.export.save(torch.export.export(base, (exemplo,), dynamic_shapes=dinamicos), caminho)
+    elif variante == "int8_trace":
+        # os Linear quantizados não são scriptáveis dentro do TransformerEncoderLayer; o trace
+        # mantém B e L dinâmicos porque forward_lote só usa x.shape em arange/reshape
+        with torch.inference_mode():
+            torch.jit.save(torch.jit.trace(quantizar_int8(base), exemplo), caminho)
+    else:
+        raise ValueError(f"{variante} não gera artefato")
+
+def tamanho_bytes(variante: str, modelo) -> int:
+    if variante == "fp32":
+        return os.path.getsize(PESOS)
+    if VARIANTES[variante] is None:
+        buf = io.BytesIO()
+        torch.save(modelo.state_dict(), buf)
+        return len(buf.getvalue())
+    return os.path.getsize(caminho_artefato(variante))
+
+# --- Latência ---
+def latencias_ms(modelos, lote: int, repeticoes: int):
+    # mediana por variante; as variantes se alternam a cada rodada para que ruído e variação
+    # de clock da máquina afetem todas igualmente
+    x = torch.randint(0, tokenizer.vocab_size, (lote, 128))
+    tempos = {v: [] for v in modelos}
+    with torch.inference_mode():
+        for modelo in modelos.values():
+            for _ in range(3):
+                modelo(x)
+        for _ in range(repeticoes):
+            for v, modelo in modelos.items():
+                inicio = time.perf_counter()
+                modelo(x)
+                tempos[v].append(time.perf_counter() - inicio)
+    return {v: statistics.median(t) * 1000 for v, t in tempos.items()}
+
+# --- Qualidade ---
+def predicoes(modelo, entradas):
+    with torch.inference_mode():
+        return modelo(entradas).argmax(-1)
+
+# --- Main ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTES), choices=list(VARIANTES))
+    parser.add_argument("--repeticoes", type=int, default=30)
+    args = parser.parse_args()
+
+    # mesmo seq_len dos pesos exportados (o carregar_validacao usa 128 por padrão)
+    dataset, val_loader = carregar_validacao(tokenizer, seq_len=ler_arquitetura(PESOS).get("seq_len", 128))
+
+    variantes = ["fp32"] + [v for v in args.variantes if v != "fp32"]
+    for v in variantes:
+        if VARIANTES[v] is not None:
+            exportar(v)
+
+    entradas = torch.stack([dataset[i][0] for i in range(len(dataset))]).long()
+    modelos = {v: carregar_modelo(v, tokenizer.vocab_size) for v in variantes}
+    latencia_b1 = latencias_ms(modelos, 1, args.repeticoes)
+    latencia_b16 = latencias_ms(modelos, 16, args.repeticoes)
+    relatorio = {}
+    for v, modelo in modelos.items():
+        relatorio[v] = {
+            "tamanho_bytes": tamanho_bytes(v, modelo),
+            "latencia_ms_b1": latencia_b1[v],
+            "latencia_ms_b16": latencia_b16[v],
+            "metricas": avaliar(modelo, val_loader, tokenizer),
+            # fração dos tokens (dataset inteiro) com a mesma predição do float32 eager
+            "concordancia_tokens": predicoes(modelo, entradas),
+        }
+
+    base = relatorio["fp32"]
+    preds_base = base["concordancia_tokens"]
+    for v, r in relatorio.items():
+        r["concordancia_tokens"] = float((r["concordancia_tokens"] == preds_base).float().mean())
+    for v, r in relatorio.items():
+        r["deltas"] = {
+            "tamanho": r["tamanho_bytes"] / base["tamanho_bytes"] - 1,
+            "latencia_b1": r["latencia_ms_b1"] / base["latencia_ms_b1"] - 1,
+            "latencia_b16": r["latencia_ms_b16"] / base["latencia_ms_b16"] - 1,
+            **{k: r["metricas"][k] - base["metricas"][k]
+               for k in ("token_accuracy", "json_parse_rate", "exact_match_rate", "avg_loss_per_token")},
+        }
+
+    print(f"{'variante':>12} {'tamanho':>10} {'b1 ms':>8} {'b16 ms':>8} {'tok_acc':>8} {'Δtok_acc':>9} {'concord.':>8}")
+    for v, r in relatorio.items():
+        print(f"{v:>12} {r['tamanho_bytes'] / 1024:>8.0f}KB {r['latencia_ms_b1']:>8.2f} {r['latencia_ms_b16']:>8.2f} "
+              f"{r['metricas']['token_accuracy']:>8.4f} {r['deltas']['token_accuracy']:>+9.4f} {r['concordancia_tokens']:>8.4f}")
+
+    os.makedirs(PASTA_ARTEFATOS, exist_ok=True)
+    with open(os.path.join(PASTA_ARTEFATOS, "relatorio.json"), "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"relatório salvo em {PASTA_ARTEFATOS}/relatorio.json")
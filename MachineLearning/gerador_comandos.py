@@ -0,0 +1,197 @@
+# gerador_comandos.py
+# Gerador sintético de comandos de agendamento com o JSON esperado, em shards JSONL.
+#
+# Combina modelos de frase com tipos de atividade, nomes (com acentos) de pacientes e médicos,
+# os formatos de data absoluta de datas.py (dd/mm/aaaa, dd/mm/aa, d/m, dd-mm-aaaa, mês por
+# extenso, sem acento ou abreviado, com ou sem ano), os de hora (9, 09:00, 9:30,
+# 9h30) e palavras de preenchimento. Cada linha tem o formato do dataset/comandos.json:
+#   {"comando": "...", "json": {"tipoAtividade", "pacienteNome", "medicoNome", "inicio", "fim"}}
+#
+# Determinístico: o shard i usa um gerador próprio semeado com (semente, i), então o resultado
+# não depende de quantos processos geram os shards. Datas sem ano usam `ano_atual`, gravado no
+# manifesto junto com a semente.
+# Uso: python gerador_comandos.py --total 1000000 [--pasta dataset/sintetico] [--semente 0]
+import argparse
+import calendar
+import json
+import os
+import random
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Any, Dict, Optional
+
+from dataset_tokenizado import escrever_json
+
+PASTA = "dataset/sintetico"
+LINHAS_POR_SHARD = 100_000
+ANOS = (2025, 2026, 2027)
+
+# --- Vocabulário ---
+NOMES_FEMININOS = [
+    "Ana", "Maria", "Júlia", "Luísa", "Beatriz", "Fernanda", "Camila", "Patrícia", "Márcia", "Débora",
+    "Lúcia", "Inês", "Letícia", "Mônica", "Vitória", "Cecília", "Aline", "Helena", "Isabela", "Giovana",
+    "Renata", "Tânia", "Gabriela", "Cláudia", "Sônia", "Larissa", "Natália", "Bárbara", "Lívia", "Amanda",
+]
+NOMES_MASCULINOS = [
+    "João", "José", "Antônio", "Sebastião", "Fábio", "Lucas", "Pedro", "Rafael", "Bruno", "Carlos",
+    "André", "Luís", "Márcio", "Vinícius", "Caio", "Otávio", "Flávio", "Rogério", "Marcelo", "Eduardo",
+    "Gustavo", "Túlio", "Mário", "Sérgio", "Renan", "Igor", "Thiago", "César", "Henrique", "Joaquim",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Rodrigues", "Almeida", "Nascimento",
+    "Araújo", "Gonçalves", "Conceição", "Ribeiro", "Carvalho", "Gomes", "Martins", "Rocha", "Mendes", "Barbosa",
+    "Fernandes", "Magalhães", "Brandão", "Simões", "Guimarães", "Assunção", "Falcão", "Müller", "Dias", "Nunes",
+]
+# (texto no comando, artigo indefinido)
+TIPOS = [("consulta", "uma"), ("cirurgia", "uma"), ("retorno", "um"), ("exame", "um"),
+         ("teleconsulta", "uma"), ("consulta online", "uma")]
+MESES = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro",
+         "outubro", "novembro", "dezembro"]
+ABERTURAS = ["", "", "", "por favor ", "oi, ", "bom dia, "]
+# aberturas seguidas de verbo no infinitivo
+ABERTURAS_INFINITIVO = ["preciso ", "gostaria de ", "quero ", "pode "]
+VERBOS = ["marque", "marcar", "agende", "agendar", "marca", "agenda"]
+VERBOS_INFINITIVO = ["marcar", "agendar"]
+FECHOS = ["", "", "", " por favor", ", obrigado", ", obrigada", " urgente", ".", " se possível"]
+
+
+def rotulo_tipo(tipo: str) -> str:
+    # mesma regra do InterpretadorComandos._tipo
+    return "Consulta" if "consulta" in tipo.lower() else tipo.capitalize()
+
+
+# --- Partes do comando ---
+def _nome(rng: random.Random, feminino: bool) -> str:
+    primeiros = rng.sample(NOMES_FEMININOS if feminino else NOMES_MASCULINOS, rng.choice((1, 1, 1, 2)))
+    return " ".join(primeiros + rng.sample(SOBRENOMES, rng.choice((1, 1, 2))))
+
+
+def _data(rng: random.Random, ano_atual: int):
+    # (texto, "aaaa-mm-dd")
+    sem_ano = rng.random() < 0.2
+    ano = ano_atual if sem_ano else rng.choice(ANOS)
+    mes = rng.randint(1, 12)
+    dia = rng.randint(1, calendar.monthrange(ano, mes)[1])
+    iso = f"{ano:04d}-{mes:02d}-{dia:02d}"
+    extenso = MESES[mes - 1]
+    if sem_ano:
+        texto = rng.choice([f"{dia}/{mes}", f"{dia:02d}/{mes:02d}", f"{dia} de {extenso}", f"{dia} {extenso}"])
+    else:
+        texto = rng.choice([
+            f"{dia:02d}/{mes:02d}/{ano}", f"{dia}/{mes}/{ano}", f"{dia:02d}/{mes:02d}/{ano % 100:02d}",
+            f"{dia:02d}-{mes:02d}-{ano}", f"{dia} de {extenso} de {ano}", f"{dia} {extenso} {ano}",
+            f"{dia} de {extenso.replace('ç', 'c')} de {ano}", f"{dia} de {extenso[:3]} de {ano}",
+        ])
+    return texto, iso
+
+
+def _hora(rng: random.Random, minutos: int) -> str:
+    h, m = divmod(minutos, 60)
+    opcoes = [f"{h:02d}:{m:02d}", f"{h}:{m:02d}", f"{h}h{m:02d}"]
+    if m == 0:
+        opcoes += [f"{h}", f"{h}"]
+    return rng.choice(opcoes)
+
+
+def _horario(rng: random.Random):
+    # (texto, "hh:mm", "hh:mm" ou None)
+    inicio = rng.randint(6, 19) * 60 + rng.choice((0, 0, 0, 15, 30, 30, 45, 10, 20, 40, 50))
+    if rng.random() < 0.25:
+        texto = rng.choice(["às {}", "as {}", "a partir das {}", "{}"]).format(_hora(rng, inicio))
+        return texto, f"{inicio // 60:02d}:{inicio % 60:02d}", None
+    fim = min(inicio + rng.choice((15, 20, 30, 40, 45, 50, 60, 90, 120, 180, 240)), 23 * 60 + 59)
+    modelo = rng.choice(["das {} às {}", "das {} as {}", "de {} a {}", "das {} até {}", "{} - {}", "{} às {}"])
+    texto = modelo.format(_hora(rng, inicio), _hora(rng, fim))
+    return texto, f"{inicio // 60:02d}:{inicio % 60:02d}", f"{fim // 60:02d}:{fim % 60:02d}"
+
+
+def gerar_exemplo(rng: random.Random, ano_atual: int) -> Dict[str, Any]:
+    tipo, artigo = rng.choice(TIPOS)
+    paciente_fem, medico_fem = rng.random() < 0.5, rng.random() < 0.5
+    paciente = _nome(rng, paciente_fem)
+    titulo = rng.choice(["Dra." if medico_fem else "Dr.", "Dra." if medico_fem else "Dr.", ""])
+    medico = (f"{titulo} " if titulo else "") + _nome(rng, medico_fem)
+    data, iso = _data(rng, ano_atual)
+    horario, inicio, fim = _horario(rng)
+
+    o_a = "a" if paciente_fem else "o"
+    parte_paciente = rng.choice([
+        f"para {paciente}", f"para {o_a} paciente {paciente}", f"com {o_a} paciente {paciente}",
+        f"paciente {paciente}", f"do paciente {paciente}" if not paciente_fem else f"da paciente {paciente}",
+    ])
+    parte_medico = rng.choice([
+        f"com {medico}", f"com {medico}", f"com a médica {medico}" if medico_fem else f"com o médico {medico}",
+        f"e a médica {medico}" if medico_fem else f"e o médico {medico}",
+    ])
+    parte_data = rng.choice(["no dia ", "em ", "dia ", "para o dia ", "para ", ""]) + data
+    if rng.random() < 0.25:
+        abertura, verbo = rng.choice(ABERTURAS_INFINITIVO), rng.choice(VERBOS_INFINITIVO)
+    else:
+        abertura, verbo = rng.choice(ABERTURAS), rng.choice(VERBOS + [""])
+    cabeca = f"{verbo} {rng.choice([artigo + ' ', ''])}{tipo}" if verbo else tipo
+    if rng.random() < 0.8:
+        corpo = f"{cabeca} {parte_paciente} {parte_medico} {parte_data} {horario}"
+    else:
+        corpo = f"{cabeca} {parte_paciente} {parte_data} {horario} {parte_medico}"
+    comando = abertura + corpo + rng.choice(FECHOS)
+    if rng.random() < 0.1:
+        comando = comando[0].upper() + comando[1:]
+    return {"comando": comando, "json": {
+        "tipoAtividade": rotulo_tipo(tipo),
+        "pacienteNome": paciente,
+        "medicoNome": medico,
+        "inicio": f"{iso}T{inicio}",
+        "fim": f"{iso}T{fim}" if fim else None,
+    }}
+
+
+# --- Shards ---
+def _nome_shard(indice: int) -> str:
+    return f"comandos-{indice:05d}.jsonl"
+
+
+def gerar_shard(pasta: str, indice: int, linhas: int, semente: int, ano_atual: int) -> str:
+    rng = random.Random(f"{semente}/{indice}")
+    caminho = os.path.join(pasta, _nome_shard(indice))
+    temporario = f"{caminho}.tmp-{os.getpid()}"
+    with open(temporario, "w", encoding="utf-8") as f:
+        for _ in range(linhas):
+            f.write(json.dumps(gerar_exemplo(rng, ano_atual), ensure_ascii=False) + "\n")
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def gerar(total: int, pasta: str = PASTA, semente: int = 0, linhas_por_shard: int = LINHAS_POR_SHARD,
+          processos: int = 1, ano_atual: Optional[int] = None) -> dict:
+    """Gera `total` exemplos em shards de `linhas_por_shard` linhas e devolve o manifesto."""
+    ano_atual = ano_atual or datetime.now().year
+    os.makedirs(pasta, exist_ok=True)
+    tarefas = [(pasta, i, min(linhas_por_shard, total - inicio), semente, ano_atual)
+               for i, inicio in enumerate(range(0, total, linhas_por_shard))]
+    if processos > 1:
+        with Pool(processos) as pool:
+            pool.starmap(gerar_shard, tarefas)
+    else:
+        for tarefa in tarefas:
+            gerar_shard(*tarefa)
+    manifesto = {
+        "semente": semente,
+        "ano_atual": ano_atual,
+        "total": total,
+        "shards": [{"arquivo": _nome_shard(i), "linhas": linhas} for _, i, linhas, _, _ in tarefas],
+    }
+    escrever_json(os.path.join(pasta, "manifesto.json"), manifesto)
+    return manifesto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, required=True)
+    parser.add_argument("--pasta", default=PASTA)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--linhas-por-shard", type=int, default=LINHAS_POR_SHARD)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--ano-atual", type=int, default=None, help="ano das datas sem ano (padrão: ano corrente)")
+    args = parser.parse_args()
+    manifesto = gerar(args.total, args.pasta, args.semente, args.linhas_por_shard, args.processos, args.ano_atual)
+    print(f"{manifesto['total']} exemplos em {len(manifesto['shards'])} shard(s): {args.pasta}")
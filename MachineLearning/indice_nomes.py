@@ -0,0 +1,366 @@
+# indice_nomes.py
+# Índice aproximado de nomes (trigramas, sem acento) para resolver pacienteNome/medicoNome em IDs.
+#
+# Carregado de um snapshot local e mantido por um log de deltas em JSONL (ver log_deltas.py):
+#   snapshot: {"pacientes": [{"id": ..., "nome": ...}], "medicos": [{"id": ..., "nome": ...}]}
+#   deltas:   {"tipo": "paciente"|"medico", "op": "upsert"|"remover", "id": ..., "nome": ...} por linha
+#
+# A similaridade é o coeficiente de Dice entre os conjuntos de trigramas (estilo pg_trgm: cada palavra
+# vira "  palavra "). A similaridade mínima fixa quantos trigramas um registro precisa compartilhar
+# com a consulta; as listas invertidas dos trigramas menos comuns filtram os candidatos por contagem
+# e a similaridade exata é calculada só para eles.
+import json
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from log_deltas import LogDeltas, invalido
+
+LIMITE = 5
+MINIMO = 0.45
+RE_SEPARADOR = re.compile(r"[^a-z0-9]+")
+TITULOS = frozenset({"dr", "dra", "doutor", "doutora", "sr", "sra", "senhor", "senhora"})
+# fração de registros removidos/substituídos a partir da qual o índice é reconstruído
+FRACAO_COMPACTAR = 0.25
+# lista invertida com mais de 1/DIVISOR_LISTA_LONGA dos slots não gera candidatos (ver buscar)
+DIVISOR_LISTA_LONGA = 16
+
+
+def normalizar_nome(nome: str) -> str:
+    # sem acentos, minúsculas, só letras e dígitos, sem títulos (Dr., Dra., ...)
+    ascii_ = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(p for p in RE_SEPARADOR.split(ascii_) if p and p not in TITULOS)
+
+
+def trigramas(nome_normalizado: str) -> List[str]:
+    # "  a   b " passa por todas as palavras numa só varredura; os trigramas que atravessam a fronteira
+    # entre palavras ("a  ", "   ") são retirados no fim
+    palavras = nome_normalizado.split(" ")
+    preenchida = "  " + "   ".join(palavras) + " "
+    vistos = {preenchida[i:i + 3] for i in range(len(preenchida) - 2)}
+    if len(palavras) > 1:
+        vistos.difference_update([p[-1] + "  " for p in palavras[:-1]])
+        vistos.discard("   ")
+    return list(vistos)
+
+
+class IndiceNomes:
+    """Índice de trigramas de um tipo de registro (pacientes ou médicos).
+
+    Cada nome normalizado distinto ocupa um slot com os IDs que o usam (homônimos e grafias que só
+    diferem em acentos dividem o slot). Os trigramas de todos os slots ficam num vetor contíguo
+    (início/tamanho por slot) e cada trigrama tem a lista crescente de slots que o contêm; os vetores
+    são array('i'), lidos pelo numpy sem cópia na busca.
+    Um slot sem IDs é desativado e volta a valer se o nome reaparecer. Quando os slots inativos
+    passam de FRACAO_COMPACTAR, o índice é reconstruído só com os ativos.
+    Não é thread-safe: o CatalogoNomes serializa o acesso.
+    """
+
+    def __init__(self):
+        self._limpar()
+
+    def _limpar(self):
+        self._vocabulario: Dict[str, int] = {}
+        self._listas: List[array] = []
+        self._trigramas = array("i")
+        self._inicio = array("i")
+        self._tamanho = array("i")
+        self._ativo = bytearray()
+        self._chaves: List[str] = []
+        # IDs de cada slot em ordem de chegada (dict como conjunto ordenado)
+        self._ids_do_slot: List[Dict[Any, None]] = []
+        self._slot_da_chave: Dict[str, int] = {}
+        self._registros: Dict[Any, Tuple[int, str]] = {}  # id -> (slot, nome original)
+        self._inativos = 0
+
+    def __len__(self):
+        return len(self._registros)
+
+    def nome(self, id_registro) -> Optional[str]:
+        # nome original com que o id está no índice (None: não está)
+        registro = self._registros.get(id_registro)
+        return registro[1] if registro else None
+
+    def adicionar(self, id_registro, nome: str):
+        self._desativar(id_registro)
+        self._inserir(id_registro, nome)
+        self._compactar_se_preciso()
+
+    def carregar(self, registros: Iterable[Tuple[Any, str]]):
+        """Adiciona muitos (id, nome) de uma vez (snapshot, compactação).
+
+        As listas invertidas dos slots novos são montadas no fim com um argsort, em vez de um
+        append por trigrama.
+        """
+        primeiro, inicio = len(self._chaves), len(self._trigramas)
+        for id_registro, nome in registros:
+            self._desativar(id_registro)
+            self._inserir(id_registro, nome, indexar=False)
+        tids = np.frombuffer(self._trigramas, dtype=np.int32)[inicio:]
+        if len(tids):
+            tamanhos = np.frombuffer(self._tamanho, dtype=np.int32)[primeiro:]
+            slots = np.repeat(np.arange(primeiro, len(self._chaves), dtype=np.int32), tamanhos)
+            ordem = np.argsort(tids, kind="stable")
+            tids, slots = tids[ordem], slots[ordem]
+            cortes = np.flatnonzero(np.diff(tids)) + 1
+            for tid, pedaco in zip(tids[np.r_[0, cortes]], np.split(slots, cortes)):
+                self._listas[tid].frombytes(pedaco.tobytes())
+        self._compactar_se_preciso()
+
+    def _inserir(self, id_registro, nome: str, indexar: bool = True):
+        chave = normalizar_nome(nome)
+        if not chave:
+            return
+        slot = self._slot_da_chave.get(chave)
+        if slot is None:
+            slot = self._novo_slot(chave, indexar)
+        elif not self._ids_do_slot[slot]:
+            self._ativo[slot] = 1
+            self._inativos -= 1
+        self._ids_do_slot[slot][id_registro] = None
+        self._registros[id_registro] = (slot, nome)
+
+    def _novo_slot(self, chave: str, indexar: bool) -> int:
+        slot = len(self._chaves)
+        consulta = trigramas(chave)
+        tids = [self._vocabulario.get(t) for t in consulta]
+        if None in tids:
+            tids = [self._tid(t) for t in consulta]
+        self._inicio.append(len(self._trigramas))
+        self._tamanho.append(len(tids))
+        self._trigramas.extend(tids)
+        if indexar:
+            for tid in tids:
+                self._listas[tid].append(slot)
+        self._ativo.append(1)
+        self._chaves.append(chave)
+        self._ids_do_slot.append({})
+        self._slot_da_chave[chave] = slot
+        return slot
+
+    def _tid(self, trigrama: str) -> int:
+        tid = self._vocabulario.get(trigrama)
+        if tid is None:
+            tid = self._vocabulario[trigrama] = len(self._listas)
+            self._listas.append(array("i"))
+        return tid
+
+    def remover(self, id_registro):
+        self._desativar(id_registro)
+        self._compactar_se_preciso()
+
+    def _desativar(self, id_registro):
+        registro = self._registros.pop(id_registro, None)
+        if registro is None:
+            return
+        ids = self._ids_do_slot[registro[0]]
+        del ids[id_registro]
+        if not ids:
+            self._ativo[registro[0]] = 0
+            self._inativos += 1
+
+    def _compactar_se_preciso(self):
+        if self._inativos > max(1024, FRACAO_COMPACTAR * len(self._chaves)):
+            self.compactar()
+
+    def compactar(self):
+        registros = [(id_registro, self._registros[id_registro][1])
+                     for ids in self._ids_do_slot for id_registro in ids]
+        self._limpar()
+        self.carregar(registros)
+
+    def buscar(self, nome: str, limite: int = LIMITE, minimo: float = MINIMO) -> List[Dict[str, Any]]:
+        """Até `limite` registros com similaridade >= `minimo`, do mais parecido ao menos."""
+        normalizado = normalizar_nome(nome)
+        if not normalizado or not self._registros:
+            return []
+        consulta = trigramas(normalizado)
+        q = len(consulta)
+        # Dice = 2s / (q + r) >= minimo com s <= r  =>  s >= minimo * q / (2 - minimo) trigramas em comum
+        s_min = max(1, math.ceil(minimo * q / (2 - minimo) - 1e-9))
+        listas = sorted((self._listas[tid] for tid in map(self._vocabulario.get, consulta) if tid is not None),
+                        key=len)
+        if s_min > len(listas):
+            return []
+        total = len(self._chaves)
+        ativo = np.frombuffer(self._ativo, dtype=np.bool_)
+        # as `longas` listas mais compridas (trigramas muito comuns, como "  s") podem ficar de fora:
+        # um candidato ainda precisa de s_min - longas ocorrências nas listas curtas
+        limite_longa = max(64, total // DIVISOR_LISTA_LONGA)
+        longas = min(s_min - 1, sum(len(lista) > limite_longa for lista in listas))
+        curtas = listas[:len(listas) - longas]
+        if s_min - longas >= 2 and sum(map(len, curtas)) * 8 <= total:
+            # filtro de contagem nas listas curtas; similaridade exata só para os candidatos
+            unicos, contagem = np.unique(np.concatenate([np.frombuffer(l, dtype=np.int32) for l in curtas]),
+                                         return_counts=True)
+            candidatos = unicos[contagem >= s_min - longas]
+            candidatos = candidatos[ativo[candidatos]]
+            comuns = self._comuns(candidatos, consulta)
+        else:
+            # nomes muito comuns: contagem em todas as listas, que já é o número exato de trigramas em comum
+            contagem = np.bincount(np.concatenate([np.frombuffer(l, dtype=np.int32) for l in listas]),
+                                   minlength=total)
+            candidatos = np.flatnonzero(contagem >= s_min)
+            candidatos = candidatos[ativo[candidatos]]
+            comuns = contagem[candidatos]
+        if not len(candidatos):
+            return []
+        scores = 2.0 * comuns / (q + np.frombuffer(self._tamanho, dtype=np.int32)[candidatos])
+
+        aceitos = np.flatnonzero(scores >= minimo)
+        if len(aceitos) > limite:
+            # corta pelo limite-ésimo melhor score (mantém os empates) antes de ordenar
+            corte = np.partition(scores[aceitos], len(aceitos) - limite)[len(aceitos) - limite]
+            aceitos = aceitos[scores[aceitos] >= corte]
+        # maior score primeiro; empate pelo slot mais antigo (candidatos já estão em ordem de slot)
+        aceitos = aceitos[np.argsort(-scores[aceitos], kind="stable")[:limite]]
+        resultado = []
+        for i, slot in zip(aceitos, candidatos[aceitos]):
+            score = round(float(scores[i]), 3)
+            for id_registro in self._ids_do_slot[slot]:
+                if len(resultado) == limite:
+                    return resultado
+                resultado.append({"id": id_registro, "nome": self._registros[id_registro][1], "score": score})
+        return resultado
+
+    def _comuns(self, candidatos: np.ndarray, consulta: List[str]) -> np.ndarray:
+        # trigramas em comum com a consulta: percorre os trigramas de cada candidato no vetor contíguo
+        na_consulta = np.zeros(len(self._listas), dtype=np.bool_)
+        na_consulta[[self._vocabulario[t] for t in consulta if t in self._vocabulario]] = True
+        inicios = np.frombuffer(self._inicio, dtype=np.int32)[candidatos]
+        tamanhos = np.frombuffer(self._tamanho, dtype=np.int32)[candidatos]
+        deslocamentos = np.cumsum(tamanhos) - tamanhos
+        posicoes = np.repeat(inicios - deslocamentos, tamanhos) + np.arange(tamanhos.sum())
+        acertos = na_consulta[np.frombuffer(self._trigramas, dtype=np.int32)[posicoes]].astype(np.int32)
+        return np.add.reduceat(acertos, deslocamentos)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "registros": len(self._registros),
+            "nomes_distintos": len(self._chaves) - self._inativos,
+            "inativos": self._inativos,
+            "trigramas": len(self._vocabulario),
+        }
+
+
+class CatalogoNomes:
+    """Índices de pacientes e médicos alimentados por snapshot + log de deltas."""
+
+    TIPOS = ("paciente", "medico")
+
+    def __init__(self, caminho_deltas: Optional[str] = None):
+        self.indices = {tipo: IndiceNomes() for tipo in self.TIPOS}
+        self.log = LogDeltas(caminho_deltas) if caminho_deltas else None
+        self._lock = threading.Lock()
+        self.deltas_aplicados = 0
+
+    @classmethod
+    def de_arquivos(cls, snapshot: Optional[str], deltas: Optional[str] = None) -> "CatalogoNomes":
+        catalogo = cls(deltas)
+        if snapshot:
+            catalogo.carregar_snapshot(snapshot)
+        catalogo.atualizar()
+        return catalogo
+
+    def carregar_snapshot(self, caminho: str):
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        with self._lock:
+            for tipo in self.TIPOS:
+                self.indices[tipo].carregar((r["id"], r["nome"]) for r in dados.get(tipo + "s", []))
+
+    def aplicar(self, deltas: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for delta in deltas:
+                self._aplicar(delta)
+
+    def _aplicar(self, delta: Dict[str, Any]):
+        indice = self.indices.get(delta.get("tipo"))
+        if indice is None:
+            raise ValueError(f"tipo de registro desconhecido: {delta.get('tipo')!r}")
+        if delta.get("op", "upsert") == "remover":
+            indice.remover(delta["id"])
+        else:
+            indice.adicionar(delta["id"], delta["nome"])
+        self.deltas_aplicados += 1
+
+    def atualizar(self) -> int:
+        """Aplica os deltas novos do log; devolve quantos foram lidos."""
+        if self.log is None:
+            return 0
+        with self._lock:
+            deltas = self.log.novos()
+            for delta in deltas:
+                try:
+                    self._aplicar(delta)
+                except (ValueError, KeyError) as e:
+                    invalido(self.log.caminho, delta, e)
+            return len(deltas)
+
+    def registrar(self, deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Grava os deltas no log (para os outros workers) e aplica; sem log, só aplica em memória.
+
+        Devolve, para cada delta e na mesma ordem, {"tipo", "id", "op", "criado", "anterior"}:
+        `criado` é True só para um upsert de um id que não estava no índice e `anterior` é o nome
+        com que o id estava (None se não estava). Com log, o índice é antes atualizado com os
+        deltas já gravados pelos outros workers.
+        """
+        for delta in deltas:
+            if delta.get("tipo") not in self.indices:
+                raise ValueError(f"tipo de registro desconhecido: {delta.get('tipo')!r}")
+        if self.log is None:
+            with self._lock:
+                resultados = self._situacao(deltas)
+                for delta in deltas:
+                    self._aplicar(delta)
+            return resultados
+        with self._lock:
+            for delta in self.log.novos():
+                try:
+                    self._aplicar(delta)
+                except (ValueError, KeyError) as e:
+                    invalido(self.log.caminho, delta, e)
+            resultados = self._situacao(deltas)
+            self.log.gravar(deltas)
+        self.atualizar()
+        return resultados
+
+    def _situacao(self, deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # com o lock: o que cada delta encontra no índice, com os anteriores do mesmo lote já aplicados
+        vistos: Dict[Tuple[str, Any], Optional[str]] = {}
+        resultados = []
+        for delta in deltas:
+            tipo, id_registro = delta["tipo"], delta["id"]
+            chave = (tipo, id_registro)
+            anterior = vistos[chave] if chave in vistos else self.indices[tipo].nome(id_registro)
+            upsert = delta.get("op", "upsert") != "remover"
+            # um nome que normaliza para vazio não entra no índice (ver IndiceNomes._inserir)
+            vistos[chave] = delta["nome"] if upsert and normalizar_nome(delta["nome"]) else None
+            resultados.append({"tipo": tipo, "id": id_registro, "op": "upsert" if upsert else "remover",
+                               "criado": upsert and anterior is None, "anterior": anterior})
+        return resultados
+
+    def buscar(self, tipo: str, nome: str, limite: int = LIMITE, minimo: float = MINIMO) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self.indices[tipo].buscar(nome, limite, minimo)
+
+    def resolver(self, dados: Dict[str, Any], limite: int = LIMITE) -> Dict[str, List[Dict[str, Any]]]:
+        # candidatos (id, nome, score) para o paciente e o médico de um comando interpretado
+        with self._lock:
+            return {
+                "paciente": self.indices["paciente"].buscar(dados.get("pacienteNome") or "", limite),
+                "medico": self.indices["medico"].buscar(dados.get("medicoNome") or "", limite),
+            }
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **{tipo: indice.estatisticas() for tipo, indice in self.indices.items()},
+                "deltas_aplicados": self.deltas_aplicados,
+                "log_deltas": self.log.caminho if self.log else None,
+            }
@@ -1,23 +1,101 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
 import torch
-from model.model import MiniLLM
+import perfil
+from decodificacao import DecodificadorJSON
+from model.carregar import PESOS, carregar_modelo, ler_arquitetura
 from model.tokenizer import CharTokenizer
 
-tokenizer = CharTokenizer()
-model = MiniLLM(tokenizer.vocab_size)
-model.load_state_dict(torch.load("model/mini_llm.pth"))
-model.eval()
-
-def gerar_json_do_modelo(comando, max_len=128):
-    x = tokenizer.encode(comando)
-    x = x + [0]*(max_len-len(x)) if len(x)<max_len else x[:max_len]
-    x = torch.tensor([x])
-    with torch.no_grad():
-        out = model(x)
-        tokens = out.argmax(-1)[0]
-        json_text = tokenizer.decode(tokens.tolist())
-        # Tenta extrair JSON
-        import json
-        try:
-            return json.loads(json_text)
-        except:
-            return {"erro":"não consegui interpretar"}
+
+class _Modelo:
+    # tudo o que a inferência precisa, montado uma vez por processo por carregar() (ou avulso, com
+    # outros pesos, por carregar_de())
+    def __init__(self, pesos: str = PESOS):
+        inicio = time.perf_counter()
+        # versão do vocabulário de acordo com os pesos (as variantes exportadas vêm dos mesmos pesos)
+        self.tokenizer = CharTokenizer.do_checkpoint(pesos)
+        # comprimento da saída (128 nos pesos sem model/<pesos>.arquitetura.json)
+        self.seq_len = ler_arquitetura(pesos).get("seq_len", 128)
+        # MODELO_VARIANTE escolhe o que é carregado: fp32 (padrão, pesos .pth em modo eager), int8
+        # (quantizado na carga) ou um artefato gerado por exportar.py (fp32_script, fp32_export, int8_trace)
+        self.variante = os.environ.get("MODELO_VARIANTE", "fp32")
+        self.model = carregar_modelo(self.variante, self.tokenizer.vocab_size, pesos)
+        # MODELO_DECODIFICACAO: "gramatica" (padrão; saída restrita ao esquema do JSON, ver
+        # decodificacao.py) ou "argmax" (o caractere mais provável de cada posição)
+        decodificacao = os.environ.get("MODELO_DECODIFICACAO", "gramatica")
+        self.decodificador = DecodificadorJSON(self.tokenizer) if decodificacao == "gramatica" else None
+        # Em forward_lote a saída de cada posição só depende do token e da posição, então as posições
+        # de padding depois do comando mais longo do lote têm sempre a mesma saída: calculada uma
+        # vez aqui (é também o aquecimento do forward), ela completa a saída de um forward só sobre
+        # as colunas com texto
+        with torch.inference_mode():
+            self.logits_padding = self.model(torch.zeros(1, self.seq_len, dtype=torch.long))[0]
+            self.tokens_padding = self.logits_padding.argmax(-1)
+        self.segundos_carga = time.perf_counter() - inicio
+
+
+_modelo: Optional[_Modelo] = None
+_lock = threading.Lock()
+
+
+def carregar() -> _Modelo:
+    # Nada é carregado no import: a primeira chamada (primeira inferência, aquecimento do main.py
+    # ou servidor.py antes do fork) lê os pesos; as seguintes devolvem o mesmo objeto.
+    global _modelo
+    if _modelo is None:
+        with _lock:
+            if _modelo is None:
+                _modelo = _Modelo()
+    return _modelo
+
+
+def carregado() -> bool:
+    return _modelo is not None
+
+
+def carregar_de(pesos: str) -> _Modelo:
+    # modelo avulso com outros pesos (sweep.py), fora do compartilhado por carregar()
+    return _Modelo(pesos)
+
+
+def gerar_json_lote(comandos: List[str], max_len=None, modelo: Optional[_Modelo] = None) -> List[Dict[str, Any]]:
+    # um único forward [B, L], L = comando mais longo do lote (as colunas finais, padding em
+    # todos os comandos, vêm de tokens_padding); cada saída é idêntica à de
+    # gerar_json_do_modelo chamado com o comando sozinho. max_len padrão: seq_len do modelo
+    m = modelo or carregar()
+    max_len = max_len or m.seq_len
+    x = m.tokenizer.encode_batch(comandos)[:, :max_len]
+    if x.shape[1] == 0:
+        x = torch.zeros(len(comandos), 1, dtype=torch.long)
+    L = x.shape[1]
+    # regiões do perfil só com um perfil aberto (python perfil.py inferencia)
+    with torch.inference_mode():
+        if m.decodificador is not None:
+            # a decodificação restrita precisa dos logits de todas as posições
+            with perfil.regiao("forward"):
+                logits = m.model(x)
+                logits = torch.cat([logits, m.logits_padding[L:max_len].expand(len(comandos), -1, -1)], dim=1)
+            with perfil.regiao("decodificacao"):
+                textos = m.decodificador.decodificar(logits)
+        else:
+            with perfil.regiao("forward"):
+                tokens = m.model(x).argmax(-1)
+                tokens = torch.cat([tokens, m.tokens_padding[L:max_len].expand(len(comandos), -1)], dim=1)
+            with perfil.regiao("decodificacao"):
+                textos = m.tokenizer.decode_batch(tokens)
+    resultados = []
+    with perfil.regiao("json"):
+        for json_text in textos:
+            # Tenta extrair JSON
+            try:
+                resultados.append(json.loads(json_text))
+            except ValueError:
+                resultados.append({"erro": "não consegui interpretar"})
+    return resultados
+
+def gerar_json_do_modelo(comando, max_len=None):
+    return gerar_json_lote([comando], max_len)[0]
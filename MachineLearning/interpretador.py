@@ -0,0 +1,404 @@
+# interpretador.py
+# Parser de comandos em linguagem natural (regex) usado pelo endpoint /comando.
+# Todas as expressões são compiladas uma única vez na criação do InterpretadorComandos; datas e
+# horas capturadas são normalizadas (e validadas) por datas.py.
+import re
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional, Dict, Any, Tuple
+
+import datas
+from registro import obter_logger, registrar_debug
+
+log = obter_logger("interpretador")
+
+# limites padrão: comandos reais têm ~90-130 caracteres
+MAX_CARACTERES = 500
+TEMPO_LIMITE = 0.25  # segundos por chamada (o comando real mais lento do dataset leva ~0.16s)
+
+# com ordem adaptativa, a ordem das etapas é recalculada a cada N chamadas
+REORDENAR_A_CADA = 256
+
+# Pré-filtro: uma passada barata pelo texto (testes de substring e buscas curtas) coleta os
+# gatilhos de cada etapa da cascata. Cada etapa só roda se todos os seus gatilhos estiverem
+# presentes; são condições necessárias para o padrão casar, então descartar uma etapa nunca
+# muda o resultado. Os padrões usam IGNORECASE sobre o texto já em minúsculas, onde os
+# únicos casamentos extras são ı~i e ſ~s; o texto é normalizado para isso antes dos testes.
+
+# resultado de uma etapa cujo padrão não casou (None significa "casou, mas data/hora inválida")
+_NAO_CASOU = object()
+
+
+class ComandoMuitoLongo(ValueError):
+    pass
+
+
+class TempoLimiteExcedido(Exception):
+    pass
+
+
+class InterpretadorComandos:
+    """Cascata de padrões regex compilada uma vez, com limite de tamanho e de tempo.
+
+    O tempo limite é verificado entre as etapas da cascata. Quando a chamada roda na
+    thread principal (scripts, workers de processo) um SIGALRM também interrompe uma busca
+    regex em andamento, já que o módulo `re` verifica sinais durante o backtracking. Em outras
+    threads só vale a verificação entre etapas e uma busca patológica pode levar dezenas de
+    segundos: o /comando (threadpool) usa o InterpretadorIsolado, que roda a cascata num
+    processo filho.
+
+    Um pré-filtro de gatilhos decide quais etapas podem casar antes de rodar qualquer padrão.
+    Com `ordem_adaptativa=True` as etapas candidatas passam a ser tentadas pela frequência de
+    acertos; como a primeira que casa vence, o resultado pode diferir da cascata original
+    quando mais de um padrão casa, por isso o padrão é manter a prioridade original.
+    """
+
+    def __init__(self, max_caracteres: int = MAX_CARACTERES, tempo_limite: Optional[float] = TEMPO_LIMITE,
+                 ordem_adaptativa: bool = False):
+        self.max_caracteres = max_caracteres
+        self.tempo_limite = tempo_limite
+        self.ordem_adaptativa = ordem_adaptativa
+        self._alarme_armado = False
+
+        # prefixos a remover dos nomes, na mesma ordem da antiga lista de re.sub:
+        # cada prefixo é opcional e aplicado no máximo uma vez, seguido dos títulos (dr., dra., ...)
+        verbo = r"(?:marcar|marque|agendar|agende)\s+"
+        prefixos = [
+            verbo + r"consulta\s+para\s+o\s+paciente\s+",
+            verbo + r"consulta\s+para\s+o\s+",
+            verbo + r"consulta\s+para\s+",
+            verbo + r"consulta\s+",
+            verbo + r"para\s+o\s+paciente\s+",
+            verbo + r"para\s+o\s+",
+            verbo + r"para\s+",
+            r"consulta\s+para\s+o\s+paciente\s+",
+            r"consulta\s+para\s+o\s+",
+            r"consulta\s+para\s+",
+            r"para\s+o\s+paciente\s+",
+            r"para\s+o\s+",
+            r"para\s+",
+            r"paciente\s+",
+            r"\bcom\b\s+",
+            r"\bo\b\s+",
+            r"\ba\b\s+",
+            r"(?:dr\.?|dra\.?|sr\.?|sra\.?)\s+",
+        ]
+        self.re_prefixos = re.compile("".join(f"(?:{p})?" for p in prefixos), re.IGNORECASE)
+        self.re_espacos = re.compile(r"\s+")
+
+        # trechos de data e hora comuns aos padrões (grupos: dia, mês, ano | início, fim):
+        # dia e mês separados por barra, hífen, "de" ou espaço; o ano inteiro (4 dígitos, ou 2 depois
+        # de barra/hífen ou que não sejam o começo de uma hora ou de um intervalo); horas como 9, 9h,
+        # 9:30 ou 9h30, com o fim do intervalo opcional
+        data = (r"(\d{1,2})(?!\d)\s*(?:[\/\-]|de\s+)?\s*([A-Za-zÀ-ÿ]+\.?|\d{1,2}(?!\d))"
+                r"(?:\s*(?:[\/\-]|de\s+)?\s*(\d{4}(?!\d)|(?<=[\/\-])\d{2}(?![\d:h])"
+                r"|\d{2}(?![\d:h])(?!\s*(?:às|as|a|até|ate|-)\s*\d)))?")
+        hora = r"(\d{1,2}(?:[:h]\d{2}|h)?)(?![\d:])"
+        horario = (r".*?(?:das|de|às|as|a)?\s*(?<!\d)" + hora
+                   + r"(?:\s*(?:às|as|a|até|ate|-)\s*" + hora + r")?")
+
+        # --- pattern_para_com ---
+        self.pattern_para_com = re.compile(
+            r"(?:marcar|marque|agendar|agende|marcar uma|marque uma|agendar uma).*?"
+            r"(?:para\s+)?([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+com\s+([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+"
+            r"(?:no dia|no|no\s+dia|em|para o dia|para)\s+" + data + horario,
+            re.IGNORECASE
+        )
+        # 1) mês por extenso: "12 de novembro de 2025 das 10:30 às 11:30"
+        self.pattern1 = re.compile(
+            r"(consulta|cirurgia|retorno|teleconsulta|exame|consulta online|agendar|marcar).*?"
+            r"(paciente|entre o paciente)\s+([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:e\s+o\s+medico|e\s+o\s+médico|e\s+o\s+dr\.?|e\s+o\s+dra\.?|e\s+o\s+dr|e\s+o\s+drs|e\s+o)\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+"
+            r"(?:para o dia|no dia|em|para|dia)\s+" + data + horario,
+            re.IGNORECASE
+        )
+        # 2) formato dd/mm/yyyy ou dd/mm
+        self.pattern2 = re.compile(
+            r"(consulta|cirurgia|retorno|teleconsulta|exame).*?"
+            r"(?:paciente|entre o paciente)?\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:com|e|e o médico|com o médico|com a médica)\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+"
+            r"(?:no dia|em|para|dia)?\s*(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?.*?(?:às|as|a|das)?\s*(\d{1,2}:\d{2})\s*(?:até|ate|às|a|-)\s*(\d{1,2}:\d{2})",
+            re.IGNORECASE
+        )
+        # 3) simples "marque uma consulta ... dia dd/mm/yyyy as hh:mm até hh:mm"
+        self.pattern3 = re.compile(
+            r"(consulta|cirurgia|retorno|teleconsulta|exame).*?(?:paciente)?\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:com|e|com o médico|com a médica)\s*([A-Za-zÀ-ÿ0-9\.\s]+?).*?(\d{1,2})[\/\-](\d{1,2})[\/\-]?(\d{2,4})?.*?(\d{1,2}:\d{2}).*?(?:até|a)\s*(\d{1,2}:\d{2})",
+            re.IGNORECASE
+        )
+        # 4) data relativa: "agendar consulta para Ana com Dr. Rui amanhã às 9", "... na próxima sexta das 14h às 15h"
+        # (datas.PADRAO_RELATIVA não tem grupos de captura: a expressão inteira é o grupo 3)
+        self.pattern_relativa = re.compile(
+            r"(?:marcar|marque|agendar|agende|consulta|cirurgia|retorno|teleconsulta|exame)"
+            r"(?:.*?\b(?:para|paciente)\s+(?:(?:[oa]\s+)?paciente\s+)?)?([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+com\s+"
+            r"(?:[oa]\s+m[ée]dic[oa]\s+)?([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+"
+            r"(?:para\s+|em\s+)?(" + datas.PADRAO_RELATIVA + r")(?!\w)" + horario,
+            re.IGNORECASE
+        )
+        self.re_tipo = re.compile(r"consulta|cirurgia|retorno|teleconsulta|exame")
+        # 5) fallback heurístico
+        self.fallback_paciente = re.compile(r"paciente\s+([A-Za-zÀ-ÿ0-9\.\s]+?)(?:\s+com|\s+e|,|\.|$)")
+        self.fallback_medico = re.compile(r"(?:m[eé]dico|dr\.|dra\.|médico|médica)\s+([A-Za-zÀ-ÿ0-9\.\s]+?)(?:\s+dia|\s+para|\s+no|\s+às|,|$)")
+        self.fallback_hora = re.compile(r"(\d{1,2}:\d{2})")
+        self.fallback_data = re.compile(r"(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?")
+
+        self._dias_semana = tuple({forma for dia in datas.DIAS_SEMANA for forma in (dia, datas.sem_acento(dia))})
+        self.re_gatilho_com = re.compile(r"\scom\s")
+        self.re_gatilho_e_o = re.compile(r"\se\s+o")
+        self.re_gatilho_digito = re.compile(r"\d")
+        self.re_gatilho_data = re.compile(r"\d[\/\-]\d")
+        self.re_gatilho_hora = re.compile(r"\d:\d\d")
+        # intervalos de horário exigidos no fim dos padrões 2 e 3
+        self.re_gatilho_intervalo_hhmm = re.compile(r"\d:\d\d\s*(?:até|ate|às|a|-)\s*\d{1,2}:\d{2}")
+        self.re_gatilho_ate_hhmm = re.compile(r"(?:até|a)\s*\d{1,2}:\d{2}")
+        # (nome, gatilhos necessários, tentativa) na prioridade original da cascata
+        self._etapas = [
+            ("pattern_para_com", frozenset({"verbo", "com", "digito"}), self._tentar_para_com),
+            ("pattern1", frozenset({"tipo1", "paciente", "e_o", "digito"}), self._tentar_pattern1),
+            ("pattern2", frozenset({"tipo", "data", "intervalo_hhmm"}), self._tentar_pattern2),
+            ("pattern3", frozenset({"tipo", "data", "hora", "ate_hhmm"}), self._tentar_pattern3),
+            ("pattern_relativa", frozenset({"relativa", "com", "digito"}), self._tentar_relativa),
+            ("fallback", frozenset({"paciente", "medico", "data", "hora"}), self._tentar_fallback),
+        ]
+        self._ordem = list(self._etapas)
+        self._cache_candidatas = {}
+        self._chamadas = 0
+        self.contadores = {nome: {"tentativas": 0, "acertos": 0, "descartes": 0} for nome, _, _ in self._etapas}
+
+    def clean_person_name(self, s: str) -> str:
+        if not s:
+            return s
+        s = s.strip()
+        # remove todos os prefixos e títulos numa única passada ancorada no início
+        s = s[self.re_prefixos.match(s).end():]
+        # colapsar espaços múltiplos e normalizar
+        s = self.re_espacos.sub(' ', s).strip()
+        # Title case (mantém acentos)
+        return s.title()
+
+    def interpretar(self, texto: str, hoje: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        # Tenta extrair: tipoAtividade, pacienteNome, medicoNome, inicio (ISO), fim (ISO opcional)
+        # Retorna dict ou None se não conseguiu.
+        # `hoje` é a referência para datas sem ano e relativas ("amanhã"); padrão: o dia atual.
+        # Levanta ComandoMuitoLongo ou TempoLimiteExcedido quando os limites são violados.
+        return self.interpretar_detalhado(texto, hoje)[0]
+
+    def interpretar_detalhado(self, texto: str,
+                              hoje: Optional[date] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        # Como interpretar, mas também devolve o nome do padrão que casou (ou None).
+        if not texto:
+            return None, None
+
+        texto_original = texto.strip()
+        if len(texto_original) > self.max_caracteres:
+            raise ComandoMuitoLongo(f"Comando muito longo ({len(texto_original)} caracteres, máximo {self.max_caracteres}).")
+        texto_lower = texto_original.lower()
+
+        registrar_debug(log, "texto recebido", texto=texto_original)
+
+        with self._orcamento() as prazo:
+            return self._cascata(texto_original, texto_lower, prazo, hoje or datas.hoje())
+
+    # --- limites de tempo ---
+
+    @contextmanager
+    def _orcamento(self):
+        if self.tempo_limite is None:
+            yield None
+            return
+        prazo = time.perf_counter() + self.tempo_limite
+        usar_alarme = (
+            hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+            and signal.getitimer(signal.ITIMER_REAL)[0] == 0
+        )
+        if not usar_alarme:
+            yield prazo
+            return
+        anterior = signal.signal(signal.SIGALRM, self._ao_alarme)
+        self._alarme_armado = True
+        signal.setitimer(signal.ITIMER_REAL, self.tempo_limite)
+        try:
+            yield prazo
+        finally:
+            self._alarme_armado = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, anterior)
+
+    def _ao_alarme(self, signum, frame):
+        if self._alarme_armado:
+            raise TempoLimiteExcedido(f"Tempo limite de {self.tempo_limite}s excedido.")
+
+    def _verificar_prazo(self, prazo: Optional[float]):
+        if prazo is not None and time.perf_counter() > prazo:
+            raise TempoLimiteExcedido(f"Tempo limite de {self.tempo_limite}s excedido.")
+
+    # --- pré-filtro por gatilhos ---
+
+    def _gatilhos(self, texto_lower: str) -> frozenset:
+        t = texto_lower
+        if "ı" in t or "ſ" in t:
+            t = t.replace("ı", "i").replace("ſ", "s")
+        gatilhos = []
+        verbo_tipo = "marcar" in t or "agendar" in t
+        if verbo_tipo or "marque" in t or "agende" in t:
+            gatilhos.append("verbo")
+        tipo = "consulta" in t or "cirurgia" in t or "retorno" in t or "exame" in t
+        if tipo:
+            gatilhos.append("tipo")
+        if tipo or verbo_tipo:
+            gatilhos.append("tipo1")
+        if "paciente" in t:
+            gatilhos.append("paciente")
+        if "médic" in t or "medico" in t or "dr." in t or "dra." in t:
+            gatilhos.append("medico")
+        if "amanh" in t or "hoje" in t or any(dia in t for dia in self._dias_semana):
+            gatilhos.append("relativa")
+        if self.re_gatilho_com.search(t):
+            gatilhos.append("com")
+        if self.re_gatilho_e_o.search(t):
+            gatilhos.append("e_o")
+        if self.re_gatilho_digito.search(t):
+            gatilhos.append("digito")
+            if self.re_gatilho_data.search(t):
+                gatilhos.append("data")
+            if self.re_gatilho_hora.search(t):
+                gatilhos.append("hora")
+                if self.re_gatilho_intervalo_hhmm.search(t):
+                    gatilhos.append("intervalo_hhmm")
+                if self.re_gatilho_ate_hhmm.search(t):
+                    gatilhos.append("ate_hhmm")
+        return frozenset(gatilhos)
+
+    def _candidatas(self, gatilhos: frozenset):
+        # etapas cujos requisitos estão todos presentes no texto, na ordem atual
+        candidatas = self._cache_candidatas.get(gatilhos)
+        if candidatas is None:
+            candidatas = tuple(e for e in self._ordem if e[1] <= gatilhos)
+            self._cache_candidatas[gatilhos] = candidatas
+        return candidatas
+
+    def _reordenar(self):
+        # ordem adaptativa: etapas com mais acertos primeiro (empate mantém a prioridade original)
+        ordem = sorted(self._etapas, key=lambda e: -self.contadores[e[0]]["acertos"])
+        if ordem != self._ordem:
+            self._ordem = ordem
+            self._cache_candidatas = {}
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "chamadas": self._chamadas,
+            "ordem_adaptativa": self.ordem_adaptativa,
+            "ordem": [e[0] for e in self._ordem],
+            "padroes": {nome: dict(c) for nome, c in self.contadores.items()},
+        }
+
+    # --- cascata de padrões ---
+
+    def _montar_resultado(self, tipo: str, paciente_raw: str, medico_raw: str, date_prefix: str,
+                          inicio_time: str, fim_time: Optional[str]) -> Dict[str, Any]:
+        resultado = {
+            "tipoAtividade": tipo,
+            "pacienteNome": self.clean_person_name(paciente_raw),
+            "medicoNome": self.clean_person_name(medico_raw),
+            "inicio": f"{date_prefix}T{inicio_time}"
+        }
+        if fim_time:
+            resultado["fim"] = f"{date_prefix}T{fim_time}"
+        return resultado
+
+    @staticmethod
+    def _tipo(tipo_raw: str) -> str:
+        return "Consulta" if "consulta" in tipo_raw.lower() else tipo_raw.capitalize()
+
+    def _cascata(self, texto_original: str, texto_lower: str, prazo: Optional[float],
+                 hoje: date) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        self._chamadas += 1
+        if self.ordem_adaptativa and self._chamadas % REORDENAR_A_CADA == 0:
+            self._reordenar()
+
+        candidatas = self._candidatas(self._gatilhos(texto_lower))
+        if len(candidatas) < len(self._etapas):
+            for nome, _, _ in self._etapas:
+                if all(c[0] != nome for c in candidatas):
+                    self.contadores[nome]["descartes"] += 1
+
+        for nome, _, tentar in candidatas:
+            self._verificar_prazo(prazo)
+            contador = self.contadores[nome]
+            contador["tentativas"] += 1
+            resultado = tentar(texto_lower, hoje)
+            if resultado is not _NAO_CASOU:
+                # um padrão que casou encerra a cascata, mesmo que a data/hora seja inválida
+                contador["acertos"] += 1
+                return resultado, nome
+
+        registrar_debug(log, "nenhum pattern casou", texto=texto_original)
+        return None, None
+
+    def _resultado(self, nome: str, tipo: str, paciente_raw: str, medico_raw: str, dia: Optional[str],
+                   inicio_s: str, fim_s: Optional[str]) -> Optional[Dict[str, Any]]:
+        # data já normalizada (None se impossível) e horas ainda como no texto
+        if not dia:
+            registrar_debug(log, "data inválida", padrao=nome)
+            return None
+        inicio_time = datas.hora(inicio_s)
+        if not inicio_time:
+            registrar_debug(log, "hora inválida", padrao=nome, inicio=inicio_s)
+            return None
+        return self._montar_resultado(tipo, paciente_raw.strip(), medico_raw.strip(), dia, inicio_time,
+                                      datas.hora(fim_s))
+
+    def _tentar_para_com(self, texto_lower: str, hoje: date):
+        mpc = self.pattern_para_com.search(texto_lower)
+        if not mpc:
+            return _NAO_CASOU
+        registrar_debug(log, "pattern casou", padrao="pattern_para_com", grupos=mpc.groups())
+        paciente_raw, medico_raw, dia_s, mes_s, ano_s, inicio_s, fim_s = mpc.groups()
+        return self._resultado("pattern_para_com", "Consulta", paciente_raw, medico_raw,
+                               datas.data(dia_s, mes_s, ano_s, hoje), inicio_s, fim_s)
+
+    def _tentar_pattern1(self, texto_lower: str, hoje: date):
+        m = self.pattern1.search(texto_lower)
+        if not m:
+            return _NAO_CASOU
+        registrar_debug(log, "pattern casou", padrao="pattern1", grupos=m.groups())
+        tipo_raw, _, paciente_raw, medico_raw, dia_s, mes_s, ano_s, inicio_s, fim_s = m.groups()
+        return self._resultado("pattern1", self._tipo(tipo_raw), paciente_raw, medico_raw,
+                               datas.data(dia_s, mes_s, ano_s, hoje), inicio_s, fim_s)
+
+    def _tentar_pattern2(self, texto_lower: str, hoje: date):
+        return self._tentar_data_barra("pattern2", self.pattern2, texto_lower, hoje)
+
+    def _tentar_pattern3(self, texto_lower: str, hoje: date):
+        return self._tentar_data_barra("pattern3", self.pattern3, texto_lower, hoje)
+
+    def _tentar_data_barra(self, nome: str, pattern, texto_lower: str, hoje: date):
+        m = pattern.search(texto_lower)
+        if not m:
+            return _NAO_CASOU
+        registrar_debug(log, "pattern casou", padrao=nome, grupos=m.groups())
+        tipo_raw, paciente_raw, medico_raw, dia_s, mes_s, ano_s, inicio_s, fim_s = m.groups()
+        return self._resultado(nome, self._tipo(tipo_raw), paciente_raw, medico_raw,
+                               datas.data(dia_s, mes_s, ano_s, hoje), inicio_s, fim_s)
+
+    def _tentar_relativa(self, texto_lower: str, hoje: date):
+        m = self.pattern_relativa.search(texto_lower)
+        if not m:
+            return _NAO_CASOU
+        registrar_debug(log, "pattern casou", padrao="pattern_relativa", grupos=m.groups())
+        paciente_raw, medico_raw, expressao, inicio_s, fim_s = m.groups()
+        tipo = self.re_tipo.search(texto_lower)
+        return self._resultado("pattern_relativa", self._tipo(tipo.group(0)) if tipo else "Consulta", paciente_raw,
+                               medico_raw, datas.relativa(expressao, hoje), inicio_s, fim_s)
+
+    def _tentar_fallback(self, texto_lower: str, hoje: date):
+        # 5) fallback heurístico
+        paciente_m = self.fallback_paciente.search(texto_lower)
+        medico_m = self.fallback_medico.search(texto_lower)
+        time_m = self.fallback_hora.search(texto_lower)
+        date_m = self.fallback_data.search(texto_lower)
+        if not (paciente_m and medico_m and time_m and date_m):
+            return _NAO_CASOU
+        return self._resultado("fallback", "Consulta", paciente_m.group(1), medico_m.group(1),
+                               datas.data(*date_m.groups(), hoje), time_m.group(1), None)
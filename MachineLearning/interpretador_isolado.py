@@ -0,0 +1,139 @@
+# interpretador_isolado.py
+# InterpretadorComandos num processo filho, para o /comando.
+#
+# O /comando roda no threadpool, onde o SIGALRM não pode ser armado: o tempo limite só valeria
+# entre as etapas da cascata e um padrão com backtracking catastrófico prenderia a thread por
+# dezenas de segundos. No filho a cascata roda na thread principal, então o SIGALRM interrompe a
+# busca em andamento no tempo limite (TempoLimiteExcedido, como num script). Se ainda assim o
+# filho não responder em PRAZO_MORTE segundos, ele é morto e recriado na chamada seguinte.
+#
+# O `re` não solta o GIL, então as threads de um worker já interpretavam um comando por vez:
+# um filho por worker, com as chamadas serializadas por um lock, mantém a vazão. O filho é
+# criado na primeira chamada (ou em iniciar()), depois do fork dos workers do servidor.py.
+import multiprocessing
+import os
+import signal
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from interpretador import (MAX_CARACTERES, TEMPO_LIMITE, ComandoMuitoLongo, InterpretadorComandos,
+                           TempoLimiteExcedido)
+from registro import configurar_logging, obter_logger
+
+log = obter_logger("interpretador_isolado")
+
+# espera máxima por uma resposta do filho, além do tempo limite dele (SIGALRM)
+PRAZO_MORTE = 2.0
+# espera pelo filho recém-criado (import do interpretador e compilação dos padrões)
+PRAZO_INICIO = 30.0
+
+
+def _servir(conexao, max_caracteres: int, tempo_limite: Optional[float]):
+    # laço do processo filho: ("interpretar", (texto, hoje)) ou ("estatisticas", ()) -> (ok, valor)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C é do pai, que encerra o filho
+    configurar_logging()
+    interpretador = InterpretadorComandos(max_caracteres, tempo_limite)
+    conexao.send((True, "pronto"))
+    while True:
+        try:
+            operacao, args = conexao.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if operacao == "interpretar":
+                resposta = (True, interpretador.interpretar_detalhado(*args))
+            else:
+                resposta = (True, interpretador.estatisticas())
+        except (ComandoMuitoLongo, TempoLimiteExcedido) as e:
+            resposta = (False, e)
+        except Exception as e:
+            # nem toda exceção é serializável; o pai recebe o tipo e a mensagem
+            resposta = (False, RuntimeError(f"{type(e).__name__}: {e}"))
+        conexao.send(resposta)
+
+
+class InterpretadorIsolado:
+    """Mesma interface do InterpretadorComandos usada pelo /comando (interpretar,
+    interpretar_detalhado, estatisticas, max_caracteres), com a cascata num processo filho."""
+
+    def __init__(self, max_caracteres: int = MAX_CARACTERES, tempo_limite: Optional[float] = TEMPO_LIMITE,
+                 prazo_morte: float = PRAZO_MORTE):
+        self.max_caracteres = max_caracteres
+        self.tempo_limite = tempo_limite
+        self.prazo_morte = prazo_morte
+        self.reinicios = 0
+        self._lock = threading.Lock()
+        self._processo = None
+        self._conexao = None
+        self._pid = None
+
+    def iniciar(self):
+        with self._lock:
+            self._garantir_filho()
+
+    def _garantir_filho(self):
+        # chamado com o lock; depois de um fork o filho do pai não é deste processo
+        if self._pid == os.getpid() and self._processo is not None and self._processo.is_alive():
+            return
+        contexto = multiprocessing.get_context("spawn")
+        conexao, do_filho = contexto.Pipe()
+        processo = contexto.Process(target=_servir, args=(do_filho, self.max_caracteres, self.tempo_limite),
+                                    name="interpretador", daemon=True)
+        processo.start()
+        do_filho.close()
+        if not conexao.poll(PRAZO_INICIO):
+            processo.kill()
+            raise RuntimeError("processo do interpretador não iniciou")
+        conexao.recv()
+        self._processo, self._conexao, self._pid = processo, conexao, os.getpid()
+
+    def _matar(self):
+        self._processo.kill()
+        self._processo.join()
+        self._conexao.close()
+        self._processo = self._conexao = None
+        self.reinicios += 1
+
+    def _chamar(self, operacao: str, *args):
+        with self._lock:
+            self._garantir_filho()
+            self._conexao.send((operacao, args))
+            espera = None if self.tempo_limite is None else self.tempo_limite + self.prazo_morte
+            if not self._conexao.poll(espera):
+                self._matar()
+                log.warning("interpretador sem resposta; processo recriado",
+                            extra={"campos": {"espera_s": espera, "reinicios": self.reinicios}})
+                raise TempoLimiteExcedido(f"Tempo limite de {self.tempo_limite}s excedido.")
+            try:
+                ok, valor = self._conexao.recv()
+            except EOFError:
+                # o filho morreu no meio (OOM, sinal): a próxima chamada cria outro
+                self._matar()
+                raise RuntimeError("processo do interpretador terminou inesperadamente")
+        if not ok:
+            raise valor
+        return valor
+
+    def interpretar(self, texto: str, hoje=None) -> Optional[Dict[str, Any]]:
+        return self.interpretar_detalhado(texto, hoje)[0]
+
+    def interpretar_detalhado(self, texto: str, hoje=None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        if not texto:
+            return None, None
+        # o tamanho é checado aqui para não mandar textos enormes pelo pipe
+        if len(texto.strip()) > self.max_caracteres:
+            raise ComandoMuitoLongo(f"Comando muito longo ({len(texto.strip())} caracteres, "
+                                    f"máximo {self.max_caracteres}).")
+        return self._chamar("interpretar", texto, hoje)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {**self._chamar("estatisticas"), "reinicios": self.reinicios}
+
+    def encerrar(self):
+        with self._lock:
+            if self._processo is not None and self._pid == os.getpid():
+                self._conexao.close()
+                self._processo.join(timeout=1)
+                if self._processo.is_alive():
+                    self._processo.kill()
+            self._processo = self._conexao = self._pid = None
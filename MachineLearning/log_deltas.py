@@ -0,0 +1,59 @@
+# log_deltas.py
+# Log de deltas em JSONL compartilhado pelos workers do uvicorn. Cada processo grava os seus com uma
+# única escrita em modo append (as linhas de workers diferentes não se misturam) e lê as linhas novas
+# a partir da posição onde parou, então um delta gravado por qualquer processo chega a todos.
+# Usado pelo índice de nomes (indice_nomes.py) e pelo da agenda (agenda.py). Os deltas precisam ser
+# idempotentes: um log truncado ou rotacionado é relido do início.
+import json
+import os
+from typing import Any, Dict, List
+
+from registro import obter_logger
+
+log = obter_logger("deltas")
+
+
+class LogDeltas:
+    """Leitor/escritor incremental de um arquivo JSONL. Não é thread-safe (quem usa serializa)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.posicao = 0
+
+    def novos(self) -> List[Dict[str, Any]]:
+        # deltas gravados desde a última chamada; linhas que não são JSON são descartadas com aviso
+        try:
+            tamanho = os.path.getsize(self.caminho)
+        except FileNotFoundError:
+            return []
+        if tamanho < self.posicao:
+            self.posicao = 0
+        if tamanho == self.posicao:
+            return []
+        with open(self.caminho, "rb") as f:
+            f.seek(self.posicao)
+            bloco = f.read(tamanho - self.posicao)
+        # só linhas completas; uma escrita em andamento fica para a próxima chamada
+        completo = bloco[:bloco.rfind(b"\n") + 1]
+        self.posicao += len(completo)
+        deltas = []
+        for linha in completo.decode("utf-8").splitlines():
+            if not linha.strip():
+                continue
+            try:
+                deltas.append(json.loads(linha))
+            except ValueError as e:
+                invalido(self.caminho, linha, e)
+        return deltas
+
+    def gravar(self, deltas: List[Dict[str, Any]]):
+        linhas = "".join(json.dumps(d, ensure_ascii=False) + "\n" for d in deltas)
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            f.write(linhas)
+
+
+def invalido(caminho: str, delta: Any, erro: Exception):
+    # um delta inválido é pulado: não pode travar o log para sempre. O delta vai inteiro no campo
+    # "delta", mascarado pelo FormatadorJson (nomes; linha sem JSON vira só o tamanho)
+    campo = delta if isinstance(delta, dict) else str(delta)[:200]
+    log.warning("delta ignorado", extra={"campos": {"log": caminho, "erro": str(erro), "delta": campo}})
@@ -0,0 +1,138 @@
+# lote.py
+# Interpretação de comandos em lote (/comandos/lote) distribuída num pool de processos.
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import datas
+from cache_comandos import CacheComandos
+from interpretador import InterpretadorComandos, ComandoMuitoLongo, TempoLimiteExcedido
+from metricas import COMANDOS, LATENCIA_INTERPRETACAO, PADROES
+from registro import anotar, configurar_logging, obter_logger, registrar_debug
+
+log = obter_logger("lote")
+
+TAMANHO_PEDACO = 64
+ERRO_NAO_ENTENDIDO = "Não foi possível entender o comando."
+# campos que uma saída do modelo precisa ter para ser aceita no lugar do regex
+CAMPOS_MODELO = ("tipoAtividade", "pacienteNome", "medicoNome", "inicio")
+
+# interpretador e cache próprios de cada processo do pool (criados no primeiro pedaço recebido)
+_interpretador: Optional[InterpretadorComandos] = None
+_cache: Optional[CacheComandos] = None
+
+
+def responder_comando(interpretador: InterpretadorComandos, texto: str,
+                      cache: Optional[CacheComandos] = None, hoje: Optional[date] = None) -> Dict[str, Any]:
+    # mesmo formato de resposta do /comando; padrão, cache e latência vão para o log da requisição.
+    # `hoje` é o dia de referência das datas sem ano ou relativas (padrão: o dia atual)
+    if not texto:
+        log.debug("texto vazio")
+        anotar(sucesso=False, motivo="vazio")
+        COMANDOS.inc(resultado="falha")
+        return {"sucesso": False, "erro": "Comando vazio. Envie 'mensagem' ou 'comando' no body."}
+    inicio = time.perf_counter()
+    try:
+        if cache is not None:
+            (resultado, padrao), do_cache = cache.interpretar(texto, interpretador.interpretar_detalhado, hoje)
+        else:
+            (resultado, padrao), do_cache = interpretador.interpretar_detalhado(texto, hoje), False
+        duracao = time.perf_counter() - inicio
+        anotar(padrao=padrao, cache=do_cache, sucesso=bool(resultado), interpretacao_ms=round(duracao * 1000, 3))
+        LATENCIA_INTERPRETACAO.observar(duracao, cache="true" if do_cache else "false")
+        COMANDOS.inc(resultado="sucesso" if resultado else "falha")
+        if not resultado:
+            registrar_debug(log, "interpretar_comando retornou None", texto=texto)
+            # Retorna debug no response para o front mostrar
+            return {"sucesso": False, "erro": ERRO_NAO_ENTENDIDO, "debug": {"texto_recebido": texto}}
+        PADROES.inc(padrao=padrao or "desconhecido")
+        registrar_debug(log, "interpretar_comando sucesso", texto=texto, dados=resultado)
+        return {"sucesso": True, "dados": resultado}
+    except (ComandoMuitoLongo, TempoLimiteExcedido) as e:
+        anotar(sucesso=False, motivo=type(e).__name__)
+        COMANDOS.inc(resultado="excecao")
+        log.warning("limite do interpretador atingido", extra={"campos": {"erro": str(e)}})
+        return {"sucesso": False, "erro": str(e), "debug": {"texto_recebido": texto[:interpretador.max_caracteres]}}
+    except Exception as e:
+        anotar(sucesso=False, motivo="excecao")
+        COMANDOS.inc(resultado="excecao")
+        log.exception("erro ao interpretar comando")
+        return {"sucesso": False, "erro": str(e), "debug": {"texto_recebido": texto}}
+
+
+def dados_do_modelo(saida: Any) -> Optional[Dict[str, Any]]:
+    # aceita a saída do MiniLLM só se tiver o mesmo formato do resultado do interpretador: campos
+    # preenchidos, `inicio` (e `fim`, se vier) em "aaaa-mm-ddThh:mm" possível e fim depois do início.
+    # A gramática do decodificador garante JSON, não valores ("inicio": "" é um JSON válido)
+    if not isinstance(saida, dict) or not all(isinstance(saida.get(c), str) and saida[c].strip()
+                                              for c in CAMPOS_MODELO):
+        return None
+    if not datas.iso_valido(saida["inicio"]):
+        return None
+    if saida.get("fim") is not None and not (datas.iso_valido(saida["fim"]) and saida["fim"] > saida["inicio"]):
+        return None
+    return {c: saida[c] for c in CAMPOS_MODELO + ("fim",) if c in saida}
+
+
+def _interpretar_pedaco(textos: List[str], hoje: date) -> List[Dict[str, Any]]:
+    # roda na thread principal do processo filho, então o tempo limite via SIGALRM vale aqui
+    global _interpretador, _cache
+    if _interpretador is None:
+        configurar_logging()
+        _interpretador = InterpretadorComandos()
+        _cache = CacheComandos()
+    return [responder_comando(_interpretador, t, _cache, hoje) for t in textos]
+
+
+class ProcessadorLote:
+    """Pool de processos (um por núcleo, por padrão) que interpreta pedaços de um lote.
+
+    O pool é criado sob demanda com o método "spawn", para não herdar threads e estado
+    do processo do uvicorn. No máximo `2 * processos` pedaços ficam em voo ao mesmo tempo,
+    o que limita a memória dos resultados pendentes em lotes grandes.
+    """
+
+    def __init__(self, processos: Optional[int] = None, tamanho_pedaco: int = TAMANHO_PEDACO):
+        self.processos = processos or os.cpu_count() or 1
+        self.tamanho_pedaco = tamanho_pedaco
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processos,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def processar(self, textos: List[str], tamanho_pedaco: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        # gera os resultados na ordem de entrada, com o índice de cada item; o lote inteiro usa o
+        # mesmo dia de referência, mesmo que termine depois da meia-noite
+        hoje = datas.hoje()
+        tamanho = max(1, tamanho_pedaco or self.tamanho_pedaco)
+        pedacos = [textos[i:i + tamanho] for i in range(0, len(textos), tamanho)]
+        loop = asyncio.get_running_loop()
+        pool = self._obter_pool()
+        em_voo = []
+        proximo = 0
+        indice = 0
+        try:
+            while proximo < len(pedacos) or em_voo:
+                while proximo < len(pedacos) and len(em_voo) < 2 * self.processos:
+                    em_voo.append(loop.run_in_executor(pool, _interpretar_pedaco, pedacos[proximo], hoje))
+                    proximo += 1
+                for resposta in await em_voo.pop(0):
+                    yield {"indice": indice, **resposta}
+                    indice += 1
+        finally:
+            for futuro in em_voo:
+                futuro.cancel()
+
+    def encerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -1,13 +1,115 @@
 # main.py
-from fastapi import FastAPI
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+import anyio.from_thread
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-import re
-import json
-from datetime import datetime
+from typing import Optional, Dict, Any, List, Literal, Union
+from agenda import IndiceAgenda
+from cache_comandos import CacheComandos
+import datas
+from indice_nomes import CatalogoNomes
+from interpretador import InterpretadorComandos
+from interpretador_isolado import InterpretadorIsolado
+from lote import ERRO_NAO_ENTENDIDO, ProcessadorLote, dados_do_modelo, responder_comando
+from metricas import (LATENCIA_AGENDA, LATENCIA_MODELO, LATENCIA_NOMES, MODELO, PADROES, TIPO_CONTEUDO,
+                      MiddlewareMetricas, configurar_metricas, exposicao)
+from microlote import AgendadorMicroLote
+from registro import MiddlewareRequisicao, anotar, configurar_logging, obter_logger, registrar_debug
+
+configurar_logging()
+# pasta das métricas compartilhada com os processos do pool de lote (ver metricas.py)
+configurar_metricas()
+log = obter_logger("api")
+
+# parser compilado uma única vez. O /comando roda no threadpool, onde o SIGALRM não interrompe um
+# regex lento; por isso a cascata roda num processo filho (ver interpretador_isolado.py), que
+# respeita o tempo limite. COMANDO_ISOLADO=0 interpreta na própria thread (tempo limite só entre
+# as etapas da cascata)
+if os.environ.get("COMANDO_ISOLADO", "1") != "0":
+    interpretador: Union[InterpretadorComandos, InterpretadorIsolado] = InterpretadorIsolado()
+else:
+    interpretador = InterpretadorComandos()
+# resultados recentes do /comando, chaveados pelo texto normalizado
+cache_comandos = CacheComandos()
+# pool de processos do /comandos/lote (criado no primeiro lote)
+processador_lote = ProcessadorLote()
+# MiniLLM como fallback do /comando quando nenhum padrão casa. Desligado por padrão: liga com
+# MODELO_FALLBACK=1 só com um checkpoint aprovado na checagem de aceite
+# (python eval_metrics.py --pesos ... --gramatica --aceite-minimo 0.9); as saídas do mini_llm.pth
+# versionado vêm com "inicio" vazio e seriam um forward desperdiçado por comando.
+# Requisições concorrentes são agrupadas num único forward [B, 128]:
+#   MODELO_LOTE_MAX        tamanho máximo do micro-lote (padrão 16)
+#   MODELO_ESPERA_MAX_MS   espera máxima por mais requisições antes de rodar o lote (padrão 0)
+#   MODELO_AQUECER         1 (padrão): carrega numa thread no startup e o /pronto responde 503 até
+#                          terminar; 0: carrega no primeiro fallback. Se a carga falhar, o fallback
+#                          é desligado e o /pronto responde 200 com modelo "falhou" (só regex)
+# O import do app não carrega o torch nem os pesos (ver infer.carregar); para dividir o modelo
+# entre workers copy-on-write, suba com servidor.py, que carrega antes do fork.
+agendador_modelo: Optional[AgendadorMicroLote] = None
+estado_modelo: Dict[str, Any] = {"pronto": False, "segundos": None, "erro": None}
+
+def gerar_json_lote(comandos: List[str]) -> List[Dict[str, Any]]:
+    # infer (e com ele o torch) só é importado aqui, na thread do micro-lote ou do aquecimento
+    from infer import gerar_json_lote as gerar
+    return gerar(comandos)
+
+def aquecer_modelo():
+    inicio = time.perf_counter()
+    try:
+        import infer
+        infer.carregar()
+    except Exception as e:
+        # com o erro anotado o /comando não tenta mais o fallback: o worker atende só pelo regex
+        # em vez de ficar fora do balanceador
+        estado_modelo["erro"] = str(e)
+        log.exception("falha ao carregar o MiniLLM; fallback desligado")
+        return
+    estado_modelo.update(pronto=True, segundos=round(time.perf_counter() - inicio, 3))
+    log.info("MiniLLM pronto", extra={"campos": {"segundos": estado_modelo["segundos"]}})
+
+if os.environ.get("MODELO_FALLBACK", "0") != "0":
+    agendador_modelo = AgendadorMicroLote(
+        gerar_json_lote,
+        tamanho_max=int(os.environ.get("MODELO_LOTE_MAX", 16)),
+        espera_max=float(os.environ.get("MODELO_ESPERA_MAX_MS", 0)) / 1000,
+    )
+# índice aproximado de pacientes e médicos: o /comando devolve os IDs candidatos junto com os dados.
+#   NOMES_SNAPSHOT   JSON com {"pacientes": [{"id", "nome"}], "medicos": [...]}
+#   NOMES_DELTAS     log JSONL de upserts/remoções, relido por todos os workers (ver indice_nomes.py)
+catalogo_nomes: Optional[CatalogoNomes] = None
+if os.environ.get("NOMES_SNAPSHOT") or os.environ.get("NOMES_DELTAS"):
+    catalogo_nomes = CatalogoNomes.de_arquivos(os.environ.get("NOMES_SNAPSHOT"), os.environ.get("NOMES_DELTAS"))
+# agenda por médico e paciente: o /comando aponta conflitos de horário e sugere horários livres.
+#   AGENDA_SNAPSHOT  JSON com {"atividades": [{"id", "inicio", "fim", "medicoIds", "pacienteId"}]}
+#   AGENDA_DELTAS    log JSONL de upserts/remoções de atividades (ver agenda.py)
+#   AGENDA_SCORE_MINIMO  similaridade mínima do candidato de nome para o /comando consultar a agenda
+agenda: Optional[IndiceAgenda] = None
+if os.environ.get("AGENDA_SNAPSHOT") or os.environ.get("AGENDA_DELTAS"):
+    agenda = IndiceAgenda.de_arquivos(os.environ.get("AGENDA_SNAPSHOT"), os.environ.get("AGENDA_DELTAS"))
+AGENDA_SCORE_MINIMO = float(os.environ.get("AGENDA_SCORE_MINIMO", 0.85))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if isinstance(interpretador, InterpretadorIsolado):
+        # cria o processo do interpretador antes da primeira requisição
+        interpretador.iniciar()
+    if agendador_modelo is not None and os.environ.get("MODELO_AQUECER", "1") != "0":
+        threading.Thread(target=aquecer_modelo, name="aquecimento", daemon=True).start()
+    yield
+    processador_lote.encerrar()
+    if isinstance(interpretador, InterpretadorIsolado):
+        interpretador.encerrar()
+    if agendador_modelo is not None:
+        agendador_modelo.encerrar()
 
-app = FastAPI(title="Mini LLM - OrganizaMed", version="1.1")
+app = FastAPI(title="Mini LLM - OrganizaMed", version="1.1", lifespan=lifespan)
 # fazer ajuste e limpeza de código (obs: o código está limpando as entradas, realizar treinamento para
 # a ML/IA compreender as entradas sem necessitar de limpeza adicional de código)
 
@@ -19,310 +121,233 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# id de requisição + linha de log JSON com latência, padrão e uso do cache
+app.add_middleware(MiddlewareRequisicao)
+# contagem e latência por rota para o /metrics
+app.add_middleware(MiddlewareMetricas)
 
 class ComandoInput(BaseModel):
     mensagem: Optional[str] = None
     comando: Optional[str] = None
 
-MONTHS = {
-    "janeiro": 1, "fevereiro": 2, "março": 3, "marco": 3, "abril": 4,
-    "maio": 5, "junho": 6, "julho": 7, "agosto": 8, "setembro": 9,
-    "outubro": 10, "novembro": 11, "dezembro": 12
-}
+class DeltaNome(BaseModel):
+    tipo: Literal["paciente", "medico"]
+    op: Literal["upsert", "remover"] = "upsert"
+    id: Union[int, str]
+    nome: Optional[str] = None
 
-def parse_date_parts(day_s: str, month_s: str, year_s: Optional[str]) -> Optional[str]:
-    try:
-        day = int(day_s)
-        # mês pode ser palavra ou numero
-        month = None
-        if month_s.isdigit():
-            month = int(month_s)
-        else:
-            ms = month_s.lower()
-            month = MONTHS.get(ms)
-            if month is None:
-                # tenta abreviação de 3 letras (jan, fev, mar, ...)
-                ms3 = ms[:3]
-                abbr_map = {
-                    "jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
-                    "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12
-                }
-                month = abbr_map.get(ms3)
-        if month is None:
-            return None
-        # anos com 2 ou 4 digitos
-        if year_s:
-            year = int(year_s)
-            if year < 100:  # 2- digitos do ano -> assume 2000+
-                year += 2000
-        else:
-            # sem ano = ano atual
-            year = datetime.now().year
-        return f"{year:04d}-{month:02d}-{day:02d}"
-    except Exception:
-        return None
+class VerificacaoAgenda(BaseModel):
+    inicio: str
+    fim: Optional[str] = None
+    medicoIds: List[Union[int, str]] = []
+    pacienteId: Optional[Union[int, str]] = None
+    # atividade sendo remarcada: não conflita consigo mesma
+    ignorarId: Optional[Union[int, str]] = None
+    sugestoes: int = 3
 
-def parse_time(t: str) -> Optional[str]:
-    # aceita 9, 9h, 09:00, 9:30, 09:30
-    t = t.strip().lower().replace('h', ':')
-    if re.match(r'^\d{1,2}:\d{2}$', t):
-        parts = t.split(':')
-        h = int(parts[0])
-        m = int(parts[1])
-        return f"{h:02d}:{m:02d}"
-    if re.match(r'^\d{1,2}$', t):
-        h = int(t)
-        return f"{h:02d}:00"
-    return None
+class DeltaAtividade(BaseModel):
+    op: Literal["upsert", "remover"] = "upsert"
+    id: Union[int, str]
+    inicio: Optional[str] = None
+    fim: Optional[str] = None
+    medicoIds: Optional[List[Union[int, str]]] = None
+    pacienteId: Optional[Union[int, str]] = None
 
 def interpretar_comando(texto: str) -> Optional[Dict[str, Any]]:
-
     # Tenta extrair: tipoAtividade, pacienteNome, medicoNome, inicio (ISO), fim (ISO opcional)
     # Retorna dict ou None se não conseguiu.
+    return interpretador.interpretar(texto)
 
-    if not texto:
-        return None
+def com_candidatos(resposta: Dict[str, Any]) -> Dict[str, Any]:
+    # IDs candidatos de paciente e médico para o front não precisar buscar na API .NET
+    if catalogo_nomes is None or not resposta.get("sucesso"):
+        return resposta
+    inicio = time.perf_counter()
+    catalogo_nomes.atualizar()
+    candidatos = catalogo_nomes.resolver(resposta["dados"])
+    LATENCIA_NOMES.observar(time.perf_counter() - inicio)
+    # a resposta pode vir do cache de comandos: monta outro dict em vez de alterar
+    return {**resposta, "candidatos": candidatos}
 
-    texto_original = texto.strip()
-    texto_lower = texto_original.lower()
-
-    print("interpretar_comando - texto original:", repr(texto_original))
-
-    def clean_person_name(s: str) -> str:
-        if not s:
-            return s
-        s = s.strip()
-
-        # padrões de prefixos a remover (case-insensitive)
-        prefixes = [
-            r'^(?:marcar|marque|agendar|agende)\s+consulta\s+para\s+o\s+paciente\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+consulta\s+para\s+o\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+consulta\s+para\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+consulta\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+para\s+o\s+paciente\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+para\s+o\s+',
-            r'^(?:marcar|marque|agendar|agende)\s+para\s+',
-            r'^consulta\s+para\s+o\s+paciente\s+',
-            r'^consulta\s+para\s+o\s+',
-            r'^consulta\s+para\s+',
-            r'^para\s+o\s+paciente\s+',
-            r'^para\s+o\s+',
-            r'^para\s+',
-            r'^paciente\s+',
-            r'^\bcom\b\s+',
-            r'^\bo\b\s+',
-            r'^\ba\b\s+'
-        ]
-        
-        #ajuste temporário para limpeza de comando
-
-        for p in prefixes:
-            s = re.sub(p, '', s, flags=re.IGNORECASE).strip()
-
-        # remover títulos redundantes no início (ex: "dr.", "dra.", "sr.", "sra.")
-        s = re.sub(r'^(dr\.?|dra\.?|sr\.?|sra\.?)\s+', '', s, flags=re.IGNORECASE)
-
-        # colapsar espaços múltiplos e normalizar
-        s = re.sub(r'\s+', ' ', s).strip()
-
-        # Title case (mantém acentos)
-        return s.title()
-
-    # --- pattern_para_com (executa cedo, usando texto_lower para casar) ---
-    pattern_para_com = re.compile(
-        r"(?:marcar|marque|agendar|agende|marcar uma|marque uma|agendar uma).*?"
-        r"(?:para\s+)?([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+com\s+([A-Za-zÀ-ÿ0-9\.\s]{2,60}?)\s+"
-        r"(?:no dia|no|no\s+dia|em|para o dia|para)\s+(\d{1,2})\s*(?:de\s+)?([A-Za-zÀ-ÿ]+|\d{1,2})\s*(?:de\s+)?(\d{2,4})?.*?"
-        r"(?:das|de|às|as|a)?\s*(\d{1,2}(?::\d{2})?)\s*(?:às|a|até|ate|-)\s*(\d{1,2}(?::\d{2})?)",
-        re.IGNORECASE
-    )
-    mpc = pattern_para_com.search(texto_lower)
-    if mpc:
-        print("DEBUG: pattern_para_com casou. grupos:", mpc.groups())
-        paciente_raw = mpc.group(1).strip()
-        medico_raw = mpc.group(2).strip()
-        dia_s = mpc.group(3)
-        mes_s = mpc.group(4)
-        ano_s = mpc.group(5)
-        inicio_s = mpc.group(6)
-        fim_s = mpc.group(7)
-
-        date_prefix = parse_date_parts(dia_s, mes_s, ano_s)
-        if not date_prefix:
-            print("DEBUG: parse_date_parts falhou para:", dia_s, mes_s, ano_s)
-            return None
-        inicio_time = parse_time(inicio_s)
-        fim_time = parse_time(fim_s)
-        if not inicio_time:
-            print("DEBUG: parse_time falhou para inicio:", inicio_s)
-            return None
-
-        resultado = {
-            "tipoAtividade": "Consulta",
-            "pacienteNome": clean_person_name(paciente_raw),
-            "medicoNome": clean_person_name(medico_raw),
-            "inicio": f"{date_prefix}T{inicio_time}"
-        }
-        if fim_time:
-            resultado["fim"] = f"{date_prefix}T{fim_time}"
-        return resultado
-
-    # 1) Tentar padrões com mês por extenso: "12 de novembro de 2025 das 10:30 às 11:30"
-    pattern1 = re.compile(
-        r"(consulta|cirurgia|retorno|teleconsulta|exame|consulta online|agendar|marcar).*?"
-        r"(paciente|entre o paciente)\s+([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:e\s+o\s+medico|e\s+o\s+médico|e\s+o\s+dr\.?|e\s+o\s+dra\.?|e\s+o\s+dr|e\s+o\s+drs|e\s+o)\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+"
-        r"(?:para o dia|no dia|em|para|dia)\s+(\d{1,2})\s*(?:de\s+)?([A-Za-zÀ-ÿ]+|\d{1,2})\s*(?:de\s+)?(\d{2,4})?"
-        r".*?(?:das|de|às|as|a)?\s*(\d{1,2}(?::\d{2})?)\s*(?:às|a|até|ate|-)\s*(\d{1,2}(?::\d{2})?)",
-        re.IGNORECASE
-    )
-    m = pattern1.search(texto_lower)
-    if m:
-        print("DEBUG: pattern1 casou. grupos:", m.groups())
-        tipo_raw = m.group(1)
-        paciente_raw = m.group(3).strip()
-        medico_raw = m.group(4).strip()
-        dia_s = m.group(5)
-        mes_s = m.group(6)
-        ano_s = m.group(7)
-        inicio_s = m.group(8)
-        fim_s = m.group(9)
-
-        date_prefix = parse_date_parts(dia_s, mes_s, ano_s)
-        if not date_prefix:
-            print("DEBUG: parse_date_parts falhou no pattern1")
-            return None
-        inicio_time = parse_time(inicio_s)
-        fim_time = parse_time(fim_s)
-        if not inicio_time:
-            print("DEBUG: parse_time falhou no pattern1")
-            return None
-
-        resultado = {
-            "tipoAtividade": "Consulta" if "consulta" in tipo_raw.lower() else tipo_raw.capitalize(),
-            "pacienteNome": clean_person_name(paciente_raw),
-            "medicoNome": clean_person_name(medico_raw),
-            "inicio": f"{date_prefix}T{inicio_time}"
-        }
-        if fim_time:
-            resultado["fim"] = f"{date_prefix}T{fim_time}"
-        return resultado
-
-    # 2) Padrões com formato dd/mm/yyyy ou dd/mm
-    pattern2 = re.compile(
-        r"(consulta|cirurgia|retorno|teleconsulta|exame).*?"
-        r"(?:paciente|entre o paciente)?\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:com|e|e o médico|com o médico|com a médica)\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+"
-        r"(?:no dia|em|para|dia)?\s*(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?.*?(?:às|as|a|das)?\s*(\d{1,2}:\d{2})\s*(?:até|ate|às|a|-)\s*(\d{1,2}:\d{2})",
-        re.IGNORECASE
-    )
-    m2 = pattern2.search(texto_lower)
-    if m2:
-        print("DEBUG: pattern2 casou. grupos:", m2.groups())
-        tipo_raw = m2.group(1)
-        paciente_raw = m2.group(2).strip()
-        medico_raw = m2.group(3).strip()
-        dia_s = m2.group(4)
-        mes_s = m2.group(5)
-        ano_s = m2.group(6)
-        inicio_s = m2.group(7)
-        fim_s = m2.group(8)
-
-        date_prefix = parse_date_parts(dia_s, mes_s, ano_s)
-        if not date_prefix:
-            return None
-        inicio_time = parse_time(inicio_s)
-        fim_time = parse_time(fim_s)
-        if not inicio_time:
-            return None
-        resultado = {
-            "tipoAtividade": "Consulta" if "consulta" in tipo_raw.lower() else tipo_raw.capitalize(),
-            "pacienteNome": clean_person_name(paciente_raw),
-            "medicoNome": clean_person_name(medico_raw),
-            "inicio": f"{date_prefix}T{inicio_time}"
-        }
-        if fim_time:
-            resultado["fim"] = f"{date_prefix}T{fim_time}"
-        return resultado
-
-    # 3) Padrão simples "marque uma consulta ... dia dd/mm/yyyy as hh:mm até hh:mm"
-    pattern3 = re.compile(
-        r"(consulta|cirurgia|retorno|teleconsulta|exame).*?(?:paciente)?\s*([A-Za-zÀ-ÿ0-9\.\s]+?)\s+(?:com|e|com o médico|com a médica)\s*([A-Za-zÀ-ÿ0-9\.\s]+?).*?(\d{1,2})[\/\-](\d{1,2})[\/\-]?(\d{2,4})?.*?(\d{1,2}:\d{2}).*?(?:até|a)\s*(\d{1,2}:\d{2})",
-        re.IGNORECASE
-    )
-    m3 = pattern3.search(texto_lower)
-    if m3:
-        print("DEBUG: pattern3 casou. grupos:", m3.groups())
-        tipo_raw = m3.group(1)
-        paciente_raw = m3.group(2).strip()
-        medico_raw = m3.group(3).strip()
-        dia_s = m3.group(4)
-        mes_s = m3.group(5)
-        ano_s = m3.group(6)
-        inicio_s = m3.group(7)
-        fim_s = m3.group(8)
-        date_prefix = parse_date_parts(dia_s, mes_s, ano_s)
-        if not date_prefix:
-            return None
-        inicio_time = parse_time(inicio_s)
-        fim_time = parse_time(fim_s)
-        if not inicio_time:
-            return None
-        resultado = {
-            "tipoAtividade": "Consulta" if "consulta" in tipo_raw.lower() else tipo_raw.capitalize(),
-            "pacienteNome": clean_person_name(paciente_raw),
-            "medicoNome": clean_person_name(medico_raw),
-            "inicio": f"{date_prefix}T{inicio_time}"
-        }
-        if fim_time:
-            resultado["fim"] = f"{date_prefix}T{fim_time}"
-        return resultado
-
-    # 4) fallback heurístico (mantive seu fallback original)
-    paciente_m = re.search(r"paciente\s+([A-Za-zÀ-ÿ0-9\.\s]+?)(?:\s+com|\s+e|,|\.|$)", texto_lower)
-    medico_m = re.search(r"(?:m[eé]dico|dr\.|dra\.|médico|médica)\s+([A-Za-zÀ-ÿ0-9\.\s]+?)(?:\s+dia|\s+para|\s+no|\s+às|,|$)", texto_lower)
-    time_m = re.search(r"(\d{1,2}:\d{2})", texto_lower)
-    date_m = re.search(r"(\d{1,2})[\/\-](\d{1,2})(?:[\/\-](\d{2,4}))?", texto_lower)
-    if paciente_m and medico_m and time_m and date_m:
-        paciente_raw = paciente_m.group(1).strip()
-        medico_raw = medico_m.group(1).strip()
-        dia_s = date_m.group(1)
-        mes_s = date_m.group(2)
-        ano_s = date_m.group(3)
-        inicio_s = time_m.group(1)
-        date_prefix = parse_date_parts(dia_s, mes_s, ano_s)
-        if not date_prefix:
-            return None
-        resultado = {
-            "tipoAtividade": "Consulta",
-            "pacienteNome": clean_person_name(paciente_raw),
-            "medicoNome": clean_person_name(medico_raw),
-            "inicio": f"{date_prefix}T{parse_time(inicio_s)}"
-        }
-        return resultado
-
-    print("DEBUG: nenhum pattern casou para:", repr(texto_original))
-    return None
+def _candidato_unico(candidatos: List[Dict[str, Any]]):
+    # id do melhor candidato se ele for confiável e não empatar com o segundo (homônimos)
+    if not candidatos or candidatos[0]["score"] < AGENDA_SCORE_MINIMO:
+        return None
+    if len(candidatos) > 1 and candidatos[1]["score"] >= candidatos[0]["score"]:
+        return None
+    return candidatos[0]["id"]
 
+def com_agenda(resposta: Dict[str, Any]) -> Dict[str, Any]:
+    # conflitos do horário pedido com a agenda do médico e do paciente resolvidos pelo índice de nomes
+    if agenda is None or "candidatos" not in resposta:
+        return resposta
+    medico = _candidato_unico(resposta["candidatos"]["medico"])
+    paciente = _candidato_unico(resposta["candidatos"]["paciente"])
+    dados = resposta["dados"]
+    if (medico is None and paciente is None) or not dados.get("inicio"):
+        return resposta
+    inicio = time.perf_counter()
+    agenda.atualizar()
+    try:
+        verificacao = agenda.verificar([medico] if medico is not None else [],
+                                       [paciente] if paciente is not None else [],
+                                       dados["inicio"], dados.get("fim"))
+    except ValueError:
+        # horário que o interpretador devolveu mas não é uma data válida: sem verificação
+        return resposta
+    finally:
+        LATENCIA_AGENDA.observar(time.perf_counter() - inicio)
+    return {**resposta, "agenda": {"medicoId": medico, "pacienteId": paciente, **verificacao}}
 
 @app.post("/comando")
 def processar_comando(body: ComandoInput):
     texto = (body.mensagem or body.comando or "").strip()
-    print("=== /comando recebido ===")
-    print("raw body:", body)
-    print("texto extraido:", repr(texto))
-    if not texto:
-        print("DEBUG: texto vazio")
-        return {"sucesso": False, "erro": "Comando vazio. Envie 'mensagem' ou 'comando' no body."}
+    registrar_debug(log, "/comando recebido", texto=texto)
+    # roda no threadpool, não no event loop: um regex lento não segura as outras requisições
+    # (/pronto, /metrics); o tempo limite vale no processo do interpretador (ver interpretador_isolado.py)
+    resposta = responder_comando(interpretador, texto, cache_comandos)
+    if agendador_modelo is not None and estado_modelo["erro"] is None and resposta.get("erro") == ERRO_NAO_ENTENDIDO:
+        # nenhum padrão casou: tenta o MiniLLM; o micro-lote vive no event loop, então a
+        # submissão volta para ele e esta thread espera o resultado. Pesos ou variante inválidos
+        # (MODELO_PESOS, MODELO_VARIANTE) não derrubam a requisição: fica a resposta do regex
+        inicio = time.perf_counter()
+        try:
+            dados = dados_do_modelo(anyio.from_thread.run(agendador_modelo.submeter, texto))
+        except Exception:
+            log.exception("erro no fallback do MiniLLM")
+            MODELO.inc(resultado="erro")
+            anotar(modelo=False, motivo_modelo="excecao")
+            dados = None
+        else:
+            MODELO.inc(resultado="aceito" if dados is not None else "rejeitado")
+            anotar(modelo=dados is not None)
+        LATENCIA_MODELO.observar(time.perf_counter() - inicio)
+        if dados is not None:
+            PADROES.inc(padrao="modelo")
+            anotar(padrao="modelo", sucesso=True)
+            resposta = {"sucesso": True, "dados": dados}
+    return com_agenda(com_candidatos(resposta))
+
+@app.post("/comandos/lote")
+async def processar_lote(comandos: List[ComandoInput], stream: bool = False, tamanho_pedaco: Optional[int] = None):
+    # interpreta vários comandos num pool de processos; resultados na ordem de entrada.
+    # stream=true devolve NDJSON (uma linha por item) à medida que os pedaços ficam prontos.
+    textos = [(c.mensagem or c.comando or "").strip() for c in comandos]
+    anotar(total=len(textos), stream=stream)
+    resultados = processador_lote.processar(textos, tamanho_pedaco)
+    if stream:
+        async def linhas():
+            async for item in resultados:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        return StreamingResponse(linhas(), media_type="application/x-ndjson")
+    return {"total": len(textos), "resultados": [item async for item in resultados]}
+
+@app.post("/datas/normalizar")
+def normalizar_datas(textos: List[str], hoje: Optional[date] = None):
+    # datas e horas em texto livre ("10/11/2025 14h", "amanhã às 9") -> ISO, para importação em massa;
+    # None nos itens sem data ou com data impossível. `hoje` fixa a referência das datas relativas
+    return {"total": len(textos), "datas": datas.normalizar_lote(textos, hoje)}
+
+@app.get("/comando/padroes")
+def estatisticas_padroes():
+    # contadores por padrão da cascata: tentativas, acertos e descartes pelo pré-filtro
+    return interpretador.estatisticas()
+
+@app.get("/comando/cache")
+def estatisticas_cache():
+    # acertos, falhas, despejos (LRU), expirados (TTL) e tamanho atual do cache
+    return cache_comandos.estatisticas()
+
+@app.delete("/comando/cache")
+def limpar_cache():
+    cache_comandos.limpar()
+    return cache_comandos.estatisticas()
+
+@app.get("/comando/modelo")
+def estatisticas_modelo():
+    # micro-lotes do fallback: quantidade, itens e tamanho médio/maior lote
+    if agendador_modelo is None or estado_modelo["erro"] is not None:
+        return {"habilitado": False, "erro": estado_modelo["erro"]}
+    return {"habilitado": True, **agendador_modelo.estatisticas()}
+
+@app.get("/pronto")
+def pronto():
+    # readiness: 503 enquanto o MiniLLM carrega no startup; se a carga falhou, pronto só com o regex
+    corpo: Dict[str, Any] = {"pid": os.getpid()}
+    if estado_modelo["erro"] is not None:
+        corpo.update(estado_modelo, pronto=True, modelo="falhou")
+    elif agendador_modelo is None:
+        corpo.update(pronto=True, modelo="desabilitado")
+    elif os.environ.get("MODELO_AQUECER", "1") == "0" and not estado_modelo["pronto"]:
+        corpo.update(pronto=True, modelo="sob_demanda")
+    else:
+        corpo.update(estado_modelo, modelo="carregado" if estado_modelo["pronto"] else "carregando")
+    return JSONResponse(corpo, status_code=200 if corpo["pronto"] else 503)
+
+@app.get("/nomes")
+def estatisticas_nomes():
+    # registros e nomes distintos por índice, deltas aplicados
+    if catalogo_nomes is None:
+        return {"habilitado": False}
+    catalogo_nomes.atualizar()
+    return {"habilitado": True, **catalogo_nomes.estatisticas()}
+
+@app.get("/nomes/buscar")
+def buscar_nome(tipo: Literal["paciente", "medico"], nome: str, limite: int = 5):
+    if catalogo_nomes is None:
+        raise HTTPException(status_code=404, detail="Índice de nomes desabilitado (defina NOMES_SNAPSHOT).")
+    catalogo_nomes.atualizar()
+    return {"candidatos": catalogo_nomes.buscar(tipo, nome, limite)}
+
+@app.post("/nomes/deltas")
+def registrar_deltas(deltas: List[DeltaNome]):
+    # grava no log de deltas (lido pelos outros workers) e aplica neste processo
+    if catalogo_nomes is None:
+        raise HTTPException(status_code=404, detail="Índice de nomes desabilitado (defina NOMES_SNAPSHOT).")
+    for delta in deltas:
+        if delta.op == "upsert" and not delta.nome:
+            raise HTTPException(status_code=422, detail=f"upsert sem nome para o id {delta.id!r}")
+    # por delta: criado (id novo no índice) e o nome anterior do id
+    registros = catalogo_nomes.registrar([delta.model_dump(exclude_none=True) for delta in deltas])
+    return {"registros": registros, **catalogo_nomes.estatisticas()}
+
+@app.get("/agenda")
+def estatisticas_agenda():
+    # tamanho do índice da agenda e deltas aplicados neste worker
+    if agenda is None:
+        return {"habilitado": False}
+    agenda.atualizar()
+    return {"habilitado": True, **agenda.estatisticas()}
+
+@app.post("/agenda/verificar")
+def verificar_agenda(body: VerificacaoAgenda):
+    if agenda is None:
+        raise HTTPException(status_code=404, detail="Agenda desabilitada (defina AGENDA_SNAPSHOT).")
+    agenda.atualizar()
     try:
-        resultado = interpretar_comando(texto)
-        if not resultado:
-            print("DEBUG: interpretar_comando retornou None para:", repr(texto))
-            # Retorna debug no response para o front mostrar
-            return {"sucesso": False, "erro": "Não foi possível entender o comando.", "debug": {"texto_recebido": texto}}
-        print("DEBUG: interpretar_comando sucesso ->", resultado)
-        return {"sucesso": True, "dados": resultado}
-    except Exception as e:
-        import traceback; traceback.print_exc()
-        return {"sucesso": False, "erro": str(e), "debug": {"texto_recebido": texto}}
+        return agenda.verificar(body.medicoIds, [body.pacienteId] if body.pacienteId is not None else [],
+                                body.inicio, body.fim, ignorar=body.ignorarId, sugestoes=body.sugestoes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.post("/agenda/deltas")
+def registrar_deltas_agenda(deltas: List[DeltaAtividade]):
+    # upserts/remoções de atividades: gravados no log de AGENDA_DELTAS e aplicados por todos os workers
+    if agenda is None:
+        raise HTTPException(status_code=404, detail="Agenda desabilitada (defina AGENDA_SNAPSHOT).")
+    for delta in deltas:
+        if delta.op == "upsert" and not delta.inicio:
+            raise HTTPException(status_code=422, detail=f"upsert sem inicio para o id {delta.id!r}")
+    try:
+        agenda.registrar([delta.model_dump(exclude_none=True) for delta in deltas])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return agenda.estatisticas()
+
+@app.get("/metrics")
+def metricas():
+    # formato de exposição do Prometheus, somando todos os processos do serviço
+    return Response(exposicao(), media_type=TIPO_CONTEUDO)
 
 @app.get("/")
 def root():
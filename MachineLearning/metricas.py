@@ -0,0 +1,398 @@
+# metricas.py
+# Métricas no formato de exposição do Prometheus (texto), servidas em GET /metrics.
+#
+# Cada processo (workers do uvicorn, processos do pool do /comandos/lote) grava as próprias
+# séries num arquivo <pid>.bin mapeado em memória numa pasta compartilhada; o /metrics soma os
+# arquivos de todos. Só o dono escreve no seu arquivo, então não há lock entre processos: dentro
+# do processo, um incremento é uma soma num memoryview sob um threading.Lock sem disputa.
+# Configuração por variável de ambiente:
+#   METRICAS_DIR   pasta dos arquivos, a mesma para todos os workers; esvaziar a cada deploy. Sem
+#                  ela, o primeiro processo cria uma pasta temporária, herdada pelos processos que
+#                  ele iniciar (servidor.py cria antes do fork). Workers iniciados por spawn sem a
+#                  pasta (uvicorn --workers N) usam a do processo pai em /tmp,
+#                  organizamed-metricas-<pid do pai>-<início do pai>, que fica lá depois de parar.
+# Contadores de processos que já terminaram continuam somados; CPU e memória (lidas de
+# /proc/<pid> na hora da coleta) só aparecem para processos vivos. Cada arquivo guarda o início
+# do processo dono: um pid reaproveitado por outro processo não é confundido com o dono.
+import atexit
+import bisect
+import glob
+import mmap
+import multiprocessing
+import os
+import resource
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from registro import obter_logger
+
+log = obter_logger("metricas")
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+# limites dos histogramas de latência, em segundos
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# séries por processo e bytes da chave de cada uma (nome{rótulos}, utf-8)
+CAPACIDADE = 4096
+TAMANHO_CHAVE = 120
+
+_SERIES = struct.Struct("<Q")  # séries em uso
+_INICIO = struct.Struct("<Q")  # início do processo dono (tiques desde o boot, de /proc), 0 sem /proc
+TAMANHO_CABECALHO = _SERIES.size + _INICIO.size
+
+
+def inicio_processo(pid: int) -> int:
+    # campo starttime de /proc/<pid>/stat: junto com o pid identifica o processo; 0 se não houver
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return int(f.read().rsplit(b")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+# --- Arquivo do processo ---
+class _Arquivo:
+    # layout: [séries em uso: u64][início do dono: u64][valores: CAPACIDADE x f64][chaves: CAPACIDADE x TAMANHO_CHAVE]
+    # a chave é escrita antes de o contador de séries avançar, então quem lê nunca vê uma
+    # série pela metade
+    TAMANHO = TAMANHO_CABECALHO + CAPACIDADE * (8 + TAMANHO_CHAVE)
+
+    def __init__(self, caminho: Optional[str] = None):
+        if caminho is None:
+            self._mm = mmap.mmap(-1, self.TAMANHO)
+        else:
+            fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, self.TAMANHO)
+                self._mm = mmap.mmap(fd, self.TAMANHO)
+            finally:
+                os.close(fd)
+        _INICIO.pack_into(self._mm, _SERIES.size, inicio_processo(os.getpid()))
+        self.valores = memoryview(self._mm)[TAMANHO_CABECALHO:TAMANHO_CABECALHO + CAPACIDADE * 8].cast("d")
+        # arquivo de um processo anterior com o mesmo pid: as séries dele continuam valendo
+        self.indices = {chave: i for i, (chave, _) in enumerate(ler_series(self._mm))}
+        self._cheio = False
+
+    def indice(self, chave: str) -> Optional[int]:
+        # chamado com o lock do processo
+        i = self.indices.get(chave)
+        if i is not None:
+            return i
+        n = len(self.indices)
+        dados = chave.encode("utf-8")
+        if n >= CAPACIDADE or len(dados) > TAMANHO_CHAVE:
+            if not self._cheio:
+                self._cheio = True
+                log.warning("série de métrica descartada", extra={"campos": {"chave": chave[:TAMANHO_CHAVE]}})
+            return None
+        inicio = TAMANHO_CABECALHO + CAPACIDADE * 8 + n * TAMANHO_CHAVE
+        self._mm[inicio:inicio + TAMANHO_CHAVE] = dados.ljust(TAMANHO_CHAVE, b"\0")
+        _SERIES.pack_into(self._mm, 0, n + 1)
+        self.indices[chave] = n
+        return n
+
+
+def ler_series(dados) -> List[Tuple[str, float]]:
+    # (chave, valor) das séries de um arquivo (ou buffer) no layout de _Arquivo
+    n = min(_SERIES.unpack_from(dados, 0)[0], CAPACIDADE)
+    valores = struct.unpack_from(f"<{n}d", dados, TAMANHO_CABECALHO)
+    inicio = TAMANHO_CABECALHO + CAPACIDADE * 8
+    chaves = [bytes(dados[inicio + i * TAMANHO_CHAVE:inicio + (i + 1) * TAMANHO_CHAVE]).rstrip(b"\0").decode("utf-8")
+              for i in range(n)]
+    return list(zip(chaves, valores))
+
+
+_lock = threading.Lock()
+_arquivo: Optional[_Arquivo] = None
+_pasta_criada: Optional[str] = None
+
+
+def _reiniciar_no_filho():
+    # depois de um fork o filho escreve no próprio arquivo, não no do pai
+    global _lock, _arquivo
+    _lock = threading.Lock()
+    _arquivo = None
+
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def pasta_metricas() -> Optional[str]:
+    return os.environ.get("METRICAS_DIR") or None
+
+
+def configurar_metricas(pasta: Optional[str] = None):
+    """Define a pasta compartilhada (METRICAS_DIR) antes de iniciar workers (idempotente)."""
+    global _pasta_criada
+    if pasta:
+        os.environ["METRICAS_DIR"] = pasta
+    pai = multiprocessing.parent_process()
+    if pasta_metricas() is None and pai is not None:
+        # worker iniciado por spawn sem a pasta (uvicorn --workers N): cada um criaria a sua e o
+        # /metrics de cada worker veria só as próprias séries; os irmãos usam a do pai
+        os.environ["METRICAS_DIR"] = os.path.join(tempfile.gettempdir(),
+                                                  f"organizamed-metricas-{pai.pid}-{inicio_processo(pai.pid)}")
+    elif pasta_metricas() is None:
+        _pasta_criada = tempfile.mkdtemp(prefix="organizamed-metricas-")
+        os.environ["METRICAS_DIR"] = _pasta_criada
+        dono = os.getpid()
+        atexit.register(lambda: os.getpid() == dono and shutil.rmtree(_pasta_criada, ignore_errors=True))
+    os.makedirs(pasta_metricas(), exist_ok=True)
+
+
+def _arquivo_do_processo() -> _Arquivo:
+    # chamado com o lock do processo; sem METRICAS_DIR as séries ficam só na memória
+    global _arquivo
+    if _arquivo is None:
+        pasta = pasta_metricas()
+        _arquivo = _Arquivo(os.path.join(pasta, f"{os.getpid()}.bin") if pasta else None)
+    return _arquivo
+
+
+# --- Tipos ---
+def _rotulos(nomes: Iterable[str], valores: Iterable[str]) -> str:
+    pares = [f'{n}="{_escapar(str(v))}"' for n, v in zip(nomes, valores)]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor: float) -> str:
+    # contadores inteiros sem notação científica; o resto com precisão completa
+    if valor == float("inf"):
+        return "+Inf"
+    return str(int(valor)) if valor.is_integer() and abs(valor) < 2 ** 53 else repr(valor)
+
+
+_FAMILIAS: Dict[str, "_Metrica"] = {}
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        # índices das séries por valores dos rótulos (por processo, refeito após fork)
+        self._series: Dict[tuple, object] = {}
+        self._arquivo: Optional[_Arquivo] = None
+        _FAMILIAS[nome] = self
+
+    def _indices(self, valores: tuple):
+        # chamado com o lock do processo
+        arquivo = _arquivo_do_processo()
+        if arquivo is not self._arquivo:
+            self._arquivo, self._series = arquivo, {}
+        indices = self._series.get(valores)
+        if indices is None:
+            indices = self._series[valores] = self._criar(arquivo, valores)
+        return indices
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def _criar(self, arquivo, valores):
+        return arquivo.indice(self.nome + _rotulos(self.rotulos, valores))
+
+    def inc(self, valor: float = 1.0, **rotulos):
+        valores = tuple(rotulos[n] for n in self.rotulos)
+        with _lock:
+            i = self._indices(valores)
+            if i is not None:
+                self._arquivo.valores[i] += valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (), limites=LIMITES):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(limites)
+
+    def _criar(self, arquivo, valores):
+        # todos os baldes de uma vez, em ordem crescente de "le" (a ordem da exposição)
+        baldes = [arquivo.indice(f"{self.nome}_bucket" + _rotulos(self.rotulos + ("le",), valores + (_numero(le),)))
+                  for le in self.limites + (float("inf"),)]
+        soma = arquivo.indice(f"{self.nome}_sum" + _rotulos(self.rotulos, valores))
+        total = arquivo.indice(f"{self.nome}_count" + _rotulos(self.rotulos, valores))
+        return baldes, soma, total
+
+    def observar(self, valor: float, **rotulos):
+        valores = tuple(rotulos[n] for n in self.rotulos)
+        with _lock:
+            baldes, soma, total = self._indices(valores)
+            v = self._arquivo.valores
+            # baldes acumulados: cada observação conta em todos os limites >= valor
+            for i in baldes[bisect.bisect_left(self.limites, valor):]:
+                if i is not None:
+                    v[i] += 1
+            if soma is not None and total is not None:
+                v[soma] += valor
+                v[total] += 1
+
+    def cronometrar(self, **rotulos):
+        return _Cronometro(self, rotulos)
+
+
+class _Cronometro:
+    # with HISTOGRAMA.cronometrar(rotulo=...): observa a duração do bloco em segundos
+    def __init__(self, histograma: Histograma, rotulos):
+        self.histograma, self.rotulos = histograma, rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.rotulos)
+
+
+# --- Métricas do serviço ---
+REQUISICOES = Contador("organizamed_requisicoes_total", "Requisições HTTP por rota e status.", ("rota", "status"))
+LATENCIA_REQUISICAO = Histograma("organizamed_requisicao_segundos", "Latência total das requisições HTTP.",
+                                 ("rota",))
+COMANDOS = Contador("organizamed_comandos_total",
+                    "Comandos interpretados pela cascata de padrões, por resultado (sucesso, falha, excecao).",
+                    ("resultado",))
+PADROES = Contador("organizamed_padroes_total", "Padrão que interpretou o comando (modelo: fallback do MiniLLM).",
+                   ("padrao",))
+LATENCIA_INTERPRETACAO = Histograma("organizamed_interpretacao_segundos",
+                                    "Tempo da interpretação por regex (cache: resposta do cache de comandos).",
+                                    ("cache",))
+MODELO = Contador("organizamed_modelo_total", "Saídas do fallback do MiniLLM aceitas, rejeitadas ou com erro.",
+                  ("resultado",))
+LATENCIA_MODELO = Histograma("organizamed_modelo_segundos",
+                             "Tempo do fallback do MiniLLM por requisição (espera do micro-lote + forward).")
+LATENCIA_NOMES = Histograma("organizamed_nomes_segundos",
+                            "Tempo para resolver paciente e médico no índice de nomes (indice_nomes.py).")
+LATENCIA_AGENDA = Histograma("organizamed_agenda_segundos",
+                             "Tempo para verificar conflitos e sugerir horários na agenda (agenda.py).")
+
+
+# --- Exposição ---
+def _processos(donos: Dict[int, int]) -> List[str]:
+    # CPU e RSS de cada processo vivo, de /proc (ou só do processo atual, sem /proc). `donos` é
+    # pid -> início gravado no arquivo; com o pid reaproveitado por outro processo o início difere
+    linhas_cpu, linhas_rss = [], []
+    pagina, tique = os.sysconf("SC_PAGE_SIZE"), os.sysconf("SC_CLK_TCK")
+    for pid in sorted(set(donos) | {os.getpid()}):
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                campos = f.read().rsplit(b")", 1)[1].split()
+            if pid != os.getpid() and donos[pid] and int(campos[19]) != donos[pid]:
+                continue
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                rss = int(f.read().split()[1]) * pagina
+            cpu = (int(campos[11]) + int(campos[12])) / tique
+        except (OSError, IndexError, ValueError):
+            if pid != os.getpid():
+                continue
+            uso = resource.getrusage(resource.RUSAGE_SELF)
+            cpu, rss = uso.ru_utime + uso.ru_stime, uso.ru_maxrss * 1024
+        linhas_cpu.append(f'process_cpu_seconds_total{{pid="{pid}"}} {_numero(cpu)}')
+        linhas_rss.append(f'process_resident_memory_bytes{{pid="{pid}"}} {rss:d}')
+    return (["# HELP process_cpu_seconds_total Tempo de CPU (usuário + sistema) de cada processo.",
+             "# TYPE process_cpu_seconds_total counter"] + linhas_cpu
+            + ["# HELP process_resident_memory_bytes Memória residente de cada processo.",
+               "# TYPE process_resident_memory_bytes gauge"] + linhas_rss)
+
+
+def _familia(chave: str) -> str:
+    nome = chave.split("{", 1)[0]
+    for sufixo in ("_bucket", "_sum", "_count"):
+        if nome.endswith(sufixo) and nome[:-len(sufixo)] in _FAMILIAS:
+            return nome[:-len(sufixo)]
+    return nome
+
+
+def coletar() -> Dict[str, float]:
+    # soma das séries de todos os processos, na ordem em que aparecem
+    totais: Dict[str, float] = {}
+    pasta = pasta_metricas()
+    if pasta is None:
+        with _lock:
+            fontes = [ler_series(_arquivo_do_processo()._mm)]
+    else:
+        fontes = []
+        for caminho in sorted(glob.glob(os.path.join(pasta, "*.bin"))):
+            try:
+                with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    fontes.append(ler_series(mm))
+            except (OSError, ValueError):
+                continue
+    for series in fontes:
+        for chave, valor in series:
+            totais[chave] = totais.get(chave, 0.0) + valor
+    return totais
+
+
+def exposicao() -> str:
+    """Texto do /metrics: famílias registradas (somadas entre processos) + CPU e RSS por processo."""
+    por_familia: Dict[str, List[str]] = {nome: [] for nome in _FAMILIAS}
+    for chave, valor in coletar().items():
+        por_familia.setdefault(_familia(chave), []).append(f"{chave} {_numero(valor)}")
+    linhas = []
+    for nome, series in por_familia.items():
+        metrica = _FAMILIAS.get(nome)
+        if metrica is not None:
+            linhas += [f"# HELP {nome} {metrica.ajuda}", f"# TYPE {nome} {metrica.tipo}"]
+        linhas += series
+    pasta = pasta_metricas()
+    donos: Dict[int, int] = {}
+    if pasta is not None:
+        for caminho in glob.glob(os.path.join(pasta, "*.bin")):
+            nome = os.path.basename(caminho)[:-len(".bin")]
+            if not nome.isdigit():
+                continue
+            try:
+                with open(caminho, "rb") as f:
+                    donos[int(nome)] = _INICIO.unpack_from(f.read(TAMANHO_CABECALHO), _SERIES.size)[0]
+            except (OSError, struct.error):
+                continue
+    linhas += _processos(donos)
+    return "\n".join(linhas) + "\n"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: conta as requisições por rota e status e observa a latência total.
+
+    Caminhos que não são rotas da aplicação entram como rota="outra", para que URLs
+    arbitrárias não criem séries novas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._rotas = None
+
+    def _rota(self, scope) -> str:
+        if self._rotas is None:
+            app = scope.get("app")
+            self._rotas = {getattr(r, "path", None) for r in getattr(app, "routes", ())} - {None}
+        caminho = scope.get("path", "")
+        return caminho if caminho in self._rotas else "outra"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        status = {"codigo": 500}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status["codigo"] = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = self._rota(scope)
+            REQUISICOES.inc(rota=rota, status=str(status["codigo"]))
+            LATENCIA_REQUISICAO.observar(time.perf_counter() - inicio, rota=rota)
@@ -0,0 +1,112 @@
+# microlote.py
+# Agrupamento dinâmico (micro-lotes) de requisições concorrentes numa única chamada em lote.
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from registro import obter_logger
+
+log = obter_logger("microlote")
+
+TAMANHO_MAX = 16
+# segundos; com uma única thread de execução, o que chega durante um lote já forma o próximo,
+# então esperar só compensa quando o forward é barato perto do intervalo entre requisições
+ESPERA_MAX = 0.0
+
+
+class AgendadorMicroLote:
+    """Junta itens enviados por requisições concorrentes e os processa em lotes.
+
+    O primeiro item que chega abre um lote; o agendador espera até `espera_max` segundos
+    por mais itens, até `tamanho_max`. Enquanto um lote roda, os novos itens se acumulam
+    na fila e formam o próximo, então sob carga os lotes crescem sozinhos. A função
+    `processar_lote(itens) -> resultados` roda numa thread dedicada (fora do event loop),
+    um lote por vez, e deve devolver um resultado por item, na mesma ordem.
+    """
+
+    def __init__(self, processar_lote: Callable[[List[Any]], List[Any]],
+                 tamanho_max: int = TAMANHO_MAX, espera_max: float = ESPERA_MAX):
+        self.processar_lote = processar_lote
+        self.tamanho_max = max(1, tamanho_max)
+        self.espera_max = max(0.0, espera_max)
+        self._fila: Optional[asyncio.Queue] = None
+        self._tarefa: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.lotes = 0
+        self.itens = 0
+        self.maior_lote = 0
+
+    def _iniciar(self):
+        # criado sob demanda, já dentro do event loop que vai usá-lo
+        self._fila = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microlote")
+        self._tarefa = asyncio.get_running_loop().create_task(self._laco())
+
+    async def submeter(self, item: Any) -> Any:
+        if self._tarefa is None or self._tarefa.done():
+            self._iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        self._fila.put_nowait((item, futuro))
+        return await futuro
+
+    async def _coletar(self) -> list:
+        loop = asyncio.get_running_loop()
+        lote = [await self._fila.get()]
+        prazo = loop.time() + self.espera_max
+        while len(lote) < self.tamanho_max:
+            if not self._fila.empty():
+                lote.append(self._fila.get_nowait())
+                continue
+            restante = prazo - loop.time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._fila.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        # requisições canceladas (cliente desconectou) enquanto esperavam na fila
+        return [(item, futuro) for item, futuro in lote if not futuro.done()]
+
+    async def _laco(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = await self._coletar()
+            if not lote:
+                continue
+            itens = [item for item, _ in lote]
+            try:
+                resultados = await loop.run_in_executor(self._executor, self.processar_lote, itens)
+            except Exception as e:
+                log.exception("erro ao processar micro-lote")
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            with self._lock:
+                self.lotes += 1
+                self.itens += len(lote)
+                self.maior_lote = max(self.maior_lote, len(lote))
+            for (_, futuro), resultado in zip(lote, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    def encerrar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tamanho_max": self.tamanho_max,
+                "espera_max": self.espera_max,
+                "lotes": self.lotes,
+                "itens": self.itens,
+                "tamanho_medio": self.itens / self.lotes if self.lotes else 0.0,
+                "maior_lote": self.maior_lote,
+            }
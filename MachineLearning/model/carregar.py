@@ -0,0 +1,94 @@
+# model/carregar.py
+# Carrega o MiniLLM para inferência: pesos float32 (.pth) em modo eager ou um artefato gerado
+# por exportar.py. Toda variante devolve um módulo cujo forward(x [B, seq_len]) tem a
+# semântica de MiniLLM.forward_lote (cada comando independente dos outros do lote).
+#
+# Os pesos .pth são mapeados (torch.load com mmap) e viram os próprios parâmetros do módulo
+# (load_state_dict com assign): nada é copiado nem inicializado à toa, as páginas só são lidas
+# quando usadas e, como vêm do page cache, são as mesmas em todos os processos que carregam o
+# mesmo arquivo (workers do uvicorn, processos filhos do servidor.py).
+# Caminhos relativos a este diretório, não ao diretório de trabalho; MODELO_PESOS troca os pesos.
+# Os hiperparâmetros do MiniLLM (emb_size, n_heads, n_layers, seq_len) ficam num JSON ao lado dos
+# pesos (<pesos>.arquitetura.json, gravado pelo train.py); sem ele valem os padrões do MiniLLM.
+import json
+import os
+import warnings
+
+import torch
+import torch.nn as nn
+
+from model.model import MiniLLM, MiniLLMLote
+
+_PASTA = os.path.dirname(os.path.abspath(__file__))
+PESOS = os.environ.get("MODELO_PESOS") or os.path.join(_PASTA, "mini_llm.pth")
+PASTA_ARTEFATOS = os.path.join(_PASTA, "artefatos")
+
+# variante -> arquivo do artefato (None = pesos .pth em modo eager)
+VARIANTES = {
+    "fp32": None,
+    "fp32_script": "fp32_script.pt",
+    "fp32_export": "fp32_export.pt2",
+    "int8": None,
+    "int8_trace": "int8_trace.pt",
+}
+
+
+def caminho_artefato(variante: str) -> str:
+    return os.path.join(PASTA_ARTEFATOS, VARIANTES[variante])
+
+
+def ler_pesos(pesos: str = PESOS) -> dict:
+    # state_dict com os tensores mapeados do arquivo (somente leitura na prática: MAP_PRIVATE)
+    return torch.load(pesos, map_location="cpu", mmap=True, weights_only=True)
+
+
+def caminho_arquitetura(pesos: str = PESOS) -> str:
+    return os.path.splitext(pesos)[0] + ".arquitetura.json"
+
+
+def ler_arquitetura(pesos: str = PESOS) -> dict:
+    # argumentos do MiniLLM além do vocab_size ({} = padrões, para pesos sem o JSON)
+    caminho = caminho_arquitetura(pesos)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_arquitetura(pesos: str, arquitetura: dict):
+    with open(caminho_arquitetura(pesos), "w", encoding="utf-8") as f:
+        json.dump(arquitetura, f)
+
+
+def modelo_float(vocab_size: int, pesos: str = PESOS) -> MiniLLMLote:
+    # construído no device meta (sem alocar nem inicializar) e preenchido com os tensores mapeados
+    with torch.device("meta"):
+        modelo = MiniLLM(vocab_size, **ler_arquitetura(pesos))
+    modelo.load_state_dict(ler_pesos(pesos), assign=True)
+    return MiniLLMLote(modelo).eval()
+
+
+def quantizar_int8(modelo: nn.Module) -> nn.Module:
+    # quantização dinâmica int8 de todos os nn.Linear (FFN e a cabeça `output`); o out_proj da
+    # atenção é NonDynamicallyQuantizableLinear e fica em float por decisão do próprio PyTorch
+    from torch.ao.quantization import quantize_dynamic
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return quantize_dynamic(modelo, {nn.Linear}, dtype=torch.qint8)
+
+
+def carregar_modelo(variante: str, vocab_size: int, pesos: str = PESOS) -> nn.Module:
+    # `pesos` vale para fp32 e int8; os artefatos são os gerados por exportar.py a partir de PESOS
+    if variante not in VARIANTES:
+        raise ValueError(f"variante desconhecida: {variante!r} (opções: {', '.join(VARIANTES)})")
+    if variante == "fp32":
+        return modelo_float(vocab_size, pesos)
+    if variante == "int8":
+        # quantiza na carga, sem artefato
+        return quantizar_int8(modelo_float(vocab_size, pesos))
+    caminho = caminho_artefato(variante)
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"{caminho} não existe; gere com: python exportar.py --variantes {variante}")
+    if caminho.endswith(".pt2"):
+        return torch.export.load(caminho).module()
+    return torch.jit.load(caminho).eval()
@@ -1,6 +1,15 @@
 import torch
 import torch.nn as nn
 
+PAD = 0
+
+def mascara_padding(x):
+    # src_key_padding_mask para forward(): [L, B], True onde x[b, i] é padding. Colunas só de
+    # padding ficam sem máscara (atenção toda mascarada dá NaN; entre tokens idênticos o
+    # resultado é o mesmo com ou sem máscara)
+    mascara = (x == PAD).transpose(0, 1)
+    return mascara & ~mascara.all(dim=1, keepdim=True)
+
 class MiniLLM(nn.Module):
     def __init__(self, vocab_size, emb_size=64, n_heads=2, n_layers=2, seq_len=128):
         super().__init__()
@@ -11,8 +20,48 @@ class MiniLLM(nn.Module):
         self.transformer = nn.TransformerEncoder(encoder_layer, num_layers=n_layers)
         self.output = nn.Linear(emb_size, vocab_size)
 
-    def forward(self, x):
-        positions = torch.arange(self.seq_len, device=x.device).unsqueeze(0)
-        x = self.token_emb(x) + self.pos_emb(positions)
-        x = self.transformer(x)
+    def _embeddings(self, x, inicio: int = 0):
+        positions = torch.arange(inicio, inicio + x.shape[1], device=x.device).unsqueeze(0)
+        return self.token_emb(x) + self.pos_emb(positions)
+
+    def forward(self, x, src_key_padding_mask=None):
+        # x: [B, L] com L <= seq_len; devolve [B, L, vocab]. O encoder não usa batch_first:
+        # a atenção de cada posição roda entre os exemplos do lote, e src_key_padding_mask
+        # (ver mascara_padding) impede que tokens reais atendam ao padding dos outros exemplos.
+        x = self._embeddings(x)
+        x = self.transformer(x, src_key_padding_mask=src_key_padding_mask)
         return self.output(x)
+
+    def forward_lote(self, x):
+        # O encoder não usa batch_first, então em forward() a dimensão 0 é tratada como
+        # sequência e os exemplos de um mesmo lote [B, L] atendem uns aos outros.
+        # Aqui cada posição de cada exemplo vira um item independente ([1, B*L]),
+        # o que reproduz exatamente forward() chamado com B=1 para cada exemplo.
+        B, L = x.shape
+        h = self.transformer(self._embeddings(x).reshape(1, B * L, -1))
+        return self.output(h).reshape(B, L, -1)
+
+    def logits_padding(self, inicio: int):
+        # [1, seq_len - inicio, vocab]: saída de posições só de padding a partir de `inicio`.
+        # Com todos os exemplos em padding nessas posições, a saída é a mesma para todos
+        # (nos dois forwards) e basta calculá-la uma vez
+        pad = torch.full((1, self.seq_len - inicio), PAD, dtype=torch.long, device=self.pos_emb.weight.device)
+        return self.output(self.transformer(self._embeddings(pad, inicio)))
+
+    def forward_completo(self, x, src_key_padding_mask=None):
+        # forward() de x aparado (sem as colunas finais só de padding) completado até seq_len
+        logits = self.forward(x, src_key_padding_mask)
+        L = x.shape[1]
+        if L < self.seq_len:
+            logits = torch.cat([logits, self.logits_padding(L).expand(x.shape[0], -1, -1)], dim=1)
+        return logits
+
+
+class MiniLLMLote(nn.Module):
+    # forward() = MiniLLM.forward_lote, para exportar/traçar o caminho usado na inferência
+    def __init__(self, modelo: MiniLLM):
+        super().__init__()
+        self.modelo = modelo
+
+    def forward(self, x):
+        return self.modelo.forward_lote(x)
@@ -1,24 +1,121 @@
 import string
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+# Vocabulários versionados. Cada versão só acrescenta caracteres no fim da anterior, então os
+# ids antigos não mudam; a versão de um checkpoint é identificada pelo vocab_size (ver
+# CharTokenizer.do_checkpoint).
+#   1: letras sem acento, dígitos e símbolos do JSON (checkpoints antigos, vocab_size 74)
+#   2: + faixa acentuada do Latin-1 (À-ÿ, sem × e ÷), para "João", "médico" etc.
+_V1 = "".join(sorted(set(
+    string.ascii_letters +     # A-Z, a-z
+    string.digits +            # 0-9
+    " {}\":,-T/:.()\n"         # símbolos comuns do JSON e datas
+)))
+_ACENTOS_LATIN1 = "".join(chr(c) for c in range(0xC0, 0x100) if chr(c) not in "×÷")
+VOCABULARIOS: Dict[int, str] = {
+    1: _V1,
+    2: _V1 + _ACENTOS_LATIN1,
+}
+VERSAO_ATUAL = 2
+PAD = 0
+
 
 class CharTokenizer:
-    def __init__(self):
+    def __init__(self, versao: int = VERSAO_ATUAL):
         # Todos caracteres que aparecem nos comandos e no JSON
-        chars = (
-            string.ascii_letters +     # A-Z, a-z
-            string.digits +            # 0-9
-            " {}\":,-T/:.()\n"         # símbolos comuns do JSON e datas
-        )
-        # Remove duplicatas
-        chars = "".join(sorted(set(chars)))
+        chars = VOCABULARIOS[versao]
+        self.versao = versao
         self.vocab = {c:i for i,c in enumerate(chars)}
         self.inv_vocab = {i:c for c,i in self.vocab.items()}
         self.vocab_size = len(self.vocab)
+        # tabelas indexadas por code point (BMP inteiro): id do caractere ou -1 se fora do vocabulário
+        self._lut = np.full(0x10000, -1, dtype=np.int16)
+        self._lut[[ord(c) for c in chars]] = np.arange(len(chars), dtype=np.int16)
+        # id -> code point, com 0 (NUL) marcando ids inválidos, que o decode descarta
+        self._inv = np.array([ord(c) for c in chars] + [0] * (256 - len(chars)), dtype=np.uint32)
+        # mesmas tabelas para str.translate nos caminhos de um texto só: caractere -> chr(id)
+        # (None apaga) e chr(id) -> caractere
+        self._tabela_encode = [None] * 0x10000
+        for c, i in self.vocab.items():
+            self._tabela_encode[ord(c)] = chr(i)
+        self._tabela_decode = {i: c for i, c in self.inv_vocab.items()}
+        self._tabela_decode.update({i: None for i in range(len(chars), 256)})
+
+    def __getstate__(self):
+        # as tabelas são reconstruídas a partir da versão (workers iniciados com spawn)
+        return {"versao": self.versao}
+
+    def __setstate__(self, estado):
+        self.__init__(estado["versao"])
+
+    @property
+    def acentos(self) -> bool:
+        # o vocabulário tem letras acentuadas (a partir da versão 2)
+        return self.versao >= 2
+
+    @classmethod
+    def do_vocab_size(cls, vocab_size: int) -> "CharTokenizer":
+        for versao, chars in VOCABULARIOS.items():
+            if len(chars) == vocab_size:
+                return cls(versao)
+        raise ValueError(f"nenhum vocabulário com {vocab_size} caracteres (versões: {list(VOCABULARIOS)})")
+
+    @classmethod
+    def do_checkpoint(cls, caminho: str) -> "CharTokenizer":
+        # tokenizer da versão com que o checkpoint (state_dict do MiniLLM) foi treinado
+        state = torch.load(caminho, map_location="cpu", mmap=True, weights_only=True)
+        return cls.do_vocab_size(state["token_emb.weight"].shape[0])
 
     def encode(self, text, seq_len=None):
-        tokens = [self.vocab[c] for c in text if c in self.vocab]
+        # caracteres fora do vocabulário são descartados; os de fora do BMP sobram do translate
+        # (IndexError) e caem no encode latin-1
+        tokens = list(text.translate(self._tabela_encode).encode("latin-1", "ignore"))
         if seq_len:
             tokens = tokens + [0]*(seq_len - len(tokens)) if len(tokens)<seq_len else tokens[:seq_len]
         return tokens
 
     def decode(self, tokens):
-        return "".join([self.inv_vocab[t] for t in tokens if t in self.inv_vocab])
+        try:
+            return bytes(tokens).decode("latin-1").translate(self._tabela_decode)
+        except ValueError:
+            # ids fora de 0..255
+            return "".join([self.inv_vocab[t] for t in tokens if t in self.inv_vocab])
+
+    def encode_batch(self, textos: List[str], seq_len: Optional[int] = None) -> torch.Tensor:
+        """Codifica vários textos de uma vez num tensor [B, L] preenchido com PAD.
+
+        L é `seq_len` (trunca/preenche) ou, sem ele, o comprimento do texto mais longo.
+        Mesmos ids de encode(); a busca na tabela e a compactação são feitas uma vez
+        para o lote inteiro.
+        """
+        B = len(textos)
+        pontos = np.frombuffer("".join(textos).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        ids = self._lut[np.minimum(pontos, 0xFFFF)]
+        # U+FFFF não está no vocabulário, então os code points acima do BMP também caem em -1
+        segmento = np.repeat(np.arange(B), [len(t) for t in textos])
+        validos = ids >= 0
+        ids, segmento = ids[validos], segmento[validos]
+        contagens = np.bincount(segmento, minlength=B)
+        posicao = np.arange(len(ids)) - (np.cumsum(contagens) - contagens)[segmento]
+        largura = seq_len if seq_len else int(contagens.max(initial=0))
+        dentro = posicao < largura
+        saida = np.zeros((B, largura), dtype=np.int64)
+        saida[segmento[dentro], posicao[dentro]] = ids[dentro]
+        return torch.from_numpy(saida)
+
+    def decode_batch(self, tokens) -> List[str]:
+        # tokens: tensor/array [B, L] de ids; mesma saída de decode() linha a linha
+        ids = tokens.cpu().numpy() if isinstance(tokens, torch.Tensor) else np.asarray(tokens)
+        if ids.size == 0:
+            return [""] * len(ids)
+        pontos = self._inv[np.clip(ids, 0, 255)]
+        pontos[(ids < 0) | (ids > 255)] = 0
+        L = ids.shape[1]
+        texto = pontos.astype("<u4").tobytes().decode("utf-32-le")
+        linhas = [texto[i * L:(i + 1) * L] for i in range(ids.shape[0])]
+        if (pontos == 0).any():
+            linhas = [l.replace("\x00", "") for l in linhas]
+        return linhas
@@ -0,0 +1,248 @@
+# perfil.py
+# Perfilamento opcional (torch.profiler) do treino, da avaliação e da inferência do MiniLLM.
+# Desligado por padrão; liga com PERFIL=1 ou com a opção de linha de comando de cada ferramenta:
+#   python train.py --perfil --epochs 1
+#   python eval_metrics.py --perfil
+#   python perfil.py inferencia [--lote 1]   (gerar_json_lote/gerar_json_do_modelo)
+#
+# Em cada ciclo do agendamento (PERFIL_CICLO = "espera,aquecimento,ativos,repetições", em passos;
+# um passo é um lote) ficam em PERFIL_DIR (padrão "perfis"):
+# - <nome>_<ciclo>.json: trace do Chrome (chrome://tracing ou ui.perfetto.dev)
+# - <nome>_<ciclo>.txt: tabela por operador, ordenada por tempo próprio e por memória própria
+# - <nome>_memoria.json: pico de memória alocada em cada passo ativo, por dispositivo, somando as
+#   alocações e liberações do alocador registradas no passo (na GPU também o pico absoluto,
+#   torch.cuda.max_memory_allocated, zerado a cada passo)
+#
+# Os trechos aparecem no trace com os rótulos de regiao() ("forward", "loss", "backward",
+# "otimizador", "decodificacao", "json") e, no modelo, com um rótulo por módulo: embeddings,
+# cada camada do encoder e sua atenção e a projeção de saída ("modulo:output"). A leitura dos
+# lotes já vem rotulada pelo DataLoader ("enumerate(DataLoader)...").
+#
+# Desligado, perfilar() devolve um objeto cujos métodos não fazem nada, regiao() devolve um
+# contexto vazio e nenhum hook é registrado no modelo. Só as operações da thread que abriu o
+# perfil são registradas (a validação de JSON em threads do eval_metrics fica de fora).
+import argparse
+import contextlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function, schedule
+
+from model.model import MiniLLM
+
+ATIVO = os.environ.get("PERFIL", "0") not in ("", "0")
+PASTA = os.environ.get("PERFIL_DIR", "perfis")
+CICLO = tuple(int(v) for v in os.environ.get("PERFIL_CICLO", "1,1,5,1").split(","))
+LINHAS_TABELA = 40
+
+_NULO = contextlib.nullcontext()
+# perfil aberto no momento (um por processo; perfis aninhados entram no de fora)
+_aberto: Optional["Perfil"] = None
+
+
+def regiao(nome: str):
+    # trecho rotulado no trace; sem perfil aberto, um contexto que não faz nada
+    if _aberto is None:
+        return _NULO
+    return record_function(nome)
+
+
+class _Desligado:
+    def iniciar(self):
+        return self
+
+    def encerrar(self):
+        pass
+
+    def passo(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+DESLIGADO = _Desligado()
+
+
+def perfilar(nome: str, modelo=None, ativo: Optional[bool] = None):
+    """Perfil `nome` (com os módulos de `modelo` rotulados) ou, desligado, um objeto vazio.
+
+    `ativo` None segue PERFIL. Com outro perfil já aberto (a validação dentro do treino),
+    devolve o objeto vazio e as operações entram no perfil de fora.
+    """
+    if not (ATIVO if ativo is None else ativo) or _aberto is not None:
+        return DESLIGADO
+    return Perfil(nome, modelo)
+
+
+class Perfil:
+    """torch.profiler com agendamento, exportação por ciclo e memória por passo.
+
+    Uso: `with perfilar("treino", model) as p:` e `p.passo()` no fim de cada lote, ou
+    iniciar()/encerrar() quando o trecho não cabe num bloco with.
+    """
+
+    def __init__(self, nome: str, modelo=None, pasta: Optional[str] = None, ciclo=None):
+        self.nome = nome
+        self.modelo = modelo
+        self.pasta = pasta or PASTA
+        self.ciclo = tuple(ciclo or CICLO)
+        espera, aquecimento, ativos, repeticoes = self.ciclo
+        self.cuda = torch.cuda.is_available()
+        atividades = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if self.cuda else [])
+        self.prof = profile(activities=atividades,
+                            schedule=schedule(wait=espera, warmup=aquecimento, active=ativos, repeat=repeticoes),
+                            on_trace_ready=self._exportar, record_shapes=True, profile_memory=True)
+        self.ciclos = 0
+        self.passos = 0
+        self.memoria: List[Dict] = []
+        # pico absoluto da GPU por passo (só com CUDA)
+        self._pico_cuda: Dict[int, float] = {}
+        self._hooks = []
+
+    def iniciar(self):
+        global _aberto
+        os.makedirs(self.pasta, exist_ok=True)
+        # o MiniLLMLote da inferência embrulha o MiniLLM em `.modelo`; artefatos exportados
+        # (TorchScript etc.) ficam sem os rótulos por módulo
+        modelo = getattr(self.modelo, "modelo", self.modelo)
+        if isinstance(modelo, MiniLLM):
+            self._hooks = instrumentar(modelo)
+        self.prof.start()
+        _aberto = self
+        return self
+
+    def encerrar(self):
+        global _aberto
+        try:
+            self.prof.stop()
+            if self.ciclos == 0:
+                print(f"perfil '{self.nome}': nenhum ciclo exportado ({self.passos} passo(s), "
+                      f"ciclo {','.join(map(str, self.ciclo))})")
+        finally:
+            _aberto = None
+            for h in self._hooks:
+                h.remove()
+            self._hooks = []
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.encerrar()
+        return False
+
+    def passo(self):
+        if self.cuda:
+            self._pico_cuda[self.passos] = torch.cuda.max_memory_allocated() / 2**20
+            torch.cuda.reset_peak_memory_stats()
+        self.passos += 1
+        self.prof.step()
+
+    def _exportar(self, prof):
+        self.ciclos += 1
+        base = os.path.join(self.pasta, f"{self.nome}_{self.ciclos}")
+        prof.export_chrome_trace(base + ".json")
+        medias = prof.key_averages()
+        tempo = "self_cuda_time_total" if self.cuda else "self_cpu_time_total"
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"# {self.nome}, ciclo {self.ciclos}: por tempo próprio\n")
+            f.write(medias.table(sort_by=tempo, row_limit=LINHAS_TABELA))
+            f.write(f"\n# {self.nome}, ciclo {self.ciclos}: por memória própria\n")
+            f.write(medias.table(sort_by="self_cpu_memory_usage", row_limit=LINHAS_TABELA))
+        self.memoria.extend(self._memoria_por_passo(prof))
+        with open(os.path.join(self.pasta, f"{self.nome}_memoria.json"), "w", encoding="utf-8") as f:
+            json.dump(self.memoria, f, indent=1)
+        print(f"perfil '{self.nome}': ciclo {self.ciclos} exportado em {base}.json/.txt")
+
+    def _memoria_por_passo(self, prof) -> List[Dict]:
+        # eventos brutos do kineto: os "[memory]" trazem os bytes alocados (>0) ou liberados (<0)
+        eventos = prof.profiler.kineto_results.events()
+        memoria = sorted((e.start_ns(), e.nbytes(), _dispositivo(e)) for e in eventos if e.name() == "[memory]")
+        passos = sorted((e.start_ns(), e.end_ns(), int(e.name().split("#")[1]))
+                        for e in eventos if e.name().startswith("ProfilerStep#"))
+        resultado = []
+        for inicio, fim, numero in passos:
+            atual: Dict[str, int] = {}
+            pico: Dict[str, int] = {}
+            for t, nbytes, disp in memoria:
+                if inicio <= t <= fim:
+                    atual[disp] = atual.get(disp, 0) + nbytes
+                    pico[disp] = max(pico.get(disp, 0), atual[disp])
+            item = {"passo": numero, "duracao_ms": round((fim - inicio) / 1e6, 3),
+                    "pico_mb": {d: round(v / 2**20, 3) for d, v in pico.items()},
+                    "liquido_mb": {d: round(v / 2**20, 3) for d, v in atual.items()}}
+            if numero in self._pico_cuda:
+                item["pico_cuda_total_mb"] = round(self._pico_cuda[numero], 3)
+            resultado.append(item)
+        return resultado
+
+
+def _dispositivo(evento) -> str:
+    tipo = str(evento.device_type()).split(".")[-1].lower()
+    return tipo if tipo == "cpu" else f"{tipo}:{evento.device_index()}"
+
+
+def instrumentar(modelo: MiniLLM) -> list:
+    # hooks de forward que abrem um record_function por módulo; devolve os handles para remover.
+    # No caminho rápido do encoder (inferência sem gradiente) as camadas não passam pelos
+    # submódulos e só o rótulo do transformer (ou da camada) aparece.
+    rotulados = {"token_emb", "pos_emb", "transformer", "output"}
+    abertos = []
+
+    def antes(rotulo):
+        def hook(modulo, entradas):
+            rf = record_function(rotulo)
+            rf.__enter__()
+            abertos.append(rf)
+        return hook
+
+    def depois(modulo, entradas, saida):
+        if abertos:
+            abertos.pop().__exit__(None, None, None)
+
+    handles = []
+    for nome, modulo in modelo.named_modules():
+        partes = nome.split(".")
+        camada = len(partes) == 3 and partes[:2] == ["transformer", "layers"]
+        atencao = len(partes) == 4 and partes[:2] == ["transformer", "layers"] and partes[3] == "self_attn"
+        if nome in rotulados or camada or atencao:
+            handles.append(modulo.register_forward_pre_hook(antes(f"modulo:{nome}")))
+            handles.append(modulo.register_forward_hook(depois))
+    return handles
+
+
+# --- Main ---
+def perfilar_inferencia(lote: int = 1, passos: Optional[int] = None, fonte: str = "dataset/comandos.json"):
+    # gerar_json_lote (lote 1 = gerar_json_do_modelo) sobre os comandos do dataset, um passo por chamada
+    import infer
+
+    with open(fonte, encoding="utf-8") as f:
+        comandos = [item["comando"] for item in json.load(f)]
+    m = infer.carregar()
+    espera, aquecimento, ativos, repeticoes = CICLO
+    passos = passos or (espera + aquecimento + ativos) * max(1, repeticoes)
+    inicio = time.perf_counter()
+    with Perfil("inferencia", m.model) as p:
+        for i in range(passos):
+            pedaco = [comandos[(i * lote + j) % len(comandos)] for j in range(lote)]
+            infer.gerar_json_lote(pedaco)
+            p.passo()
+    print(f"{passos} passos de {lote} comando(s) em {time.perf_counter() - inicio:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("alvo", choices=["inferencia"])
+    parser.add_argument("--lote", type=int, default=1)
+    parser.add_argument("--passos", type=int, default=None)
+    args = parser.parse_args()
+    # pelo módulo importado, o mesmo que infer.py usa (não o __main__), para regiao() ver o perfil aberto
+    import perfil
+    perfil.perfilar_inferencia(args.lote, args.passos)
@@ -0,0 +1,227 @@
+# registro.py
+# Logging estruturado (JSON por linha) com escrita em thread de fundo.
+#
+# Na thread da requisição só acontece a criação do LogRecord e um put() numa fila; a
+# formatação JSON, a redação de nomes e a escrita no stdout ficam com o QueueListener.
+# Configuração por variáveis de ambiente:
+#   LOG_NIVEL              nível do logger "organizamed" (padrão INFO)
+#   LOG_AMOSTRAGEM_DEBUG   fração dos registros DEBUG mantidos (padrão 0.01)
+#   LOG_REDIGIR_NOMES      "0" desliga a redação de nomes de pacientes (padrão ligada)
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+RAIZ = "organizamed"
+# chaves com nomes de pessoas mascaradas nos deltas registrados
+CAMPOS_NOME = {"nome", "pacienteNome", "medicoNome"}
+AMOSTRAGEM_DEBUG = 0.01
+
+# campos da requisição atual (id e anotações como o padrão que casou)
+_requisicao: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("requisicao", default=None)
+
+_listener: Optional[QueueListener] = None
+# processo dono da thread do listener: depois de um fork o filho herda _listener, mas não a thread
+_pid_listener: Optional[int] = None
+# argumentos da última configuração, para refazer o pipeline num processo filho
+_config: Dict[str, Any] = {}
+
+
+def _sem_origem(*args, **kwargs):
+    # findCaller dos loggers do módulo: o JSON não usa arquivo/linha, então não percorre a pilha
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    # a troca do findCaller vale só para este logger; os outros (uvicorn etc.) ficam como estão
+    logger = logging.getLogger(f"{RAIZ}.{nome}")
+    logger.findCaller = _sem_origem
+    return logger
+
+
+def registrar_debug(logger: logging.Logger, msg: str, **campos):
+    # payloads de depuração: só monta o registro se DEBUG estiver ligado (a amostragem vem depois)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, extra={"campos": campos})
+
+
+def anotar(**campos):
+    # acrescenta campos à linha de resumo da requisição atual (sem efeito fora de uma requisição)
+    requisicao = _requisicao.get()
+    if requisicao is not None:
+        requisicao["campos"].update(campos)
+
+
+def id_requisicao() -> Optional[str]:
+    requisicao = _requisicao.get()
+    return requisicao["id"] if requisicao is not None else None
+
+
+class _FiltroContexto(logging.Filter):
+    # roda na thread que loga: copia o id da requisição e amostra os registros DEBUG
+    def __init__(self, amostragem_debug: float):
+        super().__init__()
+        self.amostragem_debug = amostragem_debug
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= self.amostragem_debug:
+            return False
+        record.request_id = id_requisicao()
+        return True
+
+
+class _QueueHandlerSemFormatar(QueueHandler):
+    # o QueueHandler padrão formata a mensagem antes do put(); aqui isso fica para o listener
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class FormatadorJson(logging.Formatter):
+    def __init__(self, redigir_nomes: bool = True):
+        super().__init__()
+        self.redigir_nomes = redigir_nomes
+
+    def format(self, record: logging.LogRecord) -> str:
+        linha = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            linha["request_id"] = record.request_id
+        campos = getattr(record, "campos", None)
+        if campos:
+            linha.update(self._redigir(campos) if self.redigir_nomes else campos)
+        if record.exc_info:
+            linha["exc"] = self.formatException(record.exc_info)
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _redigir(campos: Dict[str, Any]) -> Dict[str, Any]:
+        # o texto e os grupos do regex contêm o nome do paciente em posição que o parser nem
+        # sempre acerta, então são mascarados por inteiro
+        campos = dict(campos)
+        dados = campos.get("dados")
+        if isinstance(dados, dict) and dados.get("pacienteNome"):
+            campos["dados"] = {**dados, "pacienteNome": "***"}
+        if "grupos" in campos:
+            campos["grupos"] = "***"
+        texto = campos.get("texto")
+        if isinstance(texto, str):
+            campos["texto"] = f"<{len(texto)} caracteres>"
+        # deltas dos índices de nomes e da agenda: "nome" (paciente ou médico) e pacienteNome
+        delta = campos.get("delta")
+        if isinstance(delta, dict):
+            campos["delta"] = {k: "***" if k in CAMPOS_NOME else v for k, v in delta.items()}
+        elif delta is not None:
+            campos["delta"] = f"<{len(str(delta))} caracteres>"
+        return campos
+
+
+def configurar_logging(nivel: Optional[str] = None, amostragem_debug: Optional[float] = None,
+                       redigir_nomes: Optional[bool] = None, saida=None):
+    """Liga o pipeline fila -> thread de fundo -> JSON no logger "organizamed".
+
+    Idempotente no mesmo processo. Num filho de fork o _listener herdado não tem thread (os
+    registros ficariam parados na fila): o pipeline é refeito com uma fila e uma thread novas.
+    """
+    global _listener, _pid_listener
+    if _listener is not None and _pid_listener == os.getpid():
+        return
+    _listener = None
+    nivel = nivel or os.environ.get("LOG_NIVEL", "INFO")
+    if amostragem_debug is None:
+        amostragem_debug = float(os.environ.get("LOG_AMOSTRAGEM_DEBUG", AMOSTRAGEM_DEBUG))
+    if redigir_nomes is None:
+        redigir_nomes = os.environ.get("LOG_REDIGIR_NOMES", "1") != "0"
+
+    fila: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    manipulador_fila = _QueueHandlerSemFormatar(fila)
+    manipulador_fila.addFilter(_FiltroContexto(amostragem_debug))
+
+    _config.update(nivel=nivel, amostragem_debug=amostragem_debug, redigir_nomes=redigir_nomes, saida=saida)
+    manipulador_saida = logging.StreamHandler(saida or sys.stdout)
+    manipulador_saida.setFormatter(FormatadorJson(redigir_nomes))
+
+    raiz = logging.getLogger(RAIZ)
+    raiz.setLevel(nivel.upper())
+    raiz.handlers[:] = [manipulador_fila]
+    raiz.propagate = False
+
+    _listener = QueueListener(fila, manipulador_saida, respect_handler_level=True)
+    _listener.start()
+    _pid_listener = os.getpid()
+    atexit.register(encerrar_logging)
+
+
+def _refazer_no_filho():
+    # filho de fork (workers do servidor.py, que fazem fork depois de importar o main): sem isto os
+    # registros iriam para a fila herdada, que nenhuma thread esvazia, e a memória só cresceria
+    if _listener is not None:
+        configurar_logging(**_config)
+
+
+os.register_at_fork(after_in_child=_refazer_no_filho)
+
+
+def encerrar_logging():
+    # esvazia a fila e para a thread de escrita
+    global _listener
+    if _listener is not None and _pid_listener == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+class MiddlewareRequisicao:
+    """Middleware ASGI: define o id da requisição e registra uma linha de resumo com a latência.
+
+    O id vem do cabeçalho X-Request-ID (ou é gerado) e volta no mesmo cabeçalho da resposta.
+    Campos anotados durante a requisição (via anotar) entram na linha de resumo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = obter_logger("http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for chave, valor in scope.get("headers", ()):
+            if chave == b"x-request-id":
+                rid = valor.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+        requisicao = {"id": rid, "campos": {}}
+        token = _requisicao.set(requisicao)
+        inicio = time.perf_counter()
+        status = {"codigo": 500}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status["codigo"] = mensagem["status"]
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            self.logger.info("requisicao", extra={"campos": {
+                "metodo": scope.get("method"),
+                "rota": scope.get("path"),
+                "status": status["codigo"],
+                "latencia_ms": round((time.perf_counter() - inicio) * 1000, 3),
+                **requisicao["campos"],
+            }})
+            _requisicao.reset(token)
@@ -0,0 +1,124 @@
+# servidor.py
+# Sobe N workers do uvicorn que dividem o app já carregado copy-on-write (como o --preload do gunicorn).
+#
+# O processo pai importa o app e carrega o MiniLLM (torch, pesos mapeados, tabelas do decodificador
+# e o forward de aquecimento) e só então faz fork dos workers, que herdam essas páginas prontas em
+# vez de cada um importar e carregar tudo de novo, como no `uvicorn --workers N` (que sobe cada
+# worker com spawn). Os workers aceitam conexões do mesmo socket, aberto pelo pai; um worker que
+# morre é substituído por outro fork do pai, também já carregado.
+#
+# O pool de threads do OpenMP não sobrevive ao fork: um filho que herda um pool já usado trava no
+# primeiro forward paralelo. Por isso o pai carrega com uma thread só e cada worker volta a usar
+# --threads (padrão: CPUs / workers).
+# Uso (a partir de MachineLearning/): python servidor.py --workers 4 [--host 0.0.0.0] [--porta 8000]
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from registro import configurar_logging, encerrar_logging, obter_logger
+
+configurar_logging()
+log = obter_logger("servidor")
+
+
+def abrir_socket(host: str, porta: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, porta))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def precarregar():
+    # importa o app e, se o fallback estiver ligado, carrega o modelo antes do fork
+    inicio = time.perf_counter()
+    import main
+    if main.agendador_modelo is not None:
+        import torch
+        torch.set_num_threads(1)
+        main.aquecer_modelo()
+    # objetos que já existem saem do GC: as varreduras nos workers não tocam (e copiam) essas páginas
+    gc.collect()
+    gc.freeze()
+    log.info("app pré-carregado", extra={"campos": {"segundos": round(time.perf_counter() - inicio, 3)}})
+    return main.app
+
+
+def rodar_worker(app, sock: socket.socket, threads: int):
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sinal, signal.SIG_DFL)
+    uvicorn.Server(uvicorn.Config(app, timeout_graceful_shutdown=10)).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="threads do torch por worker (padrão: CPUs / workers)")
+    args = parser.parse_args()
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    sock = abrir_socket(args.host, args.porta)
+    app = precarregar()
+    workers = {}
+    encerrando = False
+
+    def iniciar_worker():
+        pid = os.fork()
+        if pid == 0:
+            # o logging do worker (fila e thread próprias) é refeito no fork por registro.py
+            try:
+                rodar_worker(app, sock, threads)
+            finally:
+                # os._exit não roda o atexit: esvazia a fila de logs antes
+                encerrar_logging()
+                os._exit(0)
+        workers[pid] = time.monotonic()
+
+    def encerrar(signum, frame):
+        nonlocal encerrando
+        encerrando = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+    for _ in range(args.workers):
+        iniciar_worker()
+    log.info("workers iniciados", extra={"campos": {"workers": list(workers), "porta": args.porta,
+                                                    "threads": threads}})
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        iniciado = workers.pop(pid, None)
+        if iniciado is None or encerrando:
+            continue
+        log.warning("worker terminou; iniciando outro",
+                    extra={"campos": {"pid": pid, "status": os.waitstatus_to_exitcode(status)}})
+        if time.monotonic() - iniciado < 1:
+            # worker que morre logo ao subir: espera um pouco para não ficar em laço de fork
+            time.sleep(1)
+        iniciar_worker()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+# os módulos ficam na raiz de MachineLearning/ (rodar: python -m pytest tests)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,17 @@
+# tests/test_eval_metrics.py
+import torch
+
+from eval_metrics import prever_logits
+from model.model import MiniLLM, MiniLLMLote
+
+
+def test_prever_logits_completa_ate_o_seq_len_do_modelo():
+    # variante de inferência com seq_len != 128: sem seq_len explícito vale o do modelo
+    modelo = MiniLLM(20, emb_size=16, n_heads=2, n_layers=1, seq_len=48).eval()
+    xb = torch.randint(1, 20, (3, 10))
+    with torch.no_grad():
+        lote = prever_logits(MiniLLMLote(modelo).eval(), xb)
+        completo = prever_logits(modelo, xb)
+    assert lote.shape == completo.shape == (3, 48, 20)
+    # a cauda só de padding é a mesma nos dois forwards (as posições reais, não: ver forward_lote)
+    assert torch.allclose(lote[:, 10:], completo[:, 10:], atol=1e-5)
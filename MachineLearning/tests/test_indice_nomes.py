@@ -0,0 +1,28 @@
+# tests/test_indice_nomes.py
+from indice_nomes import CatalogoNomes
+
+
+def _situacao(resultados):
+    return [(r["id"], r["op"], r["criado"], r["anterior"]) for r in resultados]
+
+
+def test_registrar_diz_se_o_id_foi_criado_ou_ja_existia():
+    catalogo = CatalogoNomes()
+    assert _situacao(catalogo.registrar([
+        {"tipo": "paciente", "id": 1, "nome": "Ana Souza"},
+        {"tipo": "paciente", "id": 1, "nome": "Ana Sousa"},
+        {"tipo": "medico", "id": 1, "nome": "Dr. João"},
+    ])) == [(1, "upsert", True, None), (1, "upsert", False, "Ana Souza"), (1, "upsert", True, None)]
+    assert _situacao(catalogo.registrar([
+        {"tipo": "paciente", "id": 1, "op": "remover"},
+        {"tipo": "paciente", "id": 1, "nome": "Ana Sousa"},
+    ])) == [(1, "remover", False, "Ana Sousa"), (1, "upsert", True, None)]
+
+
+def test_registrar_com_log_considera_os_deltas_dos_outros_workers(tmp_path):
+    caminho = str(tmp_path / "deltas.jsonl")
+    outro, catalogo = CatalogoNomes(caminho), CatalogoNomes(caminho)
+    outro.registrar([{"tipo": "medico", "id": 7, "nome": "Dra. Carla"}])
+    assert _situacao(catalogo.registrar([{"tipo": "medico", "id": 7, "nome": "Dra. Carla Lima"}])) == [
+        (7, "upsert", False, "Dra. Carla")]
+    assert catalogo.buscar("medico", "carla lima")[0]["id"] == 7
@@ -0,0 +1,59 @@
+# tests/test_registro.py
+# Logging depois de fork: o filho herda a fila e o _listener do pai, mas não a thread que escreve.
+import json
+import os
+
+import registro
+
+
+def _linhas(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def test_registros_do_filho_de_fork_sao_escritos(tmp_path):
+    caminho = tmp_path / "log.jsonl"
+    registro.encerrar_logging()
+    with open(caminho, "w", encoding="utf-8") as saida:
+        registro.configurar_logging(nivel="INFO", saida=saida)
+        log = registro.obter_logger("teste")
+        log.info("pai antes do fork")
+        pid = os.fork()
+        if pid == 0:
+            # o filho não chama configurar_logging: o pipeline é refeito no fork
+            try:
+                log.info("filho", extra={"campos": {"pid": os.getpid()}})
+                registro.encerrar_logging()
+            finally:
+                os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        registro.encerrar_logging()
+
+    linhas = _linhas(caminho)
+    filho = [l for l in linhas if l["msg"] == "filho"]
+    assert len(filho) == 1 and filho[0]["pid"] == pid
+    # o registro do pai não é escrito de novo pelo filho
+    assert [l["msg"] for l in linhas].count("pai antes do fork") == 1
+
+
+def test_configurar_logging_refaz_o_listener_em_outro_processo(tmp_path):
+    caminho = tmp_path / "log.jsonl"
+    registro.encerrar_logging()
+    with open(caminho, "w", encoding="utf-8") as saida:
+        registro.configurar_logging(nivel="INFO", saida=saida)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # no mesmo processo seria um no-op; no filho, listener novo com thread viva
+                registro.configurar_logging()
+                ok = registro._listener is not None and registro._listener._thread.is_alive()
+                registro.obter_logger("teste").info("filho configurado")
+                registro.encerrar_logging()
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        registro.encerrar_logging()
+
+    assert [l["msg"] for l in _linhas(caminho)] == ["filho configurado"]
@@ -1,140 +1,413 @@
+import argparse
 import json
+import math
+import os
+import resource
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Optional, get_args
 import torch
-from torch.utils.data import DataLoader, Dataset, random_split
+import torch.distributed as dist
+from torch.utils.data import DataLoader, Dataset, DistributedSampler, Sampler
 import torch.nn as nn
-from model.model import MiniLLM
+from model.model import PAD, MiniLLM, mascara_padding
 from model.tokenizer import CharTokenizer
+from dataset_tokenizado import ShardsTokenizados, preparar
+import checkpoints
+import perfil
+from model.carregar import salvar_arquitetura
+from eval_metrics import avaliar, split_validacao
+from dataset_stream import ComandosStream
 
 # --- Dataset ---
-with open("dataset/comandos.json") as f:
-    data = json.load(f)
+FONTE = "dataset/comandos.json"
 
 tokenizer = CharTokenizer()
 
 class ComandoDataset(Dataset):
-    def __init__(self, data, tokenizer, seq_len=128):
-        self.data = data
+    # exemplos pré-tokenizados em shards .npy mapeados em memória (ver dataset_tokenizado.py);
+    # o cache é criado na primeira vez e refeito se o JSON ou o vocabulário mudarem
+    def __init__(self, fonte, tokenizer, seq_len=128):
         self.tokenizer = tokenizer
         self.seq_len = seq_len
+        self.shards = ShardsTokenizados(*preparar(fonte, tokenizer, seq_len))
+        # comprimento real (sem padding) de cada entrada, para os lotes por comprimento
+        self.comprimentos = self.shards.comprimentos
 
     def __len__(self):
-        return len(self.data)
+        return len(self.shards)
 
     def __getitem__(self, idx):
-        comando = self.data[idx]["comando"]
-        resposta = json.dumps(self.data[idx]["json"])
-        x = self.tokenizer.encode(comando)
-        y = self.tokenizer.encode(resposta)
-        # Pad
-        x = x + [0]*(self.seq_len - len(x)) if len(x)<self.seq_len else x[:self.seq_len]
-        y = y + [0]*(self.seq_len - len(y)) if len(y)<self.seq_len else y[:self.seq_len]
-        return torch.tensor(x), torch.tensor(y)
+        # views uint8 [seq_len] sobre o shard mapeado (sem cópia); aparar_lote converte o lote
+        return self.shards.item(idx)
+
+class AmostradorPorComprimento(Sampler):
+    """Lotes de exemplos com entradas de comprimento parecido (batch_sampler do DataLoader).
+
+    Os índices são embaralhados, divididos em baldes de `lotes_por_balde` lotes, ordenados
+    por comprimento dentro de cada balde e cortados em lotes; a ordem dos lotes também é
+    embaralhada. Assim aparar_lote corta pouco padding sem fixar a composição dos lotes
+    (sem batch_first, os exemplos de um lote atendem uns aos outros: baldes grandes repetem os
+    mesmos pares a cada época e custaram ~0,5 ponto de acurácia por token).
+
+    Com `processos` > 1 (treino distribuído) os índices vêm de um DistributedSampler: cada
+    processo fica com uma parte disjunta, do mesmo tamanho em todos, e a agrupa em baldes.
+    """
+
+    def __init__(self, comprimentos, batch_size, shuffle=True, lotes_por_balde=4, processos=1, rank=0, semente=0):
+        self.comprimentos = comprimentos
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.lotes_por_balde = lotes_por_balde
+        self.distribuido = None
+        if processos > 1:
+            self.distribuido = DistributedSampler(comprimentos, num_replicas=processos, rank=rank,
+                                                  shuffle=shuffle, seed=semente)
+
+    def set_epoch(self, epoca):
+        # nova partição entre os processos a cada época (mesma semente + época em todos)
+        if self.distribuido is not None:
+            self.distribuido.set_epoch(epoca)
+
+    def _indices(self):
+        if self.distribuido is not None:
+            return list(self.distribuido)
+        n = len(self.comprimentos)
+        return torch.randperm(n).tolist() if self.shuffle else list(range(n))
+
+    def __iter__(self):
+        indices = self._indices()
+        n = len(indices)
+        balde = self.batch_size * self.lotes_por_balde
+        lotes = []
+        for i in range(0, n, balde):
+            grupo = sorted(indices[i:i + balde], key=self.comprimentos.__getitem__)
+            lotes += [grupo[j:j + self.batch_size] for j in range(0, len(grupo), self.batch_size)]
+        if self.shuffle:
+            lotes = [lotes[i] for i in torch.randperm(len(lotes)).tolist()]
+        return iter(lotes)
+
+    def __len__(self):
+        n = len(self.distribuido) if self.distribuido is not None else len(self.comprimentos)
+        balde = self.batch_size * self.lotes_por_balde
+        return sum(-(-min(balde, n - i) // self.batch_size) for i in range(0, n, balde))
+
+def aparar_lote(exemplos):
+    # collate_fn: remove as colunas finais que são padding em todas as entradas do lote.
+    # O alvo continua com seq_len posições (o JSON é mais longo que o comando); o modelo
+    # completa a saída com MiniLLM.forward_completo
+    x = torch.stack([e[0] for e in exemplos]).long()
+    y = torch.stack([e[1] for e in exemplos]).long()
+    reais = (x != PAD).any(0).nonzero()
+    L = int(reais.max()) + 1 if len(reais) else 1
+    return x[:, :L], y
+
+def carregador_por_comprimento(dataset, batch_size, shuffle=True, workers=0, pin_memory=False,
+                               processos=1, rank=0, semente=0):
+    # aceita o ComandoDataset ou um Subset dele (split_validacao)
+    if hasattr(dataset, "indices"):
+        comprimentos = [dataset.dataset.comprimentos[i] for i in dataset.indices]
+    else:
+        comprimentos = dataset.comprimentos
+    amostrador = AmostradorPorComprimento(comprimentos, batch_size, shuffle=shuffle, processos=processos,
+                                          rank=rank, semente=semente)
+    return DataLoader(dataset, batch_sampler=amostrador, collate_fn=aparar_lote, num_workers=workers,
+                      pin_memory=pin_memory, persistent_workers=workers > 0)
 
 # --- Treino ---
-def train_model(epochs=50, batch_size=2, lr=1e-3):
-    dataset = ComandoDataset(data, tokenizer)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
+@dataclass
+class ConfigTreino:
+    epochs: int = 50
+    batch_size: int = 2
+    lr: float = 1e-3
+    # arquitetura do MiniLLM (emb_size divisível por n_heads); seq_len é também o comprimento
+    # dos exemplos e da saída. Gravada ao lado dos pesos (model/carregar.py)
+    emb_size: int = 64
+    n_heads: int = 2
+    n_layers: int = 2
+    seq_len: int = 128
+    # processos do DataLoader (0 = no processo principal) e pinned memory (só com GPU)
+    workers: int = 0
+    pin_memory: bool = True
+    # threads de intra-op do torch (None = padrão do torch, um por núcleo)
+    threads: Optional[int] = None
+    # autocast bf16 no forward (na CPU ou GPU); a loss e o otimizador continuam em float32
+    bf16: bool = False
+    # torch.compile do forward (dynamic=True: os lotes aparados têm comprimentos diferentes)
+    compilar: bool = False
+    # lotes acumulados por passo do otimizador (lote efetivo = batch_size * acumulacao)
+    acumulacao: int = 1
+    # LR por passo do otimizador: "constante", "cosseno" ou "linear" (até 0), após
+    # `aquecimento` (fração dos passos) de subida linear
+    agendamento: str = "constante"
+    aquecimento: float = 0.0
+    # fração separada para validação a cada época (0 = treina com tudo e não valida); o split
+    # é o persistido do eval_metrics, sorteado com `semente`
+    val_frac: float = 0.0
+    semente: int = 0
+    # métrica do evaluate_model que escolhe os melhores checkpoints e decide o early stopping
+    # (loss/perplexidade: menor é melhor; token_accuracy, json_parse_rate, exact_match_rate: maior)
+    metrica: str = "token_accuracy"
+    # épocas seguidas sem melhora na métrica antes de parar (0 = sem early stopping)
+    paciencia: int = 0
+    # checkpoints: `ultimo.pt` a cada `checkpoint_a_cada` épocas e os `manter_melhores` melhores
+    pasta_checkpoints: str = "model/checkpoints"
+    checkpoint_a_cada: int = 1
+    manter_melhores: int = 3
+    # checkpoint para retomar o treino ("ultimo" = <pasta_checkpoints>/ultimo.pt)
+    retomar: Optional[str] = None
+    # pasta de shards do gerador_comandos.py: treina em streaming nos exemplos sintéticos (a
+    # validação continua no dataset real)
+    sinteticos: Optional[str] = None
+    # onde salvar os pesos finais (os do melhor checkpoint, se houver validação)
+    saida: str = "model/mini_llm.pth"
+    # torch.profiler nos primeiros passos do treino (também com PERFIL=1), ver perfil.py
+    perfil: bool = False
 
-    model = MiniLLM(tokenizer.vocab_size)
+def arquitetura(config: ConfigTreino) -> dict:
+    return {"emb_size": config.emb_size, "n_heads": config.n_heads, "n_layers": config.n_layers,
+            "seq_len": config.seq_len}
+
+def fator_lr(passo, total, agendamento, aquecimento):
+    passos_aquecimento = int(total * aquecimento)
+    if passo < passos_aquecimento:
+        return (passo + 1) / passos_aquecimento
+    progresso = (passo - passos_aquecimento) / max(1, total - passos_aquecimento)
+    if agendamento == "cosseno":
+        return 0.5 * (1 + math.cos(math.pi * progresso))
+    if agendamento == "linear":
+        return 1 - progresso
+    return 1.0
+
+def pico_memoria_mb(device):
+    # pico desde o início do processo (RSS) na CPU; na GPU, pico da época (zerado a cada época)
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# --- Distribuído ---
+# Com torchrun (WORLD_SIZE > 1) o treino roda em N processos com backend gloo:
+#   torchrun --standalone --nproc-per-node 4 train.py --batch-size 4 --val-frac 0.1
+# Cada processo treina numa parte disjunta de cada época (--batch-size é por processo, o lote
+# global é N vezes maior) e os gradientes são somados por all-reduce antes de cada passo do
+# otimizador. Validação, checkpoints, logs e os pesos finais (--saida) ficam só com o rank 0.
+def iniciar_distribuido():
+    # (rank, processos); sem torchrun é (0, 1) e nada muda
+    if int(os.environ.get("WORLD_SIZE", 1)) > 1 and not dist.is_initialized():
+        dist.init_process_group("gloo")
+    if dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+def reduzir_gradientes(model, processos):
+    # média dos gradientes entre os processos num único all-reduce (um tensor com todos)
+    grads = [p.grad for p in model.parameters() if p.grad is not None]
+    plano = torch.cat([g.reshape(-1) for g in grads])
+    dist.all_reduce(plano)
+    plano /= processos
+    inicio = 0
+    for g in grads:
+        g.copy_(plano[inicio:inicio + g.numel()].view_as(g))
+        inicio += g.numel()
+
+def train_model(epochs=50, batch_size=2, lr=1e-3, config: Optional[ConfigTreino] = None):
+    config = config or ConfigTreino(epochs=epochs, batch_size=batch_size, lr=lr)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    rank, processos = iniciar_distribuido()
+    principal = rank == 0
+    if config.threads:
+        torch.set_num_threads(config.threads)
+    elif processos > 1:
+        # os núcleos divididos entre os processos, em vez de um thread por núcleo em cada um
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // processos))
+    dataset = ComandoDataset(FONTE, tokenizer, config.seq_len)
+    treino_ds, val_loader = dataset, None
+    if config.val_frac > 0:
+        treino_ds, val_ds = split_validacao(dataset, config.val_frac, config.semente)
+        val_loader = carregador_por_comprimento(val_ds, 8, shuffle=False)
+    pin_memory = config.pin_memory and device.type == "cuda"
+    stream = None
+    if config.sinteticos:
+        # sem lotes por comprimento (o stream não tem índices) e sem workers persistentes, que não
+        # veriam o set_epoca; aparar_lote corta só o padding comum ao lote
+        stream = ComandosStream(config.sinteticos, tokenizer, config.seq_len, semente=config.semente, rank=rank,
+                                replicas=processos)
+        dataloader = DataLoader(stream, batch_size=config.batch_size, collate_fn=aparar_lote,
+                                num_workers=config.workers, pin_memory=pin_memory)
+        # os processos precisam dar o mesmo número de passos: a época para no menor deles
+        lotes_por_epoca = min(stream.lotes(config.batch_size, config.workers, r) for r in range(processos))
+    else:
+        dataloader = carregador_por_comprimento(treino_ds, config.batch_size, shuffle=True, workers=config.workers,
+                                                pin_memory=pin_memory, processos=processos, rank=rank,
+                                                semente=config.semente)
+        lotes_por_epoca = len(dataloader)
+
+    model = MiniLLM(tokenizer.vocab_size, **arquitetura(config)).to(device)
+    if processos > 1:
+        # todos os processos partem dos pesos do rank 0
+        for p in model.parameters():
+            dist.broadcast(p.data, 0)
+    forward = model.forward_completo
+    if config.compilar:
+        forward = torch.compile(forward, dynamic=True)
     criterion = nn.CrossEntropyLoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    optimizer = torch.optim.Adam(model.parameters(), lr=config.lr)
+    passos_por_epoca = math.ceil(lotes_por_epoca / config.acumulacao)
+    total_passos = config.epochs * passos_por_epoca
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, lambda passo: fator_lr(passo, total_passos, config.agendamento, config.aquecimento))
+
+    gerenciador = checkpoints.GerenciadorCheckpoints(config.pasta_checkpoints, config.metrica, config.manter_melhores)
+    primeira_epoca = 0
+    if config.retomar:
+        caminho = gerenciador.caminho_ultimo if config.retomar == "ultimo" else config.retomar
+        estado = checkpoints.carregar(caminho)
+        if estado["vocab_versao"] != tokenizer.versao:
+            raise ValueError(f"{caminho} usa o vocabulário v{estado['vocab_versao']}, o tokenizer é v{tokenizer.versao}")
+        model.load_state_dict(estado["modelo"])
+        optimizer.load_state_dict(estado["otimizador"])
+        scheduler.load_state_dict(estado["agendador"])
+        gerenciador.restaurar(estado["gerenciador"])
+        checkpoints.restaurar_rng(estado["rng"])
+        primeira_epoca = estado["epoca"]
+        if principal:
+            print(f"Retomando de '{caminho}' após a época {primeira_epoca}.")
+
+    def estado_treino(epoca, metricas):
+        return {
+            "epoca": epoca,
+            "modelo": model.state_dict(),
+            "otimizador": optimizer.state_dict(),
+            "agendador": scheduler.state_dict(),
+            "rng": checkpoints.estado_rng(),
+            "metricas": metricas,
+            "config": asdict(config),
+            "vocab_versao": tokenizer.versao,
+        }
 
-    for epoch in range(epochs):
+    # desligado, `prof` é um objeto vazio; a validação por época entra no mesmo perfil
+    prof = perfil.perfilar("treino" if processos == 1 else f"treino_rank{rank}", model,
+                           config.perfil or None).iniciar()
+    for epoch in range(primeira_epoca, config.epochs):
+        model.train()
         total_loss = 0
-        for x, y in dataloader:
-            optimizer.zero_grad()
-            out = model(x)
-            out = out.view(-1, tokenizer.vocab_size)
-            y = y.view(-1)
-            loss = criterion(out, y)
-            loss.backward()
-            optimizer.step()
+        tokens = 0
+        exemplos = 0
+        if device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(device)
+        if stream is not None:
+            stream.set_epoca(epoch)
+        else:
+            dataloader.batch_sampler.set_epoch(epoch)
+        inicio = time.perf_counter()
+        optimizer.zero_grad()
+        for i, (x, y) in enumerate(dataloader):
+            x = x.to(device, non_blocking=True)
+            y = y.to(device, non_blocking=True)
+            with perfil.regiao("forward"), torch.autocast(device.type, dtype=torch.bfloat16, enabled=config.bf16):
+                out = forward(x, mascara_padding(x))
+            tokens += y.numel()
+            exemplos += y.shape[0]
+            with perfil.regiao("loss"):
+                out = out.float().view(-1, tokenizer.vocab_size)
+                y = y.view(-1)
+                loss = criterion(out, y)
+            with perfil.regiao("backward"):
+                (loss / config.acumulacao).backward()
+            # passo a cada `acumulacao` lotes e no último lote da época
+            ultimo = i + 1 == lotes_por_epoca
+            if (i + 1) % config.acumulacao == 0 or ultimo:
+                with perfil.regiao("otimizador"):
+                    if processos > 1:
+                        reduzir_gradientes(model, processos)
+                    optimizer.step()
+                    scheduler.step()
+                    optimizer.zero_grad()
             total_loss += loss.item()
-        print(f"Epoch {epoch+1}, Loss: {total_loss/len(dataloader):.4f}")
+            prof.passo()
+            if ultimo:
+                break
+        duracao = time.perf_counter() - inicio
+        if processos > 1:
+            # loss média e vazão somadas entre os processos
+            totais = torch.tensor([total_loss, tokens, exemplos], dtype=torch.float64)
+            dist.all_reduce(totais)
+            total_loss, tokens, exemplos = totais[0].item() / processos, totais[1].item(), totais[2].item()
+        if principal:
+            print(f"Epoch {epoch+1}, Loss: {total_loss/lotes_por_epoca:.4f}, "
+                  f"tokens/s: {tokens / duracao:.0f}, exemplos/s: {exemplos / duracao:.1f}, "
+                  f"lr: {scheduler.get_last_lr()[0]:.2e}, pico_mem: {pico_memoria_mb(device):.0f} MB")
 
-    torch.save(model.state_dict(), "model/mini_llm.pth")
-    print("Treinamento finalizado e modelo salvo em 'model/mini_llm.pth'.")
+        metricas = None
+        parar = False
+        if val_loader is not None and principal:
+            metricas = avaliar(model, val_loader, tokenizer, device)
+            melhorou = gerenciador.registrar(epoch + 1, metricas, estado_treino(epoch + 1, metricas))
+            print(f"  val {config.metrica}: {metricas[config.metrica]:.4f}" + (" (melhor)" if melhorou else ""))
+            parar = config.paciencia > 0 and gerenciador.sem_melhora >= config.paciencia
+        if processos > 1:
+            # a decisão do rank 0 vale para todos
+            sinal = torch.tensor([int(parar)])
+            dist.broadcast(sinal, 0)
+            parar = bool(sinal.item())
+        if principal and (parar or (epoch + 1) % config.checkpoint_a_cada == 0 or epoch + 1 == config.epochs):
+            gerenciador.salvar_ultimo(estado_treino(epoch + 1, metricas))
+        if parar:
+            if principal:
+                print(f"Early stopping: {config.paciencia} época(s) sem melhora em {config.metrica}.")
+            break
+    prof.encerrar()
+
+    if principal:
+        melhor = gerenciador.melhor()
+        if melhor:
+            model.load_state_dict(checkpoints.carregar(melhor)["modelo"])
+            print(f"Pesos do melhor checkpoint: '{melhor}'.")
+        torch.save(model.state_dict(), config.saida)
+        salvar_arquitetura(config.saida, arquitetura(config))
+        print(f"Treinamento finalizado e modelo salvo em '{config.saida}'.")
+    if processos > 1:
+        dist.barrier()
+        dist.destroy_process_group()
     return model, dataset
 
 # --- Avaliação ---
-def evaluate_model(model, dataset, val_frac=0.1, batch_size=8):
+def evaluate_model(model, dataset, val_frac=0.1, batch_size=8, semente=0, decodificador=None):
+    # métricas no split de validação persistido (ver eval_metrics.split_validacao); com
+    # `decodificador` (DecodificadorJSON) as predições são as da inferência, não o argmax
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
-    model.eval()
-
-    # Split val
-    n = len(dataset)
-    n_val = max(1, int(n * val_frac))
-    n_train = n - n_val
-    _, val_ds = random_split(dataset, [n_train, n_val])
-    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False)
-
-    pad_token = 0
-    criterion_eval = nn.CrossEntropyLoss(ignore_index=pad_token, reduction="sum")
-
-    total_loss_sum = 0.0
-    total_nonpad_tokens = 0
-    total_correct_tokens = 0
-    total_examples = 0
-    json_parse_success = 0
-    exact_match = 0
-
-    with torch.no_grad():
-        for xb, yb in val_loader:
-            xb, yb = xb.to(device), yb.to(device)
-            logits = model(xb)
-            B, S, V = logits.shape
-            logits_flat = logits.view(-1, V)
-            targets_flat = yb.view(-1)
-
-            # loss
-            loss_sum = criterion_eval(logits_flat, targets_flat)
-            total_loss_sum += loss_sum.item()
-
-            # token accuracy
-            nonpad_mask = (targets_flat != pad_token)
-            n_nonpad = int(nonpad_mask.sum().item())
-            total_nonpad_tokens += n_nonpad
-            preds_flat = logits_flat.argmax(dim=-1)
-            correct = ((preds_flat == targets_flat) & nonpad_mask).sum().item()
-            total_correct_tokens += correct
-
-            # per-example JSON parse & exact match
-            preds = preds_flat.view(B, S).cpu().tolist()
-            targets = yb.cpu().tolist()
-            for p_tokens, t_tokens in zip(preds, targets):
-                pred_text = tokenizer.decode(p_tokens).split('\x00', 1)[0].strip()
-                target_text = tokenizer.decode(t_tokens).split('\x00', 1)[0].strip()
-                try:
-                    json.loads(pred_text)
-                    json_parse_success += 1
-                except:
-                    pass
-                if pred_text == target_text:
-                    exact_match += 1
-                total_examples += 1
-
-    avg_loss_per_token = total_loss_sum / max(1, total_nonpad_tokens)
-    perplexity = float(torch.exp(torch.tensor(avg_loss_per_token)))
-    token_accuracy = total_correct_tokens / max(1, total_nonpad_tokens)
-    json_parse_rate = json_parse_success / max(1, total_examples)
-    exact_match_rate = exact_match / max(1, total_examples)
-
-    metrics = {
-        "avg_loss_per_token": avg_loss_per_token,
-        "perplexity": perplexity,
-        "token_accuracy": token_accuracy,
-        "json_parse_rate": json_parse_rate,
-        "exact_match_rate": exact_match_rate,
-        "total_examples": total_examples,
-        "total_nonpad_tokens": total_nonpad_tokens
-    }
-    return metrics
+    _, val_ds = split_validacao(dataset, val_frac, semente)
+    val_loader = carregador_por_comprimento(val_ds, batch_size, shuffle=False)
+    return avaliar(model, val_loader, dataset.tokenizer, device, decodificador=decodificador)
 
 # --- Main ---
+def config_da_linha_de_comando(argv=None) -> ConfigTreino:
+    # uma opção por campo do ConfigTreino (--batch-size, --bf16, --agendamento cosseno, ...)
+    parser = argparse.ArgumentParser()
+    padrao = ConfigTreino()
+    for campo in fields(ConfigTreino):
+        opcao = "--" + campo.name.replace("_", "-")
+        valor = getattr(padrao, campo.name)
+        if isinstance(valor, bool):
+            parser.add_argument(opcao, action=argparse.BooleanOptionalAction, default=valor)
+        else:
+            # campos Optional[...] com padrão None usam o tipo de dentro do Optional
+            tipo = type(valor) if valor is not None else next(t for t in get_args(campo.type) if t is not type(None))
+            parser.add_argument(opcao, type=tipo, default=valor)
+    return ConfigTreino(**vars(parser.parse_args(argv)))
+
 if __name__ == "__main__":
-    model, dataset = train_model(epochs=50)
-    metrics = evaluate_model(model, dataset)
+    config = config_da_linha_de_comando()
+    # no treino distribuído só o rank 0 imprime e avalia
+    principal = int(os.environ.get("RANK", 0)) == 0
+    if principal:
+        print("config:", json.dumps(asdict(config)))
+    model, dataset = train_model(config=config)
+    if not principal:
+        raise SystemExit(0)
+    # com validação no treino, avalia nos mesmos exemplos separados (que não foram treinados)
+    metrics = evaluate_model(model, dataset, val_frac=config.val_frac or 0.1, semente=config.semente)
     print("\n--- VAL METRICS ---")
     for k, v in metrics.items():
         print(f"{k}: {v}")
@@ -0,0 +1,260 @@
+# varredura.py
+# Varredura de hiperparâmetros do MiniLLM (emb_size, n_heads, n_layers, seq_len): treina e avalia
+# cada configuração em processos separados e mede a latência de inferência de cada uma, para
+# escolher a de melhor métrica dentro de um orçamento de latência na CPU.
+#
+# - grade completa ou amostra aleatória dela (--aleatoria N); combinações com emb_size não
+#   divisível por n_heads são descartadas
+# - um pool de --processos processos ("spawn"), cada um com --threads threads do torch e preso
+#   (sched_setaffinity) a um conjunto próprio de núcleos, para as tentativas não disputarem CPU
+#   e as latências medidas valerem para um servidor com o mesmo número de threads
+# - por tentativa: as métricas do evaluate_model com a decodificação por gramática do servidor
+#   (DecodificadorJSON) e a latência p50/p95 de gerar_json_lote com um comando (requisição
+#   isolada) e com --lote comandos (por comando), no mesmo processo preso
+# - seq_len padrão: o do maior JSON de resposta do dataset; valores menores truncariam os alvos
+#   e são descartados
+# - saída em --pasta: uma subpasta por tentativa (pesos, arquitetura, checkpoints),
+#   resultados.json, a tabela em resultados.txt (a fronteira de Pareto marcada com *) e os pesos
+#   da vencedora em vencedor.pth, prontos para servir (MODELO_PESOS=<pasta>/vencedor.pth)
+#
+# Vencedora: a de maior --metrica entre as da fronteira (melhor métrica para cada latência) com
+# latência p50 até --orcamento-ms (sem orçamento, a de maior métrica). Se todas as tentativas
+# empatam na métrica (todas com exact_match_rate 0, por exemplo), não há vencedora nem --instalar:
+# a escolha seria só pela latência.
+# Uso: python varredura.py --emb-size 32 64 128 --n-heads 2 4 --n-layers 1 2 --epochs 20
+#      [--aleatoria 6] [--processos 2 --threads 1] [--orcamento-ms 5] [--instalar]
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from checkpoints import MENOR_MELHOR
+
+HIPERPARAMETROS = ("emb_size", "n_heads", "n_layers", "seq_len")
+REPETICOES_LATENCIA = 50
+
+
+# --- Configurações ---
+def maior_alvo(fonte: Optional[str] = None) -> int:
+    # tokens do maior JSON de resposta da fonte (o alvo do treino e da validação)
+    import train
+    with open(fonte or train.FONTE, encoding="utf-8") as f:
+        dados = json.load(f)
+    acentos = train.tokenizer.acentos
+    return max(len(train.tokenizer.encode(json.dumps(d["json"], ensure_ascii=not acentos))) for d in dados)
+
+
+def configuracoes(grade: Dict[str, List[int]], aleatoria: Optional[int] = None, semente: int = 0) -> List[Dict[str, int]]:
+    validas = [dict(zip(HIPERPARAMETROS, valores)) for valores in itertools.product(*(grade[h] for h in HIPERPARAMETROS))]
+    validas = [c for c in validas if c["emb_size"] % c["n_heads"] == 0]
+    if aleatoria is not None and aleatoria < len(validas):
+        validas = random.Random(semente).sample(validas, aleatoria)
+    return validas
+
+
+# --- Processos ---
+def _prender(nucleos, threads: int):
+    # initializer do pool: cada processo pega o próximo conjunto de núcleos da fila
+    import torch
+    if hasattr(os, "sched_setaffinity"):
+        conjunto = nucleos.get()
+        if conjunto:
+            os.sched_setaffinity(0, conjunto)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def conjuntos_de_nucleos(processos: int, threads: int) -> List[List[int]]:
+    # núcleos disponíveis divididos em blocos de `threads`; com núcleos de menos, os blocos se repetem
+    disponiveis = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    if not disponiveis:
+        return [[] for _ in range(processos)]
+    return [[disponiveis[(i * threads + t) % len(disponiveis)] for t in range(threads)] for i in range(processos)]
+
+
+def latencias(pesos: str, lote: int, repeticoes: int = REPETICOES_LATENCIA) -> Dict[str, float]:
+    # gerar_json_lote com os pesos da tentativa, sobre comandos reais, no processo (preso) atual
+    import infer
+    from benchmarks.comum import comandos_reais, cronometrar, resumo
+
+    m = infer.carregar_de(pesos)
+    textos = comandos_reais()
+    proximo = itertools.count()
+
+    def um():
+        infer.gerar_json_lote([textos[next(proximo) % len(textos)]], modelo=m)
+
+    def varios():
+        i = next(proximo)
+        infer.gerar_json_lote([textos[(i + j) % len(textos)] for j in range(lote)], modelo=m)
+
+    r1 = resumo(cronometrar(um, repeticoes, aquecimento=3))
+    rl = resumo(cronometrar(varios, max(5, repeticoes // 4), aquecimento=2))
+    return {"latencia_p50_ms": r1["p50_ms"], "latencia_p95_ms": r1["p95_ms"], "latencia_p99_ms": r1["p99_ms"],
+            f"lote{lote}_p50_ms": rl["p50_ms"], f"lote{lote}_por_comando_ms": rl["p50_ms"] / lote}
+
+
+def tentativa(numero: int, hiperparametros: Dict[str, int], base: Dict, pasta: str, lote: int) -> Dict:
+    # roda num processo do pool: treino, evaluate_model (com a gramática, como no servidor) e latência
+    import train
+    from decodificacao import DecodificadorJSON
+
+    pasta_tentativa = os.path.join(pasta, f"tentativa_{numero:03d}")
+    os.makedirs(pasta_tentativa, exist_ok=True)
+    config = train.ConfigTreino(**{**base, **hiperparametros,
+                                   "pasta_checkpoints": os.path.join(pasta_tentativa, "checkpoints"),
+                                   "saida": os.path.join(pasta_tentativa, "mini_llm.pth")})
+    inicio = time.perf_counter()
+    model, dataset = train.train_model(config=config)
+    treino_s = time.perf_counter() - inicio
+    metricas = train.evaluate_model(model, dataset, val_frac=config.val_frac, semente=config.semente,
+                                    decodificador=DecodificadorJSON(dataset.tokenizer))
+    resultado = {"tentativa": numero, **hiperparametros, "parametros": sum(p.numel() for p in model.parameters()),
+                 **metricas, **latencias(config.saida, lote), "treino_s": round(treino_s, 1),
+                 "pesos": config.saida}
+    with open(os.path.join(pasta_tentativa, "resultado.json"), "w", encoding="utf-8") as f:
+        json.dump({"config": asdict(config), "resultado": resultado}, f, indent=1)
+    return resultado
+
+
+# --- Resultados ---
+def _melhor(metrica: str):
+    # chave que cresce com a qualidade
+    return (lambda r: -r[metrica]) if metrica in MENOR_MELHOR else (lambda r: r[metrica])
+
+
+def fronteira_pareto(resultados: List[Dict], metrica: str, latencia: str = "latencia_p50_ms") -> List[Dict]:
+    # tentativas que nenhuma outra supera ao mesmo tempo em métrica e latência
+    qualidade = _melhor(metrica)
+    fronteira = []
+    for r in sorted(resultados, key=lambda r: (r[latencia], -qualidade(r))):
+        if not fronteira or qualidade(r) > qualidade(fronteira[-1]):
+            fronteira.append(r)
+    return fronteira
+
+
+def vencedora(fronteira: List[Dict], metrica: str, orcamento_ms: Optional[float] = None,
+              latencia: str = "latencia_p50_ms") -> Optional[Dict]:
+    candidatas = [r for r in fronteira if orcamento_ms is None or r[latencia] <= orcamento_ms]
+    return max(candidatas, key=_melhor(metrica)) if candidatas else None
+
+
+def tabela(resultados: List[Dict], fronteira: List[Dict], metrica: str, lote: int) -> str:
+    colunas = ["tentativa", *HIPERPARAMETROS, "parametros", metrica, "token_accuracy", "aceite_rate",
+               "latencia_p50_ms", "latencia_p95_ms", f"lote{lote}_por_comando_ms", "treino_s"]
+    colunas = list(dict.fromkeys(colunas))
+    na_fronteira = {r["tentativa"] for r in fronteira}
+    linhas = [["", *colunas]]
+    for r in sorted(resultados, key=lambda r: r["latencia_p50_ms"]):
+        linhas.append(["*" if r["tentativa"] in na_fronteira else "",
+                       *(f"{r[c]:.4f}" if isinstance(r[c], float) else str(r[c]) for c in colunas)])
+    larguras = [max(len(linha[i]) for linha in linhas) for i in range(len(linhas[0]))]
+    return "\n".join("  ".join(v.rjust(w) for v, w in zip(linha, larguras)) for linha in linhas)
+
+
+def varrer(grade: Dict[str, List[int]], base: Dict, pasta: str, processos: int = 1, threads: int = 1,
+           aleatoria: Optional[int] = None, metrica: str = "exact_match_rate", orcamento_ms: Optional[float] = None,
+           lote: int = 16, instalar: bool = False) -> Dict:
+    minimo = maior_alvo()
+    curtos = sorted(v for v in set(grade["seq_len"]) if v < minimo)
+    if curtos:
+        print(f"seq_len {curtos} descartado(s): o maior alvo do dataset tem {minimo} tokens e seria truncado")
+        grade = {**grade, "seq_len": [v for v in grade["seq_len"] if v >= minimo]}
+    lista = configuracoes(grade, aleatoria, base.get("semente", 0))
+    if not lista:
+        raise ValueError("nenhuma configuração válida (emb_size precisa ser divisível por n_heads e "
+                         f"seq_len pelo menos {minimo})")
+    os.makedirs(pasta, exist_ok=True)
+    contexto = multiprocessing.get_context("spawn")
+    nucleos = contexto.Queue()
+    for conjunto in conjuntos_de_nucleos(processos, threads):
+        nucleos.put(conjunto)
+    print(f"{len(lista)} configuração(ões) em {processos} processo(s) de {threads} thread(s) -> {pasta}")
+    resultados = []
+    with ProcessPoolExecutor(processos, mp_context=contexto, initializer=_prender,
+                             initargs=(nucleos, threads)) as pool:
+        futuros = {pool.submit(tentativa, i, h, base, pasta, lote): h for i, h in enumerate(lista)}
+        for futuro in as_completed(futuros):
+            try:
+                r = futuro.result()
+            except Exception as e:
+                print(f"falhou {futuros[futuro]}: {e!r}")
+                continue
+            resultados.append(r)
+            print(f"tentativa {r['tentativa']} {futuros[futuro]}: {metrica}={r[metrica]:.4f} "
+                  f"p50={r['latencia_p50_ms']:.2f}ms")
+    if not resultados:
+        raise RuntimeError("todas as tentativas falharam")
+
+    fronteira = fronteira_pareto(resultados, metrica)
+    empate = len(resultados) > 1 and len({r[metrica] for r in resultados}) == 1
+    escolhida = None if empate else vencedora(fronteira, metrica, orcamento_ms)
+    texto = tabela(resultados, fronteira, metrica, lote)
+    with open(os.path.join(pasta, "resultados.json"), "w", encoding="utf-8") as f:
+        json.dump({"metrica": metrica, "orcamento_ms": orcamento_ms, "resultados": resultados,
+                   "fronteira": [r["tentativa"] for r in fronteira],
+                   "vencedora": escolhida and escolhida["tentativa"]}, f, indent=1)
+    with open(os.path.join(pasta, "resultados.txt"), "w", encoding="utf-8") as f:
+        f.write(texto + "\n")
+    print(texto)
+    if empate:
+        print(f"todas as tentativas empataram em {metrica}={resultados[0][metrica]:.4f}: sem vencedora "
+              "(a escolha seria só pela latência); nada foi instalado")
+        return {"resultados": resultados, "fronteira": fronteira, "vencedora": None}
+    if escolhida is None:
+        print(f"nenhuma configuração da fronteira cabe em {orcamento_ms} ms")
+        return {"resultados": resultados, "fronteira": fronteira, "vencedora": None}
+
+    # pesos e arquitetura juntos, no formato que model/carregar.py lê
+    from model.carregar import caminho_arquitetura, PESOS
+    destinos = [os.path.join(pasta, "vencedor.pth")] + ([PESOS] if instalar else [])
+    for destino in destinos:
+        shutil.copyfile(escolhida["pesos"], destino)
+        shutil.copyfile(caminho_arquitetura(escolhida["pesos"]), caminho_arquitetura(destino))
+    print(f"vencedora: tentativa {escolhida['tentativa']} "
+          f"({', '.join(f'{h}={escolhida[h]}' for h in HIPERPARAMETROS)}), {metrica}={escolhida[metrica]:.4f}, "
+          f"p50={escolhida['latencia_p50_ms']:.2f}ms")
+    print(f"para servir: MODELO_PESOS={os.path.abspath(destinos[-1])} python servidor.py")
+    return {"resultados": resultados, "fronteira": fronteira, "vencedora": escolhida}
+
+
+# --- Main ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emb-size", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--n-heads", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--n-layers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--seq-len", type=int, nargs="+", default=None,
+                        help="padrão: o comprimento do maior JSON de resposta do dataset")
+    parser.add_argument("--aleatoria", type=int, default=None, help="sorteia N configurações da grade")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--val-frac", type=float, default=0.1)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--sinteticos", default=None, help="pasta de shards do gerador_comandos.py")
+    parser.add_argument("--processos", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads", type=int, default=1, help="threads do torch por processo")
+    parser.add_argument("--metrica", default="exact_match_rate")
+    parser.add_argument("--orcamento-ms", type=float, default=None, help="latência p50 máxima da vencedora")
+    parser.add_argument("--lote", type=int, default=16, help="comandos por chamada na latência em lote")
+    parser.add_argument("--pasta", default=os.path.join("varreduras", time.strftime("%Y%m%d-%H%M%S")))
+    parser.add_argument("--instalar", action="store_true", help="copia a vencedora para model/mini_llm.pth")
+    args = parser.parse_args()
+    if args.seq_len is None:
+        args.seq_len = [maior_alvo()]
+
+    grade = {h: getattr(args, h) for h in HIPERPARAMETROS}
+    # cada tentativa treina no próprio processo, sem workers de DataLoader nem early stopping
+    base = {"epochs": args.epochs, "batch_size": args.batch_size, "lr": args.lr, "val_frac": args.val_frac,
+            "semente": args.semente, "sinteticos": args.sinteticos, "threads": args.threads, "workers": 0,
+            "manter_melhores": 1, "metrica": args.metrica}
+    varrer(grade, base, args.pasta, args.processos, args.threads, args.aleatoria, args.metrica,
+           args.orcamento_ms, args.lote, args.instalar)